@@ -0,0 +1,403 @@
+"""
+Skin Analysis Process Pool
+Runs skin feature extraction in pre-warmed worker processes, so OpenCV
+decoding never holds a request thread's GIL and large uploads cannot
+stall the weather endpoints. Extracted features are cached by upload
+content (feature_cache) and scored against the rule table in the web process.
+
+Uploads are copied once, straight from the request stream into a shared
+memory block; workers receive only its name and sizes, never the pickled
+bytes, and decode from the block in place. A multi-image upload is one
+job, featurized as a batch in a single worker. Submissions are bounded (busy -> AnalysisBusyError) and each job
+has a timeout (AnalysisTimeoutError).
+"""
+
+import asyncio
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from feature_cache import FeatureCache, CONTENT
+from skin_model import (
+    ANALYSIS_MAX_SIDE, get_model, extract_image_features, extract_image_features_batch,
+    detect_conditions_from_matrix
+)
+
+# Worker processes per web worker (0 = analyse inline on the request thread)
+POOL_WORKERS = int(os.environ.get('SKIN_POOL_WORKERS', '2'))
+# Jobs queued or running at once before new uploads are turned away
+POOL_MAX_PENDING = int(os.environ.get('SKIN_POOL_MAX_PENDING', '8'))
+# Seconds a request waits for its analysis
+POOL_TIMEOUT = float(os.environ.get('SKIN_POOL_TIMEOUT', '20'))
+
+# Feature cache for repeated uploads (0 bytes disables it); 'content' matches
+# identical bytes, 'perceptual' also re-encoded copies within PHASH_DISTANCE bits
+FEATURE_CACHE_MAX_BYTES = int(os.environ.get('SKIN_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))
+FEATURE_CACHE_MODE = os.environ.get('SKIN_CACHE_MODE', CONTENT)
+FEATURE_CACHE_PHASH_DISTANCE = int(os.environ.get('SKIN_CACHE_PHASH_DISTANCE', '4'))
+
+
+class AnalysisBusyError(Exception):
+    """Raised when the pool already has POOL_MAX_PENDING jobs"""
+
+
+class AnalysisTimeoutError(Exception):
+    """Raised when an analysis does not finish within the timeout"""
+
+
+def _init_worker():
+    """Build the classifier once per worker"""
+    get_model()
+
+
+def _warm_up():
+    """Featurize a tiny image so every code path is loaded before real jobs"""
+    from PIL import Image
+
+    image = io.BytesIO()
+    Image.new('RGB', (32, 32), (200, 150, 130)).save(image, format='PNG')
+    image.seek(0)
+    extract_image_features(image)
+    return os.getpid()
+
+
+class _SharedBufferReader(io.RawIOBase):
+    """
+    Read-only, seekable file over a memoryview
+    Decoders pull the upload in chunks straight from shared memory, so the
+    worker never holds a second full copy (io.BytesIO would copy it)
+    """
+
+    def __init__(self, view):
+        self._view = view
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        chunk = self._view[self._position:self._position + len(buffer)]
+        count = len(chunk)
+        buffer[:count] = chunk
+        self._position += count
+        return count
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._position = max(0, offset)
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        # The shared block cannot be closed while views of it are alive
+        self._view.release()
+        super().close()
+
+
+def _extract_shared(name, sizes):
+    """Worker side: feature vectors of the uploads held back to back in a shared memory block"""
+    block = shared_memory.SharedMemory(name=name)
+    readers = []
+    try:
+        offset = 0
+        for size in sizes:
+            readers.append(_SharedBufferReader(block.buf[offset:offset + size]))
+            offset += size
+        if len(readers) == 1:
+            return [extract_image_features(readers[0])]
+        return extract_image_features_batch(readers)
+    finally:
+        for reader in readers:
+            reader.close()
+        block.close()
+
+
+class AnalysisPool:
+    """
+    Bounded, pre-warmed process pool for skin feature extraction
+    Workers are spawned (not forked), since the web process already runs
+    refresher and executor threads
+    """
+
+    def __init__(self, workers, max_pending, timeout):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.warm_workers = 0
+
+    @property
+    def running(self):
+        return self._executor is not None
+
+    def start(self):
+        """Spawn the workers and warm each one up in the background"""
+        with self._lock:
+            if self._executor is not None:
+                return
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker
+            )
+            executor = self._executor
+
+        for _ in range(self.workers):
+            executor.submit(_warm_up).add_done_callback(self._warmed)
+
+    def _warmed(self, future):
+        if not future.cancelled() and future.exception() is None:
+            with self._lock:
+                self.warm_workers += 1
+
+    def _restart(self, broken):
+        """Replace an executor whose worker died (e.g. killed for memory)"""
+        with self._lock:
+            if self._executor is not broken:
+                return
+            self._executor = None
+            self.warm_workers = 0
+        broken.shutdown(wait=False, cancel_futures=True)
+        print("Skin analysis pool broken, restarting workers")
+        self.start()
+
+    def _current_executor(self):
+        """The running executor (read under the lock, restart and shutdown swap it)"""
+        with self._lock:
+            executor = self._executor
+        if executor is None:
+            raise AnalysisBusyError("Skin analysis pool is restarting or shut down")
+        return executor
+
+    def _submit_to(self, executor, name, sizes):
+        try:
+            return executor.submit(_extract_shared, name, sizes)
+        except BrokenProcessPool:
+            raise
+        except RuntimeError:
+            # Shut down (e.g. replaced by a restart) between the read and the submit
+            raise AnalysisBusyError("Skin analysis pool is restarting or shut down") from None
+
+    def submit(self, streams):
+        """
+        Queue uploads for feature extraction as one job, returns a concurrent
+        Future of their feature vectors (None where undecodable)
+        Raises AnalysisBusyError when max_pending jobs are already queued or
+        the pool is not running
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise AnalysisBusyError(f"{self.max_pending} skin analyses already pending")
+
+        block = None
+        try:
+            sizes = []
+            for stream in streams:
+                stream.seek(0, os.SEEK_END)
+                sizes.append(stream.tell())
+                stream.seek(0)
+
+            # Read the uploads straight into the block the worker will map
+            block = shared_memory.SharedMemory(create=True, size=max(1, sum(sizes)))
+            offset = 0
+            for stream, size in zip(streams, sizes):
+                with block.buf[offset:offset + size] as view:
+                    if stream.readinto(view) != size:
+                        raise ValueError("Upload changed size while being read")
+                offset += size
+
+            executor = self._current_executor()
+            try:
+                future = self._submit_to(executor, block.name, sizes)
+            except BrokenProcessPool:
+                self._restart(executor)
+                executor = self._current_executor()
+                future = self._submit_to(executor, block.name, sizes)
+        except BaseException:
+            if block is not None:
+                block.close()
+                block.unlink()
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.pending += 1
+        future.add_done_callback(lambda done: self._finished(done, block, executor))
+        return future
+
+    def _finished(self, future, block, executor):
+        """Free the shared block and the pending slot once a job settles"""
+        block.close()
+        block.unlink()
+        self._slots.release()
+
+        broken = not future.cancelled() and isinstance(future.exception(), BrokenProcessPool)
+        with self._lock:
+            self.pending -= 1
+            if future.cancelled() or future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+        if broken:
+            self._restart(executor)
+
+    def _timed_out(self, future):
+        # Jobs still queued are dropped; a running job keeps its slot until it ends
+        future.cancel()
+        with self._lock:
+            self.timeouts += 1
+        return AnalysisTimeoutError(f"Skin analysis exceeded {self.timeout}s")
+
+    def extract_features(self, stream):
+        """Feature vector of an upload (None if undecodable), blocking up to the timeout"""
+        return self.extract_features_batch([stream])[0]
+
+    def extract_features_batch(self, streams):
+        """Feature vectors of several uploads, extracted together as one job"""
+        future = self.submit(streams)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise self._timed_out(future) from None
+
+    async def extract_features_async(self, stream):
+        """extract_features without blocking the event loop"""
+        future = self.submit([stream])
+        try:
+            vectors = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.timeout)
+        except asyncio.TimeoutError:
+            raise self._timed_out(future) from None
+        return vectors[0]
+
+    def stats(self):
+        """Pool size, queue depth and job counters for monitoring"""
+        with self._lock:
+            return {
+                'running': self._executor is not None,
+                'workers': self.workers,
+                'warm_workers': self.warm_workers,
+                'pending': self.pending,
+                'max_pending': self.max_pending,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+analysis_pool = AnalysisPool(POOL_WORKERS, POOL_MAX_PENDING, POOL_TIMEOUT)
+feature_cache = FeatureCache(FEATURE_CACHE_MAX_BYTES, FEATURE_CACHE_MODE, FEATURE_CACHE_PHASH_DISTANCE)
+
+
+def in_pool_worker():
+    """
+    True inside a spawned pool worker, including while it re-imports the
+    parent's main module (spawn names the process before that import)
+    """
+    return multiprocessing.current_process().name != 'MainProcess'
+
+
+def start_analysis_pool():
+    """Start the pool in the web process (never inside a pool worker)"""
+    if POOL_WORKERS > 0 and not in_pool_worker():
+        analysis_pool.start()
+
+
+def _cache_key(stream):
+    if not feature_cache.enabled:
+        return None
+    # Features depend on the analysis resolution, not on the rule table
+    return feature_cache.key_for(stream, namespace=ANALYSIS_MAX_SIDE)
+
+
+def _score(stream, vector):
+    """Conditions for a feature vector, or the fallback analysis if there is none"""
+    if vector is None:
+        stream.seek(0)
+        return get_model()._fallback_analysis(stream)
+    return detect_conditions_from_matrix(np.asarray(vector)[None, :])[0]
+
+
+def analyze_skin_condition_pooled(stream):
+    """
+    analyze_skin_condition for the web tier: cached features, else extraction
+    in the pool (or inline when the pool is off), scored in this process
+    """
+    key = _cache_key(stream)
+    vector = feature_cache.get(key) if key else None
+    if vector is None:
+        stream.seek(0)
+        if analysis_pool.running:
+            vector = analysis_pool.extract_features(stream)
+        else:
+            vector = extract_image_features(stream)
+        if key and vector is not None:
+            feature_cache.set(key, vector)
+    return _score(stream, vector)
+
+
+async def analyze_skin_condition_pooled_async(stream):
+    """Awaitable analyze_skin_condition_pooled for async views"""
+    key = _cache_key(stream)
+    vector = feature_cache.get(key) if key else None
+    if vector is None:
+        stream.seek(0)
+        if analysis_pool.running:
+            vector = await analysis_pool.extract_features_async(stream)
+        else:
+            vector = extract_image_features(stream)
+        if key and vector is not None:
+            feature_cache.set(key, vector)
+    return _score(stream, vector)
+
+
+def analyze_skin_conditions_pooled(streams):
+    """
+    analyze_skin_conditions_batch for the web tier: cached features, the
+    misses extracted together as one pool job (or inline when the pool is
+    off), scored in this process
+    """
+    keys = [_cache_key(stream) for stream in streams]
+    vectors = [feature_cache.get(key) if key else None for key in keys]
+    misses = [index for index, vector in enumerate(vectors) if vector is None]
+    if misses:
+        pending = [streams[index] for index in misses]
+        if analysis_pool.running:
+            extracted = analysis_pool.extract_features_batch(pending)
+        else:
+            extracted = extract_image_features_batch(pending)
+        for index, vector in zip(misses, extracted):
+            vectors[index] = vector
+            if keys[index] and vector is not None:
+                feature_cache.set(keys[index], vector)
+    return [_score(stream, vector) for stream, vector in zip(streams, vectors)]
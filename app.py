@@ -7,6 +7,17 @@ import math
 from PIL import Image
 import io
 import base64
+import asyncio
+
+import upstream_client
+import weather_api
+from weather_api import unknown_cities, remember_if_unknown
+from weather_cache import normalize_city
+from weather_snapshot import WeatherSnapshot
+from forecast_risk import score_reading, risk_level
+from weather_api_async import (
+    get_weather_data_async, get_weather_by_coords_async, get_uv_index_async
+)
 
 # Load environment variables
 load_dotenv()
@@ -15,8 +26,8 @@ app = Flask(__name__)
 
 # OpenWeatherMap API configuration
 WEATHER_API_KEY = os.environ.get('WEATHER_API_KEY', 'your_api_key_here')
-WEATHER_API_URL = 'https://api.openweathermap.org/data/2.5/weather'
-UV_INDEX_URL = 'https://api.openweathermap.org/data/2.5/uvi'
+OWM_BASE_URL = os.environ.get('OWM_BASE_URL', 'https://api.openweathermap.org').rstrip('/')
+WEATHER_API_URL = os.environ.get('WEATHER_API_URL', f'{OWM_BASE_URL}/data/2.5/weather')
 
 # Configure upload folder
 UPLOAD_FOLDER = 'uploads'
@@ -29,34 +40,32 @@ app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5MB max file size
 
 def get_weather_data(city):
     """Fetch weather data from OpenWeatherMap API"""
+    # City names OpenWeatherMap already answered 404 for are rejected locally
+    cache_key = normalize_city(city)
+    if cache_key in unknown_cities:
+        return None
+    
     try:
         params = {
             'q': city,
             'appid': WEATHER_API_KEY,
             'units': 'metric'
         }
-        response = requests.get(WEATHER_API_URL, params=params)
+        response = upstream_client.get(WEATHER_API_URL, params=params)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
         print(f"Error fetching weather data: {e}")
+        remember_if_unknown(cache_key, e)
         return None
 
-def get_uv_index(lat, lon):
-    """Fetch UV index data from OpenWeatherMap API"""
-    try:
-        params = {
-            'lat': lat,
-            'lon': lon,
-            'appid': WEATHER_API_KEY
-        }
-        response = requests.get(UV_INDEX_URL, params=params)
-        response.raise_for_status()
-        data = response.json()
-        return data.get('value', 5)  # Default to moderate UV if not available
-    except:
-        # Estimate UV based on time and weather (fallback)
-        return 5
+def get_uv_index(lat, lon, cloud_cover=None):
+    """
+    Fetch UV index data from OpenWeatherMap API
+    Cached per geohash tile; estimated from solar position and cloud cover
+    when unavailable
+    """
+    return weather_api.get_uv_index(lat, lon, cloud_cover)
 
 def calculate_uv_index_risk(uv_index):
     """Categorize UV index risk level"""
@@ -79,76 +88,19 @@ def predict_skin_concerns(weather_data, uv_index):
     Uses multi-factor analysis to predict skin issues
     """
     concerns = []
-    concern_scores = {
-        'dryness': 0,
-        'acne': 0,
-        'sunburn': 0,
-        'sensitivity': 0,
-        'oiliness': 0
-    }
     
     temp = weather_data['main']['temp']
     humidity = weather_data['main']['humidity']
     wind_speed = weather_data['wind']['speed']
     condition = weather_data['weather'][0]['main'].lower()
     
-    # Dryness prediction model
-    if temp < 10:
-        concern_scores['dryness'] += 40
-    if humidity < 30:
-        concern_scores['dryness'] += 35
-    if wind_speed > 10:
-        concern_scores['dryness'] += 15
-    if condition in ['clear', 'sunny']:
-        concern_scores['dryness'] += 10
-    
-    # Acne prediction model
-    if humidity > 70:
-        concern_scores['acne'] += 30
-    if temp > 25 and temp < 35:
-        concern_scores['acne'] += 25
-    if condition in ['rain', 'drizzle']:
-        concern_scores['acne'] += 20
-    if humidity > 60 and temp > 20:
-        concern_scores['acne'] += 15
-    
-    # Sunburn prediction model
-    concern_scores['sunburn'] = uv_index * 10
-    if condition in ['clear', 'sunny']:
-        concern_scores['sunburn'] += 20
-    if temp > 25:
-        concern_scores['sunburn'] += 15
-    
-    # Sensitivity prediction model
-    if wind_speed > 15:
-        concern_scores['sensitivity'] += 30
-    if temp < 5 or temp > 35:
-        concern_scores['sensitivity'] += 25
-    if condition in ['snow', 'storm', 'thunderstorm']:
-        concern_scores['sensitivity'] += 20
-    
-    # Oiliness prediction model
-    if humidity > 65:
-        concern_scores['oiliness'] += 35
-    if temp > 28:
-        concern_scores['oiliness'] += 30
-    if condition in ['clear', 'sunny'] and temp > 25:
-        concern_scores['oiliness'] += 20
+    # Same CONCERN_RULES table the forecast timeline scores
+    concern_scores = score_reading(temp, humidity, wind_speed, condition, uv_index)
     
     # Categorize concerns based on scores
     for concern, score in concern_scores.items():
-        if score >= 70:
-            risk = "High Risk"
-            severity = "high"
-        elif score >= 50:
-            risk = "Moderate Risk"
-            severity = "moderate"
-        elif score >= 30:
-            risk = "Low Risk"
-            severity = "low"
-        else:
-            risk = None
-            severity = None
+        severity = risk_level(score)
+        risk = f"{severity.capitalize()} Risk" if severity else None
         
         if risk:
             concerns.append({
@@ -161,17 +113,18 @@ def predict_skin_concerns(weather_data, uv_index):
     
     return sorted(concerns, key=lambda x: x['score'], reverse=True)
 
-def get_skin_recommendations(weather_data):
+def get_skin_recommendations(weather_data, uv_index=None):
     """Generate skin care recommendations based on weather conditions"""
     if not weather_data:
         return {
             'error': 'Unable to fetch weather data. Please check the city name and try again.'
         }
     
-    # Get UV index
-    lat = weather_data['coord']['lat']
-    lon = weather_data['coord']['lon']
-    uv_index = get_uv_index(lat, lon)
+    # Get UV index unless the caller already fetched it
+    if uv_index is None:
+        lat = weather_data['coord']['lat']
+        lon = weather_data['coord']['lon']
+        uv_index = get_uv_index(lat, lon, weather_data.get('clouds', {}).get('all'))
     
     # Predict skin concerns using ML model
     predicted_concerns = predict_skin_concerns(weather_data, uv_index)
@@ -316,40 +269,14 @@ def image_analysis_page():
     """Render the image analysis page"""
     return render_template('image_analysis.html')
 
-@app.route('/api/analyze', methods=['POST'])
-def api_analyze():
-    """API endpoint to get weather-based skin care recommendations"""
-    data = request.get_json()
-    city = data.get('city', '')
-    
-    if not city:
-        return jsonify({'error': 'City name is required'}), 400
-    
-    weather_data = get_weather_data(city)
-    
-    if not weather_data:
-        return jsonify({'error': 'Unable to fetch weather data. Please check the city name and try again.'}), 400
-    
-    # Get UV index
-    lat = weather_data['coord']['lat']
-    lon = weather_data['coord']['lon']
-    uv_index = get_uv_index(lat, lon)
-    
+def build_analysis_response(weather_data, uv_index):
+    """Build the prediction + recommendation payload shared by the analyze routes"""
     # Predict skin concerns
     predicted_concerns = predict_skin_concerns(weather_data, uv_index)
     
     # Format response
     response = {
-        'city': weather_data['name'],
-        'weather': {
-            'temperature': weather_data['main']['temp'],
-            'feels_like': weather_data['main']['feels_like'],
-            'humidity': weather_data['main']['humidity'],
-            'pressure': weather_data['main']['pressure'],
-            'description': weather_data['weather'][0]['description'],
-            'wind_speed': weather_data['wind']['speed'],
-            'uv_index': round(uv_index, 1)
-        },
+        'weather': WeatherSnapshot.from_owm(weather_data, uv_index).to_analysis_weather(),
         'predictions': {},
         'recommendations': [],
         'products': [],
@@ -365,11 +292,47 @@ def api_analyze():
         }
     
     # Get detailed recommendations
-    recommendations = get_skin_recommendations(weather_data)
+    recommendations = get_skin_recommendations(weather_data, uv_index)
     response['recommendations'] = recommendations['skincare_tips']
     response['products'] = recommendations['products_recommended']
     response['warnings'] = recommendations['warnings']
     
+    return response
+
+def build_location_response(weather_data, uv_index, latitude, longitude):
+    """Build the /api/analyze-location payload"""
+    result = {
+        'city': f"{weather_data['name']}, {weather_data.get('sys', {}).get('country', '')}",
+        'coordinates': {
+            'latitude': latitude,
+            'longitude': longitude
+        }
+    }
+    result.update(build_analysis_response(weather_data, uv_index))
+    return result
+
+@app.route('/api/analyze', methods=['POST'])
+def api_analyze():
+    """API endpoint to get weather-based skin care recommendations"""
+    data = request.get_json()
+    city = data.get('city', '')
+    
+    if not city:
+        return jsonify({'error': 'City name is required'}), 400
+    
+    weather_data = get_weather_data(city)
+    
+    if not weather_data:
+        return jsonify({'error': 'Unable to fetch weather data. Please check the city name and try again.'}), 400
+    
+    # Get UV index
+    lat = weather_data['coord']['lat']
+    lon = weather_data['coord']['lon']
+    uv_index = get_uv_index(lat, lon, weather_data.get('clouds', {}).get('all'))
+    
+    response = {'city': weather_data['name']}
+    response.update(build_analysis_response(weather_data, uv_index))
+    
     return jsonify(response)
 
 @app.route('/api/analyze-location', methods=['POST'])
@@ -383,70 +346,69 @@ def api_analyze_location():
         return jsonify({'error': 'Latitude and longitude are required'}), 400
     
     try:
-        # Get weather data using coordinates
-        params = {
-            'lat': latitude,
-            'lon': longitude,
-            'appid': WEATHER_API_KEY,
-            'units': 'metric'
-        }
+        # Get weather data for the coordinates' geohash tile (shared by nearby users)
+        weather_data = weather_api.get_weather_by_coords(latitude, longitude)
         
-        response = requests.get(WEATHER_API_URL, params=params, timeout=10)
-        
-        if response.status_code != 200:
+        if not weather_data:
             return jsonify({'error': 'Unable to fetch weather data for your location'}), 400
         
-        weather_data = response.json()
-        
         # Get UV index
-        uv_index = get_uv_index(latitude, longitude)
-        
-        # Predict skin concerns
-        predicted_concerns = predict_skin_concerns(weather_data, uv_index)
+        uv_index = get_uv_index(latitude, longitude, weather_data.get('clouds', {}).get('all'))
         
-        # Format response
-        result = {
-            'city': f"{weather_data['name']}, {weather_data.get('sys', {}).get('country', '')}",
-            'coordinates': {
-                'latitude': latitude,
-                'longitude': longitude
-            },
-            'weather': {
-                'temperature': weather_data['main']['temp'],
-                'feels_like': weather_data['main']['feels_like'],
-                'humidity': weather_data['main']['humidity'],
-                'pressure': weather_data['main']['pressure'],
-                'description': weather_data['weather'][0]['description'],
-                'wind_speed': weather_data['wind']['speed'],
-                'uv_index': round(uv_index, 1)
-            },
-            'predictions': {},
-            'recommendations': [],
-            'products': [],
-            'warnings': []
-        }
+        return jsonify(build_location_response(weather_data, uv_index, latitude, longitude))
         
-        # Format predictions
-        for concern in predicted_concerns:
-            result['predictions'][concern['type'].lower()] = {
-                'score': concern['score'],
-                'risk_level': concern['risk'],
-                'confidence': concern['confidence']
-            }
+    except Exception as e:
+        print(f"Error in analyze_location: {e}")
+        return jsonify({'error': 'An error occurred while processing your request'}), 500
+
+# ================== ASYNC VARIANTS ==================
+# Same payloads as the sync routes, with upstream calls awaited together
+
+@app.route('/api/async/analyze', methods=['POST'])
+async def api_analyze_async():
+    """Async variant of /api/analyze"""
+    data = request.get_json()
+    city = data.get('city', '')
+    
+    if not city:
+        return jsonify({'error': 'City name is required'}), 400
+    
+    weather_data = await get_weather_data_async(city)
+    
+    if not weather_data:
+        return jsonify({'error': 'Unable to fetch weather data. Please check the city name and try again.'}), 400
+    
+    uv_index = await get_uv_index_async(
+        weather_data['coord']['lat'], weather_data['coord']['lon'],
+        weather_data.get('clouds', {}).get('all')
+    )
+    
+    response = {'city': weather_data['name']}
+    response.update(build_analysis_response(weather_data, uv_index))
+    
+    return jsonify(response)
+
+@app.route('/api/async/analyze-location', methods=['POST'])
+async def api_analyze_location_async():
+    """Async variant of /api/analyze-location - weather and UV in parallel"""
+    data = request.get_json()
+    latitude = data.get('latitude')
+    longitude = data.get('longitude')
+    
+    if not latitude or not longitude:
+        return jsonify({'error': 'Latitude and longitude are required'}), 400
+    
+    try:
+        weather_data, uv_index = await asyncio.gather(
+            get_weather_by_coords_async(latitude, longitude),
+            get_uv_index_async(latitude, longitude)
+        )
         
-        # Get detailed recommendations
-        recommendations = get_skin_recommendations(weather_data)
-        result['recommendations'] = recommendations['skincare_tips']
-        result['products'] = recommendations['products_recommended']
-        result['warnings'] = recommendations['warnings']
+        if not weather_data:
+            return jsonify({'error': 'Unable to fetch weather data for your location'}), 400
         
-        return jsonify(result)
+        return jsonify(build_location_response(weather_data, uv_index, latitude, longitude))
         
-    except requests.exceptions.Timeout:
-        return jsonify({'error': 'Weather service timed out. Please try again.'}), 504
-    except requests.exceptions.RequestException as e:
-        print(f"Weather API error: {e}")
-        return jsonify({'error': 'Unable to connect to weather service'}), 503
     except Exception as e:
         print(f"Error in analyze_location: {e}")
         return jsonify({'error': 'An error occurred while processing your request'}), 500
@@ -3,20 +3,51 @@ Weather-Based Skin Analyzer
 Advanced AI/ML-powered skin condition detection with weather integration
 """
 
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, Request, render_template, request, jsonify, send_from_directory, Response, stream_with_context
+import asyncio
+import json
 import os
 from datetime import datetime
 from dotenv import load_dotenv
 
 # Import custom modules
-from weather_api import get_comprehensive_weather, get_aqi_category
-from skin_model import analyze_skin_condition
+from weather_api import (
+    get_comprehensive_weather, get_cache_stats, get_coalescing_stats,
+    get_weather_snapshot_by_coords, reverse_geocode,
+    get_forecast_timeline, get_forecast_timeline_by_coords,
+    iter_comprehensive_weather_batch, BATCH_MAX_LOCATIONS,
+    refresher, start_background_refresh
+)
+from weather_api_async import (
+    get_comprehensive_weather_async, get_weather_snapshot_by_coords_async, reverse_geocode_async
+)
+from gazetteer import autocomplete_cities
+from upstream_client import get_breaker_states, get_rate_limit_stats, get_hedging_stats, budget_exhausted
+from analysis_pool import (
+    analysis_pool, feature_cache, start_analysis_pool, analyze_skin_condition_pooled,
+    analyze_skin_condition_pooled_async, analyze_skin_conditions_pooled,
+    in_pool_worker, AnalysisBusyError, AnalysisTimeoutError
+)
 from recommendations_engine import generate_comprehensive_recommendations
 
 # Load environment variables
 load_dotenv()
 
+# Multi-image skin uploads (clinic photo sets)
+SKIN_BATCH_MAX_FILES = int(os.environ.get('SKIN_BATCH_MAX_FILES', '12'))
+SKIN_BATCH_MAX_BYTES = SKIN_BATCH_MAX_FILES * 5 * 1024 * 1024
+
+class AnalyzerRequest(Request):
+    """Request that allows a larger body for multi-image uploads"""
+    
+    @property
+    def max_content_length(self):
+        if self.path == '/api/analyze-skin/batch':
+            return SKIN_BATCH_MAX_BYTES
+        return super().max_content_length
+
 app = Flask(__name__)
+app.request_class = AnalyzerRequest
 
 # Configure upload folder
 UPLOAD_FOLDER = 'uploads'
@@ -27,6 +58,13 @@ if not os.path.exists(UPLOAD_FOLDER):
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5MB max file size
 
+# Keep hot cities fresh in the background (one refresher per worker) and
+# pre-warm the skin analysis processes; skipped inside analysis pool workers,
+# which re-import this module when it is run as a script
+if not in_pool_worker():
+    start_background_refresh()
+    start_analysis_pool()
+
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -51,10 +89,82 @@ def api_weather():
     weather_data = get_comprehensive_weather(city)
     
     if not weather_data:
+        if budget_exhausted():
+            return jsonify({'error': 'Weather service is busy. Please try again in a minute.'}), 503
         return jsonify({'error': f'Unable to fetch weather data for "{city}". Please check the city name.'}), 404
     
     return jsonify(weather_data)
 
+@app.route('/api/forecast', methods=['POST'])
+def api_forecast():
+    """
+    Hourly skin risk timeline for the next 5 days
+    Scores dryness, acne, sunburn, sensitivity and oiliness for every
+    3-hour forecast step and lists the windows where it is safe to go out
+    """
+    data = request.get_json()
+    lat = data.get('lat')
+    lon = data.get('lon')
+    city = data.get('city', '').strip()
+    
+    if lat is not None and lon is not None:
+        try:
+            timeline = get_forecast_timeline_by_coords(float(lat), float(lon))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Latitude and longitude must be numbers'}), 400
+    elif city:
+        timeline = get_forecast_timeline(city)
+    else:
+        return jsonify({'error': 'City name or coordinates are required'}), 400
+    
+    if not timeline:
+        if budget_exhausted():
+            return jsonify({'error': 'Weather service is busy. Please try again in a minute.'}), 503
+        return jsonify({'error': 'Unable to fetch the forecast for this location.'}), 404
+    
+    return jsonify(timeline)
+
+@app.route('/api/cities', methods=['GET'])
+def api_cities():
+    """
+    City name autocomplete from the offline gazetteer
+    Query: ?q=<prefix>&limit=<n>
+    """
+    prefix = request.args.get('q', '').strip()
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    
+    if not prefix:
+        return jsonify({'error': 'Query parameter "q" is required'}), 400
+    
+    return jsonify({'cities': autocomplete_cities(prefix, limit)})
+
+@app.route('/api/weather/batch', methods=['POST'])
+def api_weather_batch():
+    """
+    Get weather data for many cities or coordinates in one request
+    Body: {"locations": ["London", {"city": "Paris"}, {"lat": 18.5, "lon": 73.8}]}
+    Results come back in input order with per-item errors.
+    Pass ?stream=1 to receive newline-delimited JSON as results complete.
+    """
+    data = request.get_json(silent=True) or {}
+    locations = data.get('locations')
+    
+    if not isinstance(locations, list) or not locations:
+        return jsonify({'error': 'A non-empty "locations" list is required'}), 400
+    
+    if len(locations) > BATCH_MAX_LOCATIONS:
+        return jsonify({'error': f'At most {BATCH_MAX_LOCATIONS} locations per batch'}), 400
+    
+    results = iter_comprehensive_weather_batch(locations)
+    
+    if request.args.get('stream') in ('1', 'true'):
+        def generate():
+            for result in results:
+                yield json.dumps(result) + '\n'
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
+    return jsonify({'count': len(locations), 'results': list(results)})
+
 @app.route('/api/analyze-skin', methods=['POST'])
 def api_analyze_skin():
     """
@@ -73,34 +183,147 @@ def api_analyze_skin():
         return jsonify({'error': 'Invalid file type. Please upload JPG, PNG, or JPEG'}), 400
     
     try:
-        # Analyze the image using ML model
-        detected_conditions = analyze_skin_condition(file.stream)
+        # Analyze the image using ML model (in the analysis process pool)
+        detected_conditions = analyze_skin_condition_pooled(file.stream)
         
         if not detected_conditions:
             return jsonify({'error': 'Unable to analyze image. Please try another image.'}), 400
         
         # Format response
-        response = {
-            'conditions': []
-        }
-        
-        for condition in detected_conditions:
-            response['conditions'].append({
-                'type': condition['type'],
-                'score': round(condition['score'], 1),
-                'confidence': round(condition['confidence'], 1),
-                'severity': condition['severity'],
-                'indicators': condition.get('indicators', [])
-            })
-        
-        return jsonify(response)
+        return jsonify({'conditions': format_conditions(detected_conditions)})
         
+    except AnalysisBusyError:
+        return jsonify({'error': 'Image analysis is busy. Please try again shortly.'}), 503
+    except AnalysisTimeoutError:
+        return jsonify({'error': 'Image analysis took too long. Please try a smaller image.'}), 504
     except Exception as e:
         print(f"Error processing image: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({'error': 'An error occurred while processing the image.'}), 500
 
+@app.route('/api/analyze-skin/batch', methods=['POST'])
+def api_analyze_skin_batch():
+    """
+    Analyze a set of skin photos in one request
+    Multipart form with one or more "files" parts (each up to 5MB).
+    Results come back in upload order with per-file errors.
+    """
+    files = request.files.getlist('files')
+    
+    if not files:
+        return jsonify({'error': 'No image files provided'}), 400
+    
+    if len(files) > SKIN_BATCH_MAX_FILES:
+        return jsonify({'error': f'At most {SKIN_BATCH_MAX_FILES} images per batch'}), 400
+    
+    results = [None] * len(files)
+    accepted = []
+    for index, file in enumerate(files):
+        if file.filename == '' or not allowed_file(file.filename):
+            results[index] = {'filename': file.filename, 'error': 'Invalid file type. Please upload JPG, PNG, or JPEG'}
+        elif file.stream.seek(0, os.SEEK_END) > 5 * 1024 * 1024:
+            results[index] = {'filename': file.filename, 'error': 'File too large. Maximum size is 5MB.'}
+        else:
+            accepted.append(index)
+    
+    try:
+        # One job in the analysis process pool for the whole batch
+        detected = analyze_skin_conditions_pooled([files[index].stream for index in accepted])
+    except AnalysisBusyError:
+        return jsonify({'error': 'Image analysis is busy. Please try again shortly.'}), 503
+    except AnalysisTimeoutError:
+        return jsonify({'error': 'Image analysis took too long. Please try fewer or smaller images.'}), 504
+    except Exception as e:
+        print(f"Error processing image batch: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': 'An error occurred while processing the images.'}), 500
+    
+    for index, conditions in zip(accepted, detected):
+        results[index] = {'filename': files[index].filename, 'conditions': format_conditions(conditions)}
+    
+    return jsonify({'count': len(files), 'results': results})
+
+def format_conditions(conditions):
+    """Rounded, client-facing view of detected skin conditions"""
+    return [
+        {
+            'type': c['type'],
+            'score': round(c['score'], 1),
+            'confidence': round(c['confidence'], 1),
+            'severity': c['severity'],
+            'indicators': c.get('indicators', [])
+        }
+        for c in conditions
+    ]
+
+def uploaded_skin_file():
+    """The optional, valid uploaded image of the current request (or None)"""
+    file = request.files.get('file')
+    if file and file.filename != '' and allowed_file(file.filename):
+        return file
+    return None
+
+def analyze_uploaded_skin():
+    """Run skin analysis on the optional uploaded file of the current request"""
+    file = uploaded_skin_file()
+    if not file:
+        return []
+    
+    try:
+        return analyze_skin_condition_pooled(file.stream)
+    except Exception as e:
+        print(f"Error analyzing skin: {e}")
+        return []
+
+async def analyze_uploaded_skin_async():
+    """Async variant of analyze_uploaded_skin (awaits the analysis pool)"""
+    file = uploaded_skin_file()
+    if not file:
+        return []
+    
+    try:
+        return await analyze_skin_condition_pooled_async(file.stream)
+    except Exception as e:
+        print(f"Error analyzing skin: {e}")
+        return []
+
+def build_complete_response(weather_data, skin_conditions):
+    """Combine weather and skin analysis into the complete analysis response"""
+    # Generate comprehensive recommendations
+    recommendations = generate_comprehensive_recommendations(
+        weather_data,
+        skin_conditions
+    )
+    
+    return {
+        'weather': weather_data,
+        'skin_analysis': {
+            'conditions': format_conditions(skin_conditions)
+        },
+        'recommendations': recommendations
+    }
+
+def build_geolocation_result(snapshot, location_info):
+    """Build the /api/geolocation payload with a precise location name"""
+    if location_info:
+        # Build detailed location name
+        location_parts = []
+        if location_info.get('name'):
+            location_parts.append(location_info['name'])
+        if location_info.get('state'):
+            location_parts.append(location_info['state'])
+        
+        precise_location = ', '.join(location_parts) if location_parts else snapshot.city
+    else:
+        precise_location = snapshot.city
+    
+    # Add coordinate display for precision
+    coord_display = f"📍 {snapshot.lat:.4f}°, {snapshot.lon:.4f}°"
+    
+    return snapshot.to_dict(city_label=f"{precise_location} {coord_display}", coord_precision=4)
+
 @app.route('/api/analyze-complete', methods=['POST'])
 def api_analyze_complete():
     """
@@ -115,33 +338,11 @@ def api_analyze_complete():
     if lat and lon:
         # Use coordinates for precise weather data
         try:
-            from weather_api import get_weather_data, get_uv_index, get_air_quality
-            import requests
-            
-            WEATHER_API_KEY = os.environ.get('WEATHER_API_KEY')
-            params = {
-                'lat': float(lat),
-                'lon': float(lon),
-                'appid': WEATHER_API_KEY,
-                'units': 'metric'
-            }
-            response = requests.get('https://api.openweathermap.org/data/2.5/weather', params=params)
-            base_weather = response.json()
+            snapshot = get_weather_snapshot_by_coords(float(lat), float(lon))
+            if not snapshot:
+                return jsonify({'error': 'Unable to fetch weather data for your location'}), 500
             
-            uv_index = get_uv_index(float(lat), float(lon))
-            air_quality = get_air_quality(float(lat), float(lon))
-            
-            # Build comprehensive weather data from coordinates
-            weather_data = {
-                'temperature': base_weather['main']['temp'],
-                'humidity': base_weather['main']['humidity'],
-                'uv_index': uv_index,
-                'weather_main': base_weather['weather'][0]['main'],
-                'weather_description': base_weather['weather'][0]['description'],
-                'city': city if city else base_weather.get('name', 'Your Location'),
-                'aqi': air_quality['aqi'] if air_quality else None,
-                'pm2_5': air_quality['pm2_5'] if air_quality else None
-            }
+            weather_data = snapshot.to_dict(city_label=city or None)
         except Exception as e:
             print(f"Error fetching weather by coordinates: {e}")
             return jsonify({'error': 'Unable to fetch weather data for your location'}), 500
@@ -155,42 +356,9 @@ def api_analyze_complete():
         return jsonify({'error': 'Location information is required'}), 400
     
     # Get skin analysis
-    skin_conditions = []
-    
-    if 'file' in request.files:
-        file = request.files['file']
-        
-        if file and file.filename != '' and allowed_file(file.filename):
-            try:
-                skin_conditions = analyze_skin_condition(file.stream)
-            except Exception as e:
-                print(f"Error analyzing skin: {e}")
-                skin_conditions = []
-    
-    # Generate comprehensive recommendations
-    recommendations = generate_comprehensive_recommendations(
-        weather_data,
-        skin_conditions
-    )
-    
-    response = {
-        'weather': weather_data,
-        'skin_analysis': {
-            'conditions': [
-                {
-                    'type': c['type'],
-                    'score': round(c['score'], 1),
-                    'confidence': round(c['confidence'], 1),
-                    'severity': c['severity'],
-                    'indicators': c.get('indicators', [])
-                }
-                for c in skin_conditions
-            ]
-        },
-        'recommendations': recommendations
-    }
+    skin_conditions = analyze_uploaded_skin()
     
-    return jsonify(response)
+    return jsonify(build_complete_response(weather_data, skin_conditions))
 
 @app.route('/api/geolocation', methods=['POST'])
 def api_geolocation():
@@ -206,88 +374,93 @@ def api_geolocation():
         return jsonify({'error': 'Latitude and longitude are required'}), 400
     
     try:
-        from weather_api import get_weather_data, get_uv_index, get_air_quality
+        # Get weather, UV and air quality
+        snapshot = get_weather_snapshot_by_coords(lat, lon)
+        if not snapshot:
+            return jsonify({'error': 'Unable to fetch weather for your location'}), 500
         
-        # Get weather by coordinates (reverse geocoding)
-        WEATHER_API_KEY = os.environ.get('WEATHER_API_KEY')
-        import requests
+        # Location name from the offline gazetteer (upstream when far from any city)
+        location_info = reverse_geocode(lat, lon)
         
-        # Get weather data
-        params = {
-            'lat': lat,
-            'lon': lon,
-            'appid': WEATHER_API_KEY,
-            'units': 'metric'
-        }
-        response = requests.get('https://api.openweathermap.org/data/2.5/weather', params=params)
-        weather_data = response.json()
+        return jsonify(build_geolocation_result(snapshot, location_info))
         
-        # Try to get more precise location name using reverse geocoding
+    except Exception as e:
+        print(f"Error getting geolocation weather: {e}")
+        return jsonify({'error': 'Unable to fetch weather for your location'}), 500
+
+# ================== ASYNC VARIANTS ==================
+# Same payloads as the sync routes, but the upstream calls are awaited
+# together on the worker's shared aiohttp session (see weather_api_async).
+# Each request still holds a worker thread while it runs, so concurrency
+# per worker comes from gunicorn's gthread threads (see Procfile)
+
+@app.route('/api/async/weather', methods=['POST'])
+async def api_weather_async():
+    """Async variant of /api/weather"""
+    data = request.get_json()
+    city = data.get('city', '').strip()
+    
+    if not city:
+        return jsonify({'error': 'City name is required'}), 400
+    
+    weather_data = await get_comprehensive_weather_async(city)
+    
+    if not weather_data:
+        if budget_exhausted():
+            return jsonify({'error': 'Weather service is busy. Please try again in a minute.'}), 503
+        return jsonify({'error': f'Unable to fetch weather data for "{city}". Please check the city name.'}), 404
+    
+    return jsonify(weather_data)
+
+@app.route('/api/async/analyze-complete', methods=['POST'])
+async def api_analyze_complete_async():
+    """Async variant of /api/analyze-complete"""
+    lat = request.form.get('lat')
+    lon = request.form.get('lon')
+    city = request.form.get('city', '').strip()
+    
+    if lat and lon:
         try:
-            geocode_params = {
-                'lat': lat,
-                'lon': lon,
-                'limit': 1,
-                'appid': WEATHER_API_KEY
-            }
-            geocode_response = requests.get(
-                'https://api.openweathermap.org/geo/1.0/reverse', 
-                params=geocode_params,
-                timeout=5
-            )
-            geocode_data = geocode_response.json()
+            snapshot = await get_weather_snapshot_by_coords_async(float(lat), float(lon))
+            if not snapshot:
+                return jsonify({'error': 'Unable to fetch weather data for your location'}), 500
             
-            if geocode_data and len(geocode_data) > 0:
-                location_info = geocode_data[0]
-                # Build detailed location name
-                location_parts = []
-                if location_info.get('name'):
-                    location_parts.append(location_info['name'])
-                if location_info.get('state'):
-                    location_parts.append(location_info['state'])
-                
-                precise_location = ', '.join(location_parts) if location_parts else weather_data.get('name', 'Your Location')
-            else:
-                precise_location = weather_data.get('name', 'Your Location')
-        except:
-            precise_location = weather_data.get('name', 'Your Location')
-        
-        # Add coordinate display for precision
-        coord_display = f"📍 {lat:.4f}°, {lon:.4f}°"
-        
-        uv_index = get_uv_index(lat, lon)
-        air_quality = get_air_quality(lat, lon)
+            weather_data = snapshot.to_dict(city_label=city or None)
+        except Exception as e:
+            print(f"Error fetching weather by coordinates: {e}")
+            return jsonify({'error': 'Unable to fetch weather data for your location'}), 500
+    elif city:
+        weather_data = await get_comprehensive_weather_async(city)
         
-        result = {
-            'city': f"{precise_location} {coord_display}",
-            'country': weather_data['sys'].get('country', ''),
-            'coordinates': {'lat': round(lat, 4), 'lon': round(lon, 4)},
-            'weather': {
-                'temperature': weather_data['main']['temp'],
-                'feels_like': weather_data['main']['feels_like'],
-                'humidity': weather_data['main']['humidity'],
-                'pressure': weather_data['main']['pressure'],
-                'description': weather_data['weather'][0]['description'],
-                'main': weather_data['weather'][0]['main']
-            },
-            'wind': {
-                'speed': weather_data['wind']['speed']
-            },
-            'uv': {
-                'index': round(uv_index, 1),
-                'risk': 'Low' if uv_index < 3 else 'Moderate' if uv_index < 6 else 'High' if uv_index < 8 else 'Very High'
-            }
-        }
+        if not weather_data:
+            return jsonify({'error': f'Unable to fetch weather data for "{city}".'}), 404
+    else:
+        return jsonify({'error': 'Location information is required'}), 400
+    
+    skin_conditions = await analyze_uploaded_skin_async()
+    
+    return jsonify(build_complete_response(weather_data, skin_conditions))
+
+@app.route('/api/async/geolocation', methods=['POST'])
+async def api_geolocation_async():
+    """Async variant of /api/geolocation - weather, place name, UV and AQI in parallel"""
+    data = request.get_json()
+    lat = data.get('lat')
+    lon = data.get('lon')
+    
+    if not lat or not lon:
+        return jsonify({'error': 'Latitude and longitude are required'}), 400
+    
+    try:
+        snapshot, location_info = await asyncio.gather(
+            get_weather_snapshot_by_coords_async(float(lat), float(lon)),
+            reverse_geocode_async(lat, lon)
+        )
         
-        if air_quality:
-            result['air_quality'] = {
-                'aqi': air_quality['aqi'],
-                'category': get_aqi_category(air_quality['aqi']),
-                'pm2_5': round(air_quality['pm2_5'], 2),
-                'pm10': round(air_quality['pm10'], 2)
-            }
+        if not snapshot:
+            return jsonify({'error': 'Unable to fetch weather for your location'}), 500
         
-        return jsonify(result)
+        return jsonify(build_geolocation_result(snapshot, location_info))
         
     except Exception as e:
         print(f"Error getting geolocation weather: {e}")
@@ -307,7 +480,15 @@ def health():
             'AI/ML Skin Condition Detection',
             'Personalized Recommendations',
             'Geolocation Support'
-        ]
+        ],
+        'cache': get_cache_stats(),
+        'coalescing': get_coalescing_stats(),
+        'refresher': refresher.stats(),
+        'circuit_breakers': get_breaker_states(),
+        'upstream_budget': get_rate_limit_stats(),
+        'hedging': get_hedging_stats(),
+        'skin_pool': analysis_pool.stats(),
+        'skin_feature_cache': feature_cache.stats()
     })
 
 @app.route('/static/<path:path>')
@@ -318,6 +499,8 @@ def send_static(path):
 @app.errorhandler(413)
 def request_entity_too_large(error):
     """Handle file too large error"""
+    if request.path == '/api/analyze-skin/batch':
+        return jsonify({'error': f'Upload too large. Maximum is {SKIN_BATCH_MAX_FILES} images of 5MB.'}), 413
     return jsonify({'error': 'File too large. Maximum size is 5MB.'}), 413
 
 @app.errorhandler(404)
@@ -0,0 +1,94 @@
+"""
+Feature Extractor Benchmark
+Times SkinConditionClassifier._extract_features against the previous
+per-channel np.mean/np.std implementation at 1, 4 and 12 megapixels and
+checks both return the same feature dict
+
+Usage: python benchmark_features.py [--repeat N]
+"""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from skin_model import get_model
+
+SIZES = {1: (1152, 864), 4: (2304, 1728), 12: (4000, 3000)}
+
+# Largest difference accepted between the two implementations
+TOLERANCE = 1e-6
+
+
+def reference_features(img_rgb, img_hsv, img_lab):
+    """The previous implementation: 18 strided np.mean/np.std passes plus np.var"""
+    features = {}
+    for img, names in ((img_rgb, ('red', 'green', 'blue')),
+                       (img_hsv, ('hue', 'saturation', 'value')),
+                       (img_lab, ('l', 'a', 'b'))):
+        for index, name in enumerate(names):
+            features[f'avg_{name}'] = np.mean(img[:, :, index])
+        for index, name in enumerate(names):
+            features[f'std_{name}'] = np.std(img[:, :, index])
+    features['redness_index'] = (features['avg_red'] - (features['avg_green'] + features['avg_blue']) / 2)
+    gray = cv2.cvtColor(img_rgb, cv2.COLOR_RGB2GRAY)
+    features['texture_variance'] = np.var(gray)
+    edges = cv2.Canny(gray, 50, 150)
+    features['edge_density'] = np.sum(edges > 0) / (edges.shape[0] * edges.shape[1])
+    features['brightness'] = (features['avg_red'] + features['avg_green'] + features['avg_blue']) / 3
+    return features
+
+
+def synthetic_photo(width, height, seed=0):
+    """Skin-toned test image with shading, blemishes and sensor noise"""
+    rng = np.random.default_rng(seed)
+    img = np.empty((height, width, 3), dtype='float32')
+    img[:] = (205, 160, 140)
+    yy, xx = np.mgrid[0:height, 0:width].astype('float32')
+    img += (20 * np.sin(xx / width * 3) * np.cos(yy / height * 2))[..., None]
+    img += rng.normal(0, 12, img.shape).astype('float32')
+    img = np.clip(img, 0, 255).astype('uint8')
+    for _ in range(200):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        cv2.circle(img, center, int(rng.integers(3, 15)), (150, 95, 85), -1)
+    return img
+
+
+def best_time(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    model = get_model()
+    print(f"{'size':>6} {'reference':>11} {'fused':>9} {'speedup':>8} {'max diff':>10}")
+    for megapixels, (width, height) in SIZES.items():
+        img_rgb = synthetic_photo(width, height)
+        img_hsv = cv2.cvtColor(img_rgb, cv2.COLOR_RGB2HSV)
+        img_lab = cv2.cvtColor(img_rgb, cv2.COLOR_RGB2LAB)
+
+        expected = reference_features(img_rgb, img_hsv, img_lab)
+        actual = model._extract_features(img_rgb, img_hsv, img_lab)
+        if list(expected) != list(actual):
+            raise SystemExit(f"Feature keys differ: {list(expected)} vs {list(actual)}")
+        max_diff = max(abs(float(actual[name]) - float(expected[name])) for name in expected)
+        if max_diff > TOLERANCE:
+            raise SystemExit(f"Features differ by {max_diff} at {megapixels} MP")
+
+        reference = best_time(lambda: reference_features(img_rgb, img_hsv, img_lab), args.repeat)
+        fused = best_time(lambda: model._extract_features(img_rgb, img_hsv, img_lab), args.repeat)
+        print(f"{megapixels:>4}MP {reference * 1000:>9.1f}ms {fused * 1000:>7.1f}ms "
+              f"{reference / fused:>7.1f}x {max_diff:>10.2e}")
+
+
+if __name__ == '__main__':
+    main()
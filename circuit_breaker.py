@@ -0,0 +1,143 @@
+"""
+Circuit Breaker
+Fails fast when an upstream endpoint is erroring or too slow, so
+callers drop straight to their fallbacks instead of tying up workers
+"""
+
+import threading
+import time
+from collections import deque
+
+import requests
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Rolling-window circuit breaker with failure-rate and latency thresholds
+
+    closed    -> calls pass; trips to open when, over the last `window` calls
+                 (at least `min_calls`), the failure rate or the share of
+                 calls slower than `slow_call_seconds` crosses its threshold
+    open      -> calls fail fast with CircuitOpenError for `open_seconds`
+    half_open -> up to `half_open_probes` trial calls; all succeeding closes
+                 the circuit, any failure re-opens it. Every call allowed by
+                 before_call must end in record() or release(), or its probe
+                 slot is never freed
+    """
+
+    def __init__(self, name, window=20, min_calls=5, failure_rate_threshold=0.5,
+                 slow_call_seconds=3.0, slow_call_rate_threshold=0.5,
+                 open_seconds=30, half_open_probes=2):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+
+        self._calls = deque(maxlen=window)  # (failed, slow) per call
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._calls.clear()
+        self.times_opened += 1
+        print(f"Circuit '{self.name}' opened")
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call is currently allowed"""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == OPEN:
+                self.rejected += 1
+                raise CircuitOpenError(f"Circuit '{self.name}' is open")
+            if self._state == HALF_OPEN:
+                if self._probes_in_flight >= self.half_open_probes:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"Circuit '{self.name}' is half-open, probe limit reached")
+                self._probes_in_flight += 1
+
+    def release(self):
+        """
+        Give back the slot of a call allowed by before_call that ended without
+        an outcome (cancelled, or abandoned before reaching upstream)
+        """
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def record(self, failed, latency):
+        """Record the outcome of a call allowed by before_call"""
+        slow = latency >= self.slow_call_seconds
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if failed or slow:
+                    self._open()
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_probes:
+                        self._state = CLOSED
+                        self._calls.clear()
+                        print(f"Circuit '{self.name}' closed")
+                return
+
+            if self._state != CLOSED:
+                return
+
+            self._calls.append((failed, slow))
+            total = len(self._calls)
+            if total < self.min_calls:
+                return
+
+            failure_rate = sum(1 for f, _ in self._calls if f) / total
+            slow_rate = sum(1 for _, s in self._calls if s) / total
+            if failure_rate >= self.failure_rate_threshold or slow_rate >= self.slow_call_rate_threshold:
+                self._open()
+
+    def stats(self):
+        """Return breaker state and counters for monitoring"""
+        with self._lock:
+            self._maybe_half_open()
+            total = len(self._calls)
+            return {
+                'name': self.name,
+                'state': self._state,
+                'window_calls': total,
+                'failure_rate': round(sum(1 for f, _ in self._calls if f) / total, 3) if total else 0.0,
+                'slow_call_rate': round(sum(1 for _, s in self._calls if s) / total, 3) if total else 0.0,
+                'times_opened': self.times_opened,
+                'rejected': self.rejected,
+                'open_for_seconds': round(max(0.0, self.open_seconds - (time.monotonic() - self._opened_at)), 1)
+                if self._state == OPEN else 0.0
+            }
@@ -0,0 +1,145 @@
+"""
+Climatology Fallback
+Bundled grid of modelled monthly estimates (data/climatology.npy) used to
+answer weather lookups when OpenWeatherMap is down or over budget
+
+The grid is a 2.5-degree lat/lon array of shape (12, 72, 144, 4) uint8,
+memory-mapped at runtime so every worker shares the same pages and a
+lookup is a single array index. Fields (decoded):
+temperature (C), humidity (%), UV index (typical daily max), wind speed (m/s)
+
+Provenance: these are NOT climate normals. No gridded observation or
+reanalysis source is bundled; temperature, humidity and wind come from
+closed-form zonal bands that depend only on latitude and month, and UV
+from solar geometry (uv_estimator) at 50% cloud. Callers must present
+them as a latitude-band seasonal estimate, never as local conditions.
+Air quality is not modelled. Rebuild with `python climatology.py` after
+changing the model.
+"""
+
+import calendar
+import os
+import threading
+import time
+
+import numpy as np
+
+from uv_estimator import estimate_uv_index
+
+CLIMATOLOGY_PATH = os.environ.get(
+    'CLIMATOLOGY_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'climatology.npy')
+)
+
+CELL_DEGREES = 2.5
+NUM_LAT = int(180 / CELL_DEGREES)
+NUM_LON = int(360 / CELL_DEGREES)
+
+# Field order and uint8 encodings (value = raw * scale + offset)
+FIELDS = ('temperature', 'humidity', 'uv_index', 'wind_speed')
+SCALES = np.array([0.5, 1.0, 0.1, 0.1])
+OFFSETS = np.array([-60.0, 0.0, 0.0, 0.0])
+
+# Cloud cover assumed when deriving typical UV from clear-sky UV
+TYPICAL_CLOUD_COVER = 50
+
+
+def _cell(lat, lon):
+    """Grid indices of the cell containing (lat, lon)"""
+    i = min(NUM_LAT - 1, max(0, int((float(lat) + 90) / CELL_DEGREES)))
+    j = int(((float(lon) + 180) % 360) / CELL_DEGREES) % NUM_LON
+    return i, j
+
+
+def build_grid():
+    """Model the monthly estimate grid (decoded floats, shape (12, NUM_LAT, NUM_LON, 4))"""
+    lats = -90 + CELL_DEGREES * (np.arange(NUM_LAT) + 0.5)
+    lons = -180 + CELL_DEGREES * (np.arange(NUM_LON) + 0.5)
+    months = np.arange(1, 13)
+
+    lat = lats[None, :, None]
+    abs_lat = np.abs(lat)
+    # +1 at the hemisphere's warm peak (mid-July north, mid-January south)
+    season = np.cos(2 * np.pi * (months[:, None, None] - 7.5) / 12) * np.sign(lat)
+
+    temperature = 27 - 0.0065 * lat ** 2 + 0.2 * abs_lat * season
+
+    # Dry subtropical belts, wetter tropics in their summer
+    humidity = (78 - 25 * np.exp(-((abs_lat - 25) / 9) ** 2)
+                + 5 * season * np.exp(-((abs_lat - 15) / 10) ** 2))
+    humidity = np.clip(humidity, 20, 95)
+
+    # Typical daily max: clear-sky UV at local solar noon on the 15th
+    noon_utc = np.array([calendar.timegm((2021, month, 15, 12, 0, 0)) for month in months], dtype='float64')
+    timestamps = noon_utc[:, None, None] - lons[None, None, :] / 15 * 3600
+    uv_index = estimate_uv_index(lat, lons[None, None, :], timestamps, cloud_cover=TYPICAL_CLOUD_COVER)
+
+    # Westerlies in the mid-latitudes, trade winds in the tropics
+    wind_speed = 3.5 + 3 * np.exp(-((abs_lat - 50) / 12) ** 2) + np.exp(-((abs_lat - 15) / 8) ** 2)
+
+    shape = (12, NUM_LAT, NUM_LON)
+    fields = [temperature, humidity, uv_index, wind_speed]
+    return np.stack([np.broadcast_to(field, shape) for field in fields], axis=-1)
+
+
+def encode_grid(grid):
+    """Quantize a decoded grid to the bundled uint8 format"""
+    return np.clip(np.round((grid - OFFSETS) / SCALES), 0, 255).astype('uint8')
+
+
+class Climatology:
+    """Memory-mapped monthly estimates with O(1) cell lookups"""
+
+    def __init__(self, path):
+        self.grid = np.load(path, mmap_mode='r')
+        if self.grid.shape != (12, NUM_LAT, NUM_LON, len(FIELDS)):
+            raise ValueError(f"Unexpected climatology grid shape {self.grid.shape}")
+
+    def lookup(self, lat, lon, month=None):
+        """Estimates for the cell containing (lat, lon) in a month (default: current UTC month)"""
+        if month is None:
+            month = time.gmtime().tm_mon
+        i, j = _cell(lat, lon)
+        raw = self.grid[month - 1, i, j]
+        values = raw * SCALES + OFFSETS
+        return {
+            'temperature': round(float(values[0]), 1),
+            'humidity': int(values[1]),
+            'uv_index': round(float(values[2]), 1),
+            'wind_speed': round(float(values[3]), 1)
+        }
+
+
+_climatology = None
+_climatology_lock = threading.Lock()
+
+
+def get_climatology():
+    """Load the bundled grid once per process, None if it is missing"""
+    global _climatology
+    if _climatology is None:
+        with _climatology_lock:
+            if _climatology is None:
+                try:
+                    _climatology = Climatology(CLIMATOLOGY_PATH)
+                except (OSError, ValueError) as e:
+                    print(f"Climatology fallback unavailable: {e}")
+                    return None
+    return _climatology
+
+
+def lookup_estimate(lat, lon, month=None):
+    """Modelled monthly estimate for coordinates, None if the grid is unavailable"""
+    climatology = get_climatology()
+    return climatology.lookup(lat, lon, month) if climatology else None
+
+
+def main():
+    grid = encode_grid(build_grid())
+    os.makedirs(os.path.dirname(CLIMATOLOGY_PATH), exist_ok=True)
+    np.save(CLIMATOLOGY_PATH, grid)
+    print(f"Wrote {CLIMATOLOGY_PATH} ({grid.nbytes // 1024} KiB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+"""
+Fake OpenWeatherMap Server
+Local stand-in for the OpenWeatherMap endpoints the app uses, for load
+testing without burning API quota or depending on the internet
+
+Endpoints:
+- /data/2.5/weather        (q=city or lat/lon)
+- /data/2.5/uvi            (lat/lon)
+- /data/2.5/air_pollution  (lat/lon)
+- /data/2.5/forecast       (q=city or lat/lon, 40 x 3-hour steps)
+- /geo/1.0/direct          (q=city)
+- /geo/1.0/reverse         (lat/lon)
+
+Payloads are deterministic per city / coordinate. Latency and errors are
+configurable via environment variables or command line flags.
+
+Usage:
+    python fake_owm_server.py --port 8081 --latency-ms 120 --error-rate 0.02
+    OWM_BASE_URL=http://127.0.0.1:8081 gunicorn app_enhanced:app
+"""
+
+import argparse
+import hashlib
+import math
+import os
+import random
+import time
+
+from flask import Flask, request, jsonify
+
+from gazetteer import lookup_city, nearest_city
+
+app = Flask(__name__)
+
+# Latency is log-normal: median FAKE_OWM_LATENCY_MS, spread FAKE_OWM_LATENCY_SIGMA
+config = {
+    'latency_ms': float(os.environ.get('FAKE_OWM_LATENCY_MS', 100)),
+    'latency_sigma': float(os.environ.get('FAKE_OWM_LATENCY_SIGMA', 0.5)),
+    'error_rate': float(os.environ.get('FAKE_OWM_ERROR_RATE', 0.0)),
+    'rate_limit_rate': float(os.environ.get('FAKE_OWM_RATE_LIMIT_RATE', 0.0)),
+    'hang_rate': float(os.environ.get('FAKE_OWM_HANG_RATE', 0.0)),
+    'hang_seconds': float(os.environ.get('FAKE_OWM_HANG_SECONDS', 15)),
+    # Unknown city names return 404 unless this is enabled
+    'any_city': os.environ.get('FAKE_OWM_ANY_CITY', 'false').lower() == 'true'
+}
+
+stats = {'requests': 0, 'errors': 0, 'rate_limited': 0, 'hangs': 0}
+
+CONDITIONS = [
+    ('Clear', 'clear sky', '01d'),
+    ('Clouds', 'scattered clouds', '03d'),
+    ('Clouds', 'overcast clouds', '04d'),
+    ('Rain', 'light rain', '10d'),
+    ('Drizzle', 'light intensity drizzle', '09d'),
+    ('Thunderstorm', 'thunderstorm', '11d'),
+    ('Snow', 'light snow', '13d'),
+    ('Mist', 'mist', '50d')
+]
+
+
+def _rng(*parts):
+    """Deterministic random generator seeded from the request key"""
+    seed = hashlib.sha256('|'.join(str(p) for p in parts).encode()).hexdigest()
+    return random.Random(int(seed[:16], 16))
+
+
+def _coords_key(lat, lon):
+    return f"{round(float(lat), 2)},{round(float(lon), 2)}"
+
+
+@app.before_request
+def simulate_upstream():
+    """Apply latency and error injection to every request"""
+    stats['requests'] += 1
+    if request.path == '/__stats':
+        return None
+
+    roll = random.random()
+    if roll < config['hang_rate']:
+        stats['hangs'] += 1
+        time.sleep(config['hang_seconds'])
+    elif config['latency_ms'] > 0:
+        time.sleep(random.lognormvariate(0, config['latency_sigma']) * config['latency_ms'] / 1000)
+
+    roll = random.random()
+    if roll < config['error_rate']:
+        stats['errors'] += 1
+        return jsonify({'cod': 500, 'message': 'Internal error (injected)'}), 500
+    if roll < config['error_rate'] + config['rate_limit_rate']:
+        stats['rate_limited'] += 1
+        return jsonify({'cod': 429, 'message': 'Too many requests (injected)'}), 429
+    return None
+
+
+def _resolve_city(query):
+    """Known cities come from the gazetteer; others are synthesized or 404"""
+    known = lookup_city(query)
+    if known:
+        return known
+    if not config['any_city']:
+        return None
+    rng = _rng('city', query.lower())
+    return {
+        'name': query.split(',')[0].strip().title(),
+        'state': '',
+        'country': 'XX',
+        'lat': round(rng.uniform(-60, 70), 4),
+        'lon': round(rng.uniform(-180, 180), 4)
+    }
+
+
+def _weather_payload(name, country, lat, lon):
+    """Deterministic current-weather payload shaped like OpenWeatherMap's"""
+    rng = _rng('weather', _coords_key(lat, lon))
+    # Warmer near the equator, with per-location noise
+    temp = round(30 - abs(lat) * 0.45 + rng.uniform(-6, 6), 2)
+    main, description, icon = CONDITIONS[rng.randrange(len(CONDITIONS))]
+    return {
+        'coord': {'lon': lon, 'lat': lat},
+        'weather': [{'id': 800, 'main': main, 'description': description, 'icon': icon}],
+        'main': {
+            'temp': temp,
+            'feels_like': round(temp + rng.uniform(-3, 3), 2),
+            'temp_min': round(temp - rng.uniform(0, 3), 2),
+            'temp_max': round(temp + rng.uniform(0, 3), 2),
+            'pressure': rng.randint(990, 1030),
+            'humidity': rng.randint(15, 98)
+        },
+        'wind': {'speed': round(rng.uniform(0, 18), 2), 'deg': rng.randint(0, 359)},
+        'clouds': {'all': rng.randint(0, 100)},
+        'dt': int(time.time()),
+        'sys': {'country': country},
+        'name': name,
+        'cod': 200
+    }
+
+
+@app.route('/data/2.5/weather')
+def weather():
+    query = request.args.get('q')
+    if query:
+        city = _resolve_city(query)
+        if city is None:
+            return jsonify({'cod': '404', 'message': 'city not found'}), 404
+        return jsonify(_weather_payload(city['name'], city['country'], city['lat'], city['lon']))
+
+    try:
+        lat = float(request.args['lat'])
+        lon = float(request.args['lon'])
+    except (KeyError, ValueError):
+        return jsonify({'cod': '400', 'message': 'Nothing to geocode'}), 400
+
+    nearby = nearest_city(lat, lon)
+    name = nearby['name'] if nearby else ''
+    country = nearby['country'] if nearby else ''
+    return jsonify(_weather_payload(name, country, lat, lon))
+
+
+@app.route('/data/2.5/forecast')
+def forecast():
+    query = request.args.get('q')
+    if query:
+        city = _resolve_city(query)
+        if city is None:
+            return jsonify({'cod': '404', 'message': 'city not found'}), 404
+    else:
+        try:
+            lat = float(request.args['lat'])
+            lon = float(request.args['lon'])
+        except (KeyError, ValueError):
+            return jsonify({'cod': '400', 'message': 'Nothing to geocode'}), 400
+        city = nearest_city(lat, lon) or {'name': '', 'country': ''}
+        city = dict(city, lat=lat, lon=lon)
+
+    # 40 steps, 3 hours apart, starting at the next 3-hour boundary
+    start = (int(time.time()) // 10800 + 1) * 10800
+    base = _weather_payload(city['name'], city['country'], city['lat'], city['lon'])
+    steps = []
+    for step in range(40):
+        dt = start + step * 10800
+        rng = _rng('forecast', _coords_key(city['lat'], city['lon']), dt)
+        # Diurnal swing around the current temperature
+        hour = (dt / 3600 + city['lon'] / 15) % 24
+        temp = round(base['main']['temp'] + 5 * math.sin((hour - 9) / 24 * 2 * math.pi) + rng.uniform(-2, 2), 2)
+        main, description, icon = CONDITIONS[rng.randrange(len(CONDITIONS))]
+        steps.append({
+            'dt': dt,
+            'main': {
+                'temp': temp,
+                'feels_like': round(temp + rng.uniform(-3, 3), 2),
+                'pressure': rng.randint(990, 1030),
+                'humidity': rng.randint(15, 98)
+            },
+            'weather': [{'id': 800, 'main': main, 'description': description, 'icon': icon}],
+            'clouds': {'all': rng.randint(0, 100)},
+            'wind': {'speed': round(rng.uniform(0, 18), 2), 'deg': rng.randint(0, 359)},
+            'dt_txt': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(dt))
+        })
+
+    return jsonify({
+        'cod': '200',
+        'cnt': len(steps),
+        'list': steps,
+        'city': {
+            'name': city['name'],
+            'coord': {'lat': city['lat'], 'lon': city['lon']},
+            'country': city['country']
+        }
+    })
+
+
+@app.route('/data/2.5/uvi')
+def uvi():
+    lat, lon = request.args.get('lat', 0), request.args.get('lon', 0)
+    rng = _rng('uvi', _coords_key(lat, lon))
+    return jsonify({'lat': float(lat), 'lon': float(lon), 'date_iso': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                    'value': round(rng.uniform(0, 11), 2)})
+
+
+@app.route('/data/2.5/air_pollution')
+def air_pollution():
+    lat, lon = request.args.get('lat', 0), request.args.get('lon', 0)
+    rng = _rng('aqi', _coords_key(lat, lon))
+    return jsonify({
+        'coord': {'lon': float(lon), 'lat': float(lat)},
+        'list': [{
+            'main': {'aqi': rng.randint(1, 5)},
+            'components': {
+                'co': round(rng.uniform(150, 900), 2),
+                'no2': round(rng.uniform(1, 80), 2),
+                'o3': round(rng.uniform(10, 160), 2),
+                'pm2_5': round(rng.uniform(1, 150), 2),
+                'pm10': round(rng.uniform(3, 220), 2)
+            },
+            'dt': int(time.time())
+        }]
+    })
+
+
+@app.route('/geo/1.0/direct')
+def geo_direct():
+    city = _resolve_city(request.args.get('q', ''))
+    return jsonify([city] if city else [])
+
+
+@app.route('/geo/1.0/reverse')
+def geo_reverse():
+    nearby = nearest_city(request.args.get('lat', 0), request.args.get('lon', 0), max_distance_km=500)
+    if not nearby:
+        return jsonify([])
+    nearby.pop('distance_km', None)
+    return jsonify([nearby])
+
+
+@app.route('/__stats')
+def server_stats():
+    """Request/error counters and the active configuration"""
+    return jsonify({'stats': stats, 'config': config})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake OpenWeatherMap server for offline load testing')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency-ms', type=float, default=config['latency_ms'])
+    parser.add_argument('--latency-sigma', type=float, default=config['latency_sigma'])
+    parser.add_argument('--error-rate', type=float, default=config['error_rate'])
+    parser.add_argument('--rate-limit-rate', type=float, default=config['rate_limit_rate'])
+    parser.add_argument('--hang-rate', type=float, default=config['hang_rate'])
+    parser.add_argument('--hang-seconds', type=float, default=config['hang_seconds'])
+    parser.add_argument('--any-city', action='store_true', default=config['any_city'])
+    args = parser.parse_args()
+
+    config.update({
+        'latency_ms': args.latency_ms,
+        'latency_sigma': args.latency_sigma,
+        'error_rate': args.error_rate,
+        'rate_limit_rate': args.rate_limit_rate,
+        'hang_rate': args.hang_rate,
+        'hang_seconds': args.hang_seconds,
+        'any_city': args.any_city
+    })
+
+    print(f"Fake OpenWeatherMap listening on http://{args.host}:{args.port}")
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""
+Skin Feature Cache
+Memory-bounded LRU of extracted skin feature vectors keyed by the upload's
+content, so a photo re-posted with a different city skips decoding and
+feature extraction. Only features are cached; conditions are re-scored on
+every hit, so changes to the rule table take effect immediately.
+
+Keys are either a BLAKE2b digest of the bytes ('content', exact re-uploads)
+or a 64-bit DCT perceptual hash ('perceptual', which also matches re-encoded
+or resized copies within a Hamming distance). Perceptual keys are indexed by
+max_distance + 1 disjoint bit chunks: two hashes within max_distance bits
+agree exactly on at least one chunk, so a near lookup only compares the
+entries sharing a chunk instead of scanning the whole cache.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from PIL import Image
+
+CONTENT = 'content'
+PERCEPTUAL = 'perceptual'
+
+HASH_BITS = 64
+
+# Rough per-entry bookkeeping (OrderedDict slot, key object, array header)
+ENTRY_OVERHEAD = 200
+# Rough cost of one entry in one perceptual chunk bucket
+INDEX_OVERHEAD = 100
+
+
+def content_hash(stream):
+    """BLAKE2b hex digest of a seekable upload stream (rewound afterwards)"""
+    stream.seek(0)
+    digest = hashlib.file_digest(stream, 'blake2b').hexdigest()
+    stream.seek(0)
+    return digest
+
+
+def perceptual_hash(stream):
+    """
+    64-bit DCT hash of an image: low-frequency coefficients above their median
+    JPEGs are decoded at 1/8 scale, so this costs a fraction of an analysis
+    """
+    stream.seek(0)
+    try:
+        img = Image.open(stream)
+        img.draft('L', (64, 64))
+        gray = np.asarray(img.convert('L').resize((32, 32), Image.Resampling.BOX), dtype='float32')
+    finally:
+        stream.seek(0)
+    low = cv2.dct(gray)[:8, :8].flatten()
+    bits = low > np.median(low[1:])  # DC term left out of the median
+    return int(''.join('1' if bit else '0' for bit in bits), 2)
+
+
+def chunk_spans(max_distance):
+    """(shift, width) of the max_distance + 1 disjoint chunks of a perceptual hash"""
+    count = min(max_distance, HASH_BITS - 1) + 1
+    bounds = [round(index * HASH_BITS / count) for index in range(count + 1)]
+    return [(start, stop - start) for start, stop in zip(bounds, bounds[1:])]
+
+
+class FeatureCache:
+    """
+    Thread-safe LRU of feature vectors bounded by approximate bytes
+    In perceptual mode a lookup that misses exactly falls back to the
+    closest cached hash within max_distance bits, found through the chunk
+    index
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, mode=CONTENT, max_distance=4, name='skin_features'):
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.max_distance = max_distance
+        self.name = name
+        self._data = OrderedDict()
+        # (namespace, chunk position, chunk bits) -> keys, perceptual mode only
+        self._index = {}
+        self._spans = chunk_spans(max_distance) if mode == PERCEPTUAL else []
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def key_for(self, stream, namespace=''):
+        """
+        Cache key for an upload; namespace separates settings that change the
+        features (e.g. the analysis resolution). None if it cannot be hashed.
+        """
+        try:
+            digest = perceptual_hash(stream) if self.mode == PERCEPTUAL else content_hash(stream)
+        except Exception as e:
+            print(f"Could not hash upload for feature cache: {e}")
+            return None
+        return (namespace, digest)
+
+    def _chunks(self, key):
+        """Index entries of a perceptual key"""
+        namespace, digest = key
+        return [
+            (namespace, position, (digest >> shift) & ((1 << width) - 1))
+            for position, (shift, width) in enumerate(self._spans)
+        ]
+
+    def _entry_size(self, vector):
+        return vector.nbytes + ENTRY_OVERHEAD + len(self._spans) * INDEX_OVERHEAD
+
+    def _remove(self, key, vector):
+        """Drop an entry's byte count and index entries (already popped from _data)"""
+        self._bytes -= self._entry_size(vector)
+        for chunk in self._chunks(key):
+            bucket = self._index[chunk]
+            bucket.discard(key)
+            if not bucket:
+                del self._index[chunk]
+
+    def _nearest(self, key):
+        """Closest perceptual key in the same namespace within max_distance"""
+        digest = key[1]
+        best, best_distance = None, self.max_distance + 1
+        candidates = set()
+        for chunk in self._chunks(key):
+            candidates.update(self._index.get(chunk, ()))
+        for candidate in candidates:
+            distance = (digest ^ candidate[1]).bit_count()
+            if distance < best_distance:
+                best, best_distance = candidate, distance
+        return best
+
+    def get(self, key):
+        """Cached feature vector or None"""
+        with self._lock:
+            match = key if key in self._data else None
+            if match is None and self.mode == PERCEPTUAL:
+                match = self._nearest(key)
+                if match is not None:
+                    self.near_hits += 1
+            if match is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(match)
+            self.hits += 1
+            return self._data[match]
+
+    def set(self, key, vector):
+        """Store a feature vector, evicting least recently used entries"""
+        vector = np.array(vector, dtype='float64')
+        vector.setflags(write=False)
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self._remove(key, previous)
+            self._data[key] = vector
+            self._bytes += self._entry_size(vector)
+            for chunk in self._chunks(key):
+                self._index.setdefault(chunk, set()).add(key)
+            while self._bytes > self.max_bytes and self._data:
+                self._remove(*self._data.popitem(last=False))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._index.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Return counters for monitoring"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'name': self.name,
+                'mode': self.mode,
+                'size': len(self._data),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'near_hits': self.near_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0
+            }
@@ -0,0 +1,217 @@
+"""
+Forecast Risk Timeline
+Weather-driven skin concern rules (CONCERN_RULES), scored for a single
+reading by app.predict_skin_concerns and for every step of an
+OpenWeatherMap forecast (40 x 3-hour steps) in one vectorized pass
+"""
+
+from datetime import datetime, timezone
+
+import numpy as np
+
+from uv_estimator import estimate_uv_index
+
+CONCERNS = ('dryness', 'acne', 'sunburn', 'sensitivity', 'oiliness')
+
+# Weather thresholds per concern. Each term adds `weight` when all of its
+# bounds hold: 'temp' / 'humidity' / 'wind_speed' (low, high) mean
+# low < value < high (None = unbounded) and 'conditions' lists lowercase
+# OpenWeatherMap 'main' values. uv_weight adds that much per UV index unit.
+CONCERN_RULES = {
+    'dryness': {
+        'terms': (
+            {'weight': 40, 'temp': (None, 10)},
+            {'weight': 35, 'humidity': (None, 30)},
+            {'weight': 15, 'wind_speed': (10, None)},
+            {'weight': 10, 'conditions': ('clear', 'sunny')}
+        )
+    },
+    'acne': {
+        'terms': (
+            {'weight': 30, 'humidity': (70, None)},
+            {'weight': 25, 'temp': (25, 35)},
+            {'weight': 20, 'conditions': ('rain', 'drizzle')},
+            {'weight': 15, 'humidity': (60, None), 'temp': (20, None)}
+        )
+    },
+    'sunburn': {
+        'uv_weight': 10,
+        'terms': (
+            {'weight': 20, 'conditions': ('clear', 'sunny')},
+            {'weight': 15, 'temp': (25, None)}
+        )
+    },
+    'sensitivity': {
+        'terms': (
+            {'weight': 30, 'wind_speed': (15, None)},
+            {'weight': 25, 'temp': (None, 5)},
+            {'weight': 25, 'temp': (35, None)},
+            {'weight': 20, 'conditions': ('snow', 'storm', 'thunderstorm')}
+        )
+    },
+    'oiliness': {
+        'terms': (
+            {'weight': 35, 'humidity': (65, None)},
+            {'weight': 30, 'temp': (28, None)},
+            {'weight': 20, 'conditions': ('clear', 'sunny'), 'temp': (25, None)}
+        )
+    }
+}
+
+# Bounded reading fields a term may test
+READING_FIELDS = ('temp', 'humidity', 'wind_speed')
+
+# Minimum score per severity, highest first
+RISK_LEVELS = ((70, 'high'), (50, 'moderate'), (30, 'low'))
+
+# A step is "safe to go out" when every concern stays below this score
+SAFE_SCORE = 50
+
+
+def _term_holds(term, readings, condition):
+    """Whether a CONCERN_RULES term applies to one set of readings"""
+    if 'conditions' in term and condition not in term['conditions']:
+        return False
+    for field in READING_FIELDS:
+        if field in term:
+            low, high = term[field]
+            value = readings[field]
+            if (low is not None and not value > low) or (high is not None and not value < high):
+                return False
+    return True
+
+
+def score_reading(temp, humidity, wind_speed, condition, uv_index):
+    """
+    Score each concern for a single reading
+    condition is the lowercase OpenWeatherMap 'main' condition
+    Returns {concern: score} in CONCERNS order
+    """
+    readings = {'temp': temp, 'humidity': humidity, 'wind_speed': wind_speed}
+    scores = {}
+    for concern in CONCERNS:
+        rule = CONCERN_RULES[concern]
+        score = uv_index * rule['uv_weight'] if 'uv_weight' in rule else 0
+        for term in rule['terms']:
+            if _term_holds(term, readings, condition):
+                score += term['weight']
+        scores[concern] = score
+    return scores
+
+
+def _term_mask(term, readings, condition):
+    """Vectorized _term_holds: boolean array over all readings"""
+    mask = np.ones(condition.shape, dtype=bool)
+    if 'conditions' in term:
+        mask &= np.isin(condition, term['conditions'])
+    for field in READING_FIELDS:
+        if field in term:
+            low, high = term[field]
+            if low is not None:
+                mask &= readings[field] > low
+            if high is not None:
+                mask &= readings[field] < high
+    return mask
+
+
+def score_concerns(temp, humidity, wind_speed, condition, uv_index):
+    """
+    Score each concern for arrays of readings
+    condition is an array of lowercase OpenWeatherMap 'main' conditions
+    Returns {concern: float array}, same rules as score_reading
+    """
+    readings = {
+        'temp': np.asarray(temp, dtype='float64'),
+        'humidity': np.asarray(humidity, dtype='float64'),
+        'wind_speed': np.asarray(wind_speed, dtype='float64')
+    }
+    uv_index = np.asarray(uv_index, dtype='float64')
+    condition = np.asarray(condition)
+
+    scores = {}
+    for concern in CONCERNS:
+        rule = CONCERN_RULES[concern]
+        score = uv_index * rule.get('uv_weight', 0)
+        for term in rule['terms']:
+            score = score + term['weight'] * _term_mask(term, readings, condition)
+        scores[concern] = np.broadcast_to(score, condition.shape).astype('float64')
+    return scores
+
+
+def risk_level(score):
+    """Severity for a single score ('high', 'moderate', 'low' or None)"""
+    for threshold, level in RISK_LEVELS:
+        if score >= threshold:
+            return level
+    return None
+
+
+def _isoformat(timestamp):
+    return datetime.fromtimestamp(int(timestamp), tz=timezone.utc).strftime('%Y-%m-%dT%H:%MZ')
+
+
+def _safe_windows(safe, timestamps, step_seconds):
+    """Contiguous runs of safe steps as [{'start', 'end'}] (end exclusive)"""
+    windows = []
+    # Indices where the safe flag flips, padded so runs at the edges close
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], safe.astype('int8'), [0]))))
+    for start, stop in zip(edges[::2], edges[1::2]):
+        windows.append({
+            'start': _isoformat(timestamps[start]),
+            'end': _isoformat(timestamps[stop - 1] + step_seconds)
+        })
+    return windows
+
+
+def build_risk_timeline(forecast_data):
+    """
+    Compact, column-oriented risk timeline for a /data/2.5/forecast payload
+    UV is estimated per step from solar position and forecast cloud cover,
+    since the forecast carries no UV index
+    """
+    steps = forecast_data.get('list') or []
+    if not steps:
+        return None
+
+    city = forecast_data.get('city', {})
+    lat = city.get('coord', {}).get('lat', 0)
+    lon = city.get('coord', {}).get('lon', 0)
+
+    timestamps = np.array([step['dt'] for step in steps], dtype='int64')
+    temp = np.array([step['main']['temp'] for step in steps], dtype='float64')
+    humidity = np.array([step['main']['humidity'] for step in steps], dtype='float64')
+    wind_speed = np.array([step.get('wind', {}).get('speed', 0) for step in steps], dtype='float64')
+    clouds = np.array([step.get('clouds', {}).get('all', 0) for step in steps], dtype='float64')
+    condition = np.array([step['weather'][0]['main'].lower() for step in steps])
+
+    uv_index = np.atleast_1d(estimate_uv_index(lat, lon, timestamps, cloud_cover=clouds))
+    scores = score_concerns(temp, humidity, wind_speed, condition, uv_index)
+
+    step_seconds = int(np.median(np.diff(timestamps))) if len(timestamps) > 1 else 3 * 3600
+    worst = np.max(np.vstack([scores[concern] for concern in CONCERNS]), axis=0)
+    safe = worst < SAFE_SCORE
+
+    peaks = {}
+    for concern in CONCERNS:
+        index = int(np.argmax(scores[concern]))
+        peak_score = float(scores[concern][index])
+        peaks[concern] = {
+            'time': _isoformat(timestamps[index]),
+            'score': round(peak_score, 1),
+            'severity': risk_level(peak_score)
+        }
+
+    return {
+        'city': city.get('name', ''),
+        'country': city.get('country', ''),
+        'coordinates': {'lat': lat, 'lon': lon},
+        'step_hours': round(step_seconds / 3600, 2),
+        'times': [_isoformat(timestamp) for timestamp in timestamps],
+        'temperature': np.round(temp, 1).tolist(),
+        'humidity': humidity.astype('int64').tolist(),
+        'uv_index': np.round(uv_index, 1).tolist(),
+        'conditions': [step['weather'][0]['main'] for step in steps],
+        'scores': {concern: np.round(scores[concern], 1).tolist() for concern in CONCERNS},
+        'peaks': peaks,
+        'safe_windows': _safe_windows(safe, timestamps, step_seconds)
+    }
@@ -0,0 +1,174 @@
+"""
+Offline Gazetteer
+Bundled city list (data/cities.csv) served from memory:
+- forward lookup / autocomplete via a sorted prefix index
+- reverse lookup via a 1-degree spatial grid
+so city resolution never needs a geocoding round trip
+"""
+
+import csv
+import math
+import os
+import threading
+import unicodedata
+from bisect import bisect_left
+
+GAZETTEER_PATH = os.environ.get(
+    'GAZETTEER_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'cities.csv')
+)
+# Reverse lookups farther than this from any known city return None
+# (weather_api then asks the upstream reverse geocoding API)
+GAZETTEER_MAX_DISTANCE_KM = float(os.environ.get('GAZETTEER_MAX_DISTANCE_KM', 75))
+
+EARTH_RADIUS_KM = 6371.0
+GRID_CELL_DEGREES = 1.0
+
+
+def normalize_name(name):
+    """Lowercase, strip accents and collapse whitespace"""
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(ch for ch in name if not unicodedata.combining(ch))
+    return ' '.join(name.lower().split())
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class Gazetteer:
+    """In-memory city index with prefix and spatial lookups"""
+
+    def __init__(self, rows):
+        # Parallel tuples keep the footprint small: one row per city
+        self.cities = [
+            (row['name'], row.get('state', ''), row['country'], float(row['lat']), float(row['lon']))
+            for row in rows
+        ]
+
+        # Sorted (normalized name, city index) pairs for bisect prefix search
+        self._names = sorted(
+            (normalize_name(city[0]), i) for i, city in enumerate(self.cities)
+        )
+        self._name_keys = [name for name, _ in self._names]
+
+        # 1-degree grid cells -> city indexes for nearest-neighbour search
+        self._grid = {}
+        for i, city in enumerate(self.cities):
+            self._grid.setdefault(self._cell(city[3], city[4]), []).append(i)
+
+    @classmethod
+    def from_csv(cls, path):
+        with open(path, newline='', encoding='utf-8') as f:
+            return cls(list(csv.DictReader(f)))
+
+    def _cell(self, lat, lon):
+        return (int(math.floor(lat / GRID_CELL_DEGREES)), int(math.floor(lon / GRID_CELL_DEGREES)))
+
+    def _to_result(self, index, distance_km=None):
+        name, state, country, lat, lon = self.cities[index]
+        result = {'name': name, 'state': state, 'country': country, 'lat': lat, 'lon': lon}
+        if distance_km is not None:
+            result['distance_km'] = round(distance_km, 2)
+        return result
+
+    def _prefix_range(self, prefix):
+        start = bisect_left(self._name_keys, prefix)
+        end = bisect_left(self._name_keys, prefix + '\uffff', lo=start)
+        return start, end
+
+    def lookup(self, query):
+        """
+        Resolve 'City' or 'City,CC' (or 'City,State,CC') to one city
+        Returns a result dict or None
+        """
+        parts = [normalize_name(part) for part in query.split(',') if part.strip()]
+        if not parts:
+            return None
+
+        name, qualifiers = parts[0], parts[1:]
+        start, end = self._prefix_range(name)
+        for key, index in self._names[start:end]:
+            if key != name:
+                break
+            _, state, country, _, _ = self.cities[index]
+            if all(q in (country.lower(), normalize_name(state)) for q in qualifiers):
+                return self._to_result(index)
+        return None
+
+    def autocomplete(self, prefix, limit=10):
+        """Return up to `limit` cities whose name starts with prefix"""
+        prefix = normalize_name(prefix)
+        if not prefix:
+            return []
+        start, end = self._prefix_range(prefix)
+        return [self._to_result(index) for _, index in self._names[start:min(end, start + limit)]]
+
+    def nearest(self, lat, lon, max_distance_km=None):
+        """
+        Nearest known city to the coordinates, searching the grid cells in reach
+        Returns a result dict with distance_km, or None if beyond max distance
+        """
+        max_distance_km = GAZETTEER_MAX_DISTANCE_KM if max_distance_km is None else max_distance_km
+        cell_lat, cell_lon = self._cell(lat, lon)
+
+        # A grid cell is ~111 km tall but only ~111 * cos(lat) km wide, so
+        # size the longitude rings for the most poleward latitude in reach
+        lat_rings = int(max_distance_km // 111) + 1
+        far_lat = min(90.0, abs(lat) + max_distance_km / 111)
+        cell_width_km = 111 * math.cos(math.radians(far_lat))
+        lon_rings = int(max_distance_km // cell_width_km) + 1 if cell_width_km > 1 else 180
+        if 2 * lon_rings + 1 >= 360:
+            lon_cells = range(-180, 180)
+        else:
+            # Wrap longitude cells across the antimeridian
+            lon_cells = [(cell_lon + dlon + 180) % 360 - 180 for dlon in range(-lon_rings, lon_rings + 1)]
+        best_index, best_distance = None, float('inf')
+
+        for dlat in range(-lat_rings, lat_rings + 1):
+            for lon_cell in lon_cells:
+                for index in self._grid.get((cell_lat + dlat, lon_cell), ()):
+                    distance = haversine_km(lat, lon, self.cities[index][3], self.cities[index][4])
+                    if distance < best_distance:
+                        best_index, best_distance = index, distance
+
+        if best_index is None or best_distance > max_distance_km:
+            return None
+        return self._to_result(best_index, best_distance)
+
+    def __len__(self):
+        return len(self.cities)
+
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer():
+    """Load the bundled gazetteer once per process"""
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                _gazetteer = Gazetteer.from_csv(GAZETTEER_PATH)
+    return _gazetteer
+
+
+def lookup_city(query):
+    """Forward lookup of a city query, None if unknown"""
+    return get_gazetteer().lookup(query)
+
+
+def autocomplete_cities(prefix, limit=10):
+    """Cities whose names start with prefix"""
+    return get_gazetteer().autocomplete(prefix, limit)
+
+
+def nearest_city(lat, lon, max_distance_km=None):
+    """Reverse lookup of coordinates, None if no city is close enough"""
+    return get_gazetteer().nearest(float(lat), float(lon), max_distance_km)
@@ -0,0 +1,110 @@
+"""
+Geohash
+Encode coordinates to geohash tiles and find the tiles next to a point,
+used to quantize coordinate lookups so nearby users share cache entries
+
+Precision guide (cell size at the equator):
+4 = 39 x 20 km, 5 = 4.9 x 4.9 km, 6 = 1.2 x 0.6 km, 7 = 153 x 153 m
+"""
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_DECODE = {char: index for index, char in enumerate(BASE32)}
+
+
+def encode(lat, lon, precision=5):
+    """Geohash of the tile containing (lat, lon)"""
+    lat = min(90.0, max(-90.0, float(lat)))
+    lon = (float(lon) + 180.0) % 360.0 - 180.0
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+
+    chars = []
+    bits = 0
+    value = 0
+    even = True  # Bits alternate lon, lat, lon, ...
+    while len(chars) < precision:
+        bounds, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        mid = (bounds[0] + bounds[1]) / 2
+        value <<= 1
+        if coordinate >= mid:
+            value |= 1
+            bounds[0] = mid
+        else:
+            bounds[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def bounds(geohash):
+    """(lat_min, lat_max, lon_min, lon_max) of a tile"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            target = lon_range if even else lat_range
+            mid = (target[0] + target[1]) / 2
+            if (value >> shift) & 1:
+                target[0] = mid
+            else:
+                target[1] = mid
+            even = not even
+    return lat_range[0], lat_range[1], lon_range[0], lon_range[1]
+
+
+def center(geohash):
+    """(lat, lon) at the middle of a tile"""
+    lat_min, lat_max, lon_min, lon_max = bounds(geohash)
+    return (lat_min + lat_max) / 2, (lon_min + lon_max) / 2
+
+
+def neighbor(geohash, dlat, dlon):
+    """
+    Adjacent tile dlat rows north (-1 south) and dlon columns east (-1 west)
+    Wraps across the antimeridian; None beyond the poles
+    """
+    lat_min, lat_max, lon_min, lon_max = bounds(geohash)
+    lat = (lat_min + lat_max) / 2 + dlat * (lat_max - lat_min)
+    lon = (lon_min + lon_max) / 2 + dlon * (lon_max - lon_min)
+    if not -90.0 <= lat <= 90.0:
+        return None
+    return encode(lat, lon, len(geohash))
+
+
+def nearby_tiles(lat, lon, geohash, margin):
+    """
+    Tiles adjacent to the edges (and corners) that (lat, lon) lies within
+    `margin` of, as a fraction of the tile size, closest edges first
+    """
+    lat_min, lat_max, lon_min, lon_max = bounds(geohash)
+    lat_size = lat_max - lat_min
+    lon_size = lon_max - lon_min
+    lat = float(lat)
+    lon = (float(lon) + 180.0) % 360.0 - 180.0
+
+    # (distance as a fraction of the tile, direction)
+    rows = [((lat_max - lat) / lat_size, 1), ((lat - lat_min) / lat_size, -1)]
+    cols = [((lon_max - lon) / lon_size, 1), ((lon - lon_min) / lon_size, -1)]
+    near_rows = [(distance, step) for distance, step in rows if distance <= margin]
+    near_cols = [(distance, step) for distance, step in cols if distance <= margin]
+
+    candidates = [(distance, step, 0) for distance, step in near_rows]
+    candidates += [(distance, 0, step) for distance, step in near_cols]
+    candidates += [
+        (max(row_distance, col_distance), row_step, col_step)
+        for row_distance, row_step in near_rows
+        for col_distance, col_step in near_cols
+    ]
+
+    tiles = []
+    for _, dlat, dlon in sorted(candidates):
+        tile = neighbor(geohash, dlat, dlon)
+        if tile and tile != geohash and tile not in tiles:
+            tiles.append(tile)
+    return tiles
@@ -0,0 +1,95 @@
+"""
+Request Hedging
+Decides when a slow upstream call gets a duplicate ("hedge") request:
+after the endpoint's recent p95 latency, and only while the hedge budget
+(a fraction of primary calls) allows it
+"""
+
+import math
+import threading
+from collections import deque
+
+
+class HedgePolicy:
+    """
+    Per-endpoint latency tracker plus a shared hedge budget
+
+    Every primary call earns `budget` hedge credits (capped at `burst`);
+    a hedge spends one, so hedges stay at or below budget x primary calls
+    over time. The hedge delay is the `percentile` latency over the last
+    `window` successful calls, once `min_samples` have been seen.
+    """
+
+    def __init__(self, percentile=95, budget=0.05, burst=5, window=200, min_samples=20, min_delay=0.05):
+        self.percentile = percentile
+        self.budget = budget
+        self.burst = burst
+        self.window = window
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._delays = {}
+        self._credits = float(burst)
+
+        self.primaries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.skipped_budget = 0
+
+    def observe(self, endpoint, latency):
+        """Record a successful call's latency"""
+        with self._lock:
+            samples = self._latencies.get(endpoint)
+            if samples is None:
+                samples = self._latencies[endpoint] = deque(maxlen=self.window)
+            samples.append(latency)
+            # Recompute the percentile every few samples rather than every call
+            if len(samples) >= self.min_samples and (endpoint not in self._delays or len(samples) % 8 == 0):
+                ordered = sorted(samples)
+                index = min(len(ordered) - 1, math.ceil(self.percentile / 100 * len(ordered)) - 1)
+                self._delays[endpoint] = max(self.min_delay, ordered[index])
+
+    def delay(self, endpoint):
+        """Seconds to wait before hedging, None until enough samples exist"""
+        with self._lock:
+            self.primaries += 1
+            self._credits = min(self.burst, self._credits + self.budget)
+            return self._delays.get(endpoint)
+
+    def try_hedge(self):
+        """Spend a hedge credit; False when over budget"""
+        with self._lock:
+            if self._credits < 1:
+                self.skipped_budget += 1
+                return False
+            self._credits -= 1
+            self.hedges += 1
+            return True
+
+    def refund(self):
+        """Return a credit for a hedge that could not be sent after all"""
+        with self._lock:
+            self._credits = min(self.burst, self._credits + 1)
+            self.hedges -= 1
+
+    def record_winner(self, hedge_won):
+        """Record which of the two requests answered first"""
+        if hedge_won:
+            with self._lock:
+                self.hedge_wins += 1
+
+    def stats(self):
+        """Hedge counters, win rate and current delays for monitoring"""
+        with self._lock:
+            return {
+                'primaries': self.primaries,
+                'hedges': self.hedges,
+                'hedge_rate': round(self.hedges / self.primaries, 4) if self.primaries else 0.0,
+                'hedge_wins': self.hedge_wins,
+                'win_rate': round(self.hedge_wins / self.hedges, 3) if self.hedges else 0.0,
+                'skipped_budget': self.skipped_budget,
+                'budget': self.budget,
+                'delays': {endpoint: round(delay, 3) for endpoint, delay in self._delays.items()}
+            }
@@ -0,0 +1,237 @@
+"""
+Upstream Rate Limiter
+Token bucket for the shared OpenWeatherMap API key, so bursts across all
+gunicorn workers stay under the per-minute quota instead of turning into 429s
+
+Calls carry a priority (interactive > batch > background). Lower priorities
+may not spend the reserved share of the bucket, so user-facing requests keep
+getting tokens while refreshes and batch jobs back off to cache/fallbacks.
+"""
+
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+BACKGROUND = 'background'
+PRIORITIES = (INTERACTIVE, BATCH, BACKGROUND)
+
+_priority = contextvars.ContextVar('upstream_priority', default=INTERACTIVE)
+
+
+class RateLimitedError(requests.exceptions.RequestException):
+    """Raised instead of calling upstream when the API key budget is spent"""
+
+
+def current_priority():
+    """Priority of upstream calls made from the current context"""
+    return _priority.get()
+
+
+@contextmanager
+def upstream_priority(priority):
+    """Run upstream calls inside the block at the given priority"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def run_with_priority(priority, fn, *args):
+    """Call fn(*args) at a priority (for work handed to executor threads)"""
+    with upstream_priority(priority):
+        return fn(*args)
+
+
+class TokenBucket:
+    """
+    In-process token bucket (one budget per worker)
+    Refills at rate_per_minute / 60 tokens per second up to `burst`.
+    A call at a given priority is granted only if a token is left above
+    that priority's reserve (a fraction of the burst).
+    """
+
+    def __init__(self, rate_per_minute, burst, reserves=None):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.reserves = reserves or {}
+        self.granted = {priority: 0 for priority in PRIORITIES}
+        self.denied = {priority: 0 for priority in PRIORITIES}
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def _floor(self, priority):
+        return self.reserves.get(priority, 0.0) * self.burst
+
+    def _refill(self, tokens, elapsed):
+        return min(self.burst, tokens + max(0.0, elapsed) * self.rate)
+
+    def _take(self, priority):
+        """Try to spend one token, returns (granted, tokens_left)"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = self._refill(self._tokens, now - self._updated)
+            self._updated = now
+            if self._tokens - 1 < self._floor(priority):
+                return False, self._tokens
+            self._tokens -= 1
+            return True, self._tokens
+
+    def available(self, priority=INTERACTIVE):
+        """Whole calls a priority can still make right now"""
+        return max(0, int(self.remaining() - self._floor(priority)))
+
+    def remaining(self):
+        """Tokens currently available (before reserves)"""
+        with self._lock:
+            return self._refill(self._tokens, time.monotonic() - self._updated)
+
+    def acquire(self, priority=INTERACTIVE, wait=0.0):
+        """
+        Spend one token, waiting up to `wait` seconds for a refill
+        Returns True if the call may go upstream
+        """
+        deadline = time.monotonic() + wait
+        while True:
+            granted, tokens = self._take(priority)
+            if granted:
+                self.granted[priority] = self.granted.get(priority, 0) + 1
+                return True
+
+            sleep_for = (self._floor(priority) + 1 - tokens) / self.rate
+            if time.monotonic() + sleep_for > deadline:
+                self.denied[priority] = self.denied.get(priority, 0) + 1
+                return False
+            time.sleep(sleep_for)
+
+    def stats(self):
+        """Remaining budget and grant/deny counters for monitoring"""
+        remaining = self.remaining()
+        return {
+            'backend': 'memory',
+            'rate_per_minute': round(self.rate * 60, 2),
+            'burst': self.burst,
+            'remaining': round(remaining, 2),
+            'available': {
+                priority: max(0, int(remaining - self._floor(priority)))
+                for priority in PRIORITIES
+            },
+            'granted': dict(self.granted),
+            'denied': dict(self.denied)
+        }
+
+
+class SQLiteTokenBucket(TokenBucket):
+    """
+    Token bucket stored in a local SQLite database, shared by every worker
+    process on the host. Each take is one short IMMEDIATE transaction.
+    Grant/deny counters are per worker.
+    """
+
+    def __init__(self, path, rate_per_minute, burst, reserves=None, name='openweathermap'):
+        super().__init__(rate_per_minute, burst, reserves)
+        self.path = path
+        self.name = name
+        self._local = threading.local()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connect().execute(
+            'CREATE TABLE IF NOT EXISTS buckets ('
+            ' name TEXT PRIMARY KEY,'
+            ' tokens REAL NOT NULL,'
+            ' updated_at REAL NOT NULL)'
+        )
+
+    def _connect(self):
+        """One connection per thread per process (connections never cross fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _load(self, conn, now):
+        row = conn.execute('SELECT tokens, updated_at FROM buckets WHERE name = ?', (self.name,)).fetchone()
+        if row is None:
+            return float(self.burst)
+        return self._refill(row[0], now - row[1])
+
+    def _take(self, priority):
+        """Try to spend one token, returns (granted, tokens_left)"""
+        # Wall clock, since the state is shared between processes
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                tokens = self._load(conn, now)
+                granted = tokens - 1 >= self._floor(priority)
+                if granted:
+                    tokens -= 1
+                conn.execute(
+                    'INSERT OR REPLACE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)',
+                    (self.name, tokens, now)
+                )
+                conn.execute('COMMIT')
+            except sqlite3.Error:
+                conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            # Never block upstream calls because the shared state is unavailable
+            print(f"Shared rate limiter unavailable: {e}")
+            return True, float(self.burst)
+        return granted, tokens
+
+    def remaining(self):
+        """Tokens currently available to all workers (before reserves)"""
+        try:
+            return self._load(self._connect(), time.time())
+        except sqlite3.Error as e:
+            print(f"Shared rate limiter read failed: {e}")
+            return float(self.burst)
+
+    def stats(self):
+        stats = super().stats()
+        stats['backend'] = 'sqlite'
+        return stats
+
+
+class UnlimitedBucket:
+    """Stand-in used when rate limiting is disabled"""
+
+    def acquire(self, priority=INTERACTIVE, wait=0.0):
+        return True
+
+    def available(self, priority=INTERACTIVE):
+        return float('inf')
+
+    def stats(self):
+        return {'backend': 'disabled'}
+
+
+def create_rate_limiter(backend, rate_per_minute, burst, reserves=None, path=None):
+    """
+    Build the configured limiter ('memory', 'sqlite'; a rate of 0 disables it)
+    Falls back to the in-process bucket when the SQLite file cannot be
+    created (e.g. a read-only or serverless filesystem)
+    """
+    if rate_per_minute <= 0:
+        return UnlimitedBucket()
+    if backend == 'sqlite':
+        try:
+            return SQLiteTokenBucket(path, rate_per_minute, burst, reserves)
+        except (sqlite3.Error, OSError) as e:
+            print(f"Shared rate limiter unavailable ({e}), using a per-worker budget")
+    return TokenBucket(rate_per_minute, burst, reserves)
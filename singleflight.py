@@ -0,0 +1,113 @@
+"""
+Single-flight Request Coalescing
+Concurrent callers asking for the same key share one in-flight upstream call
+Sync (threads) and async (coroutines) callers share the same in-flight calls
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class _Call:
+    """One in-flight call and the future its waiters share"""
+
+    __slots__ = ('future', 'waiters', 'task')
+
+    def __init__(self):
+        self.future = Future()
+        self.waiters = 0
+        self.task = None  # Async leader's task, referenced until it settles
+
+
+class SingleFlight:
+    """
+    Deduplicate concurrent calls by key
+    The first caller (leader) runs the function, everyone else waits for it
+    and gets the leader's result or exception
+    """
+
+    def __init__(self, name='singleflight'):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def _join(self, key):
+        """Return (call, is_leader) for key"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                return call, False
+            call = _Call()
+            self._calls[key] = call
+            self.executions += 1
+            return call, True
+
+    def _settle(self, key, call, result=None, error=None):
+        """Release the key and hand the leader's outcome to its waiters"""
+        with self._lock:
+            self._calls.pop(key, None)
+        call.task = None
+        if error is not None:
+            call.future.set_exception(error)
+        else:
+            call.future.set_result(result)
+
+    def do(self, key, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) once per key among concurrent callers"""
+        call, leader = self._join(key)
+        if not leader:
+            return call.future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._settle(key, call, error=e)
+            raise
+        self._settle(key, call, result)
+        return result
+
+    async def do_async(self, key, fn, *args):
+        """
+        Await fn(*args) (a coroutine function) once per key, sharing calls with do()
+        The call runs as its own task on the running loop rather than inside
+        the first caller, so a caller giving up (its own deadline) never
+        cancels it for the others; every caller waits through a shield
+        """
+        call, leader = self._join(key)
+        if leader:
+            call.task = asyncio.get_running_loop().create_task(self._run_async(key, call, fn, args))
+        return await asyncio.shield(asyncio.wrap_future(call.future))
+
+    async def _run_async(self, key, call, fn, args):
+        """Leader task: run fn and settle the shared future"""
+        try:
+            result = await fn(*args)
+        except asyncio.CancelledError:
+            # Only when the loop shuts down; waiters see a timeout, never a cancellation
+            self._settle(key, call, error=asyncio.TimeoutError(f"'{self.name}' call for {key!r} was cancelled"))
+            raise
+        except Exception as e:
+            # Delivered through the future, not re-raised into an unobserved task
+            self._settle(key, call, error=e)
+            return
+        except BaseException as e:
+            self._settle(key, call, error=e)
+            raise
+        self._settle(key, call, result)
+
+    def stats(self):
+        """Return coalescing counters for monitoring"""
+        with self._lock:
+            total = self.executions + self.coalesced
+            return {
+                'name': self.name,
+                'in_flight': len(self._calls),
+                'executions': self.executions,
+                'coalesced': self.coalesced,
+                'coalesce_rate': round(self.coalesced / total, 3) if total else 0.0
+            }
@@ -13,11 +13,268 @@ except ImportError:
     TENSORFLOW_AVAILABLE = False
     print("TensorFlow not available. Using advanced computer vision analysis.")
 
+import os
+
 import numpy as np
 import cv2
 from PIL import Image
 import io
 
+# Longest side (pixels) uploads are reduced to before analysis; 0 = full resolution.
+# The rule thresholds were tuned at full resolution and downscaling averages
+# away sensor noise (texture_variance and the std_* features drop), so the
+# default keeps 12 MP (4000 x 3000) phone photos at native size and only
+# bounds larger uploads; tests/test_skin_model.py checks it stays in tolerance
+ANALYSIS_MAX_SIDE = int(os.environ.get('SKIN_ANALYSIS_MAX_SIDE', '4096'))
+
+# Largest drift allowed between bounded and full-resolution features:
+# absolute (0-255 channel statistics unless overridden), relative for variance
+FEATURE_TOLERANCE = 3.0
+FEATURE_TOLERANCE_OVERRIDES = {'edge_density': 0.02}
+RELATIVE_FEATURE_TOLERANCE = {'texture_variance': 0.15}
+
+# Order of the columns in a feature matrix (see features_matrix)
+FEATURE_NAMES = (
+    'avg_red', 'avg_green', 'avg_blue', 'std_red', 'std_green', 'std_blue',
+    'avg_hue', 'avg_saturation', 'avg_value', 'std_hue', 'std_saturation', 'std_value',
+    'avg_l', 'avg_a', 'avg_b', 'std_l', 'std_a', 'std_b',
+    'redness_index', 'texture_variance', 'edge_density', 'brightness'
+)
+
+# Rule-based thresholds derived from dermatological research.
+# Each term (feature, low, high, weight) adds weight when low < value < high
+# (None = unbounded). A condition is reported when its total reaches
+# min_score, as min(score_cap, total) with confidence
+# min(confidence_cap, confidence_base + total / confidence_divisor) and
+# severity[0] above severity_cutoff, severity[1] otherwise.
+CONDITION_RULES = (
+    {
+        # Indicators: High redness, texture variance, edge density
+        'type': 'Acne',
+        'terms': (
+            ('redness_index', 20, None, 35),
+            ('texture_variance', 800, None, 25),
+            ('edge_density', 0.15, None, 20),
+            ('std_red', 30, None, 15)
+        ),
+        'min_score': 40, 'score_cap': 95,
+        'confidence_base': 65, 'confidence_divisor': 3, 'confidence_cap': 92,
+        'severity_cutoff': 70, 'severity': ('high', 'moderate'),
+        'indicators': ['Redness', 'Texture Irregularity', 'Inflammation']
+    },
+    {
+        # Indicators: Uneven skin tone, high variance in lightness
+        'type': 'Pigmentation',
+        'terms': (
+            ('std_l', 15, None, 30),
+            ('avg_l', None, 120, 25),  # Darker overall
+            ('std_value', 20, None, 20),
+            ('texture_variance', 600, None, 15)
+        ),
+        'min_score': 35, 'score_cap': 90,
+        'confidence_base': 60, 'confidence_divisor': 2.5, 'confidence_cap': 88,
+        'severity_cutoff': 65, 'severity': ('high', 'moderate'),
+        'indicators': ['Uneven Skin Tone', 'Dark Spots', 'Hyperpigmentation']
+    },
+    {
+        # Indicators: High redness, high brightness, elevated red values
+        'type': 'Sunburn',
+        'terms': (
+            ('redness_index', 25, None, 35),
+            ('avg_red', 160, None, 30),
+            ('avg_a', 140, None, 20),  # LAB a channel (red)
+            ('brightness', 140, None, 10)
+        ),
+        'min_score': 35, 'score_cap': 95,
+        'confidence_base': 70, 'confidence_divisor': 4, 'confidence_cap': 90,
+        'severity_cutoff': 70, 'severity': ('high', 'moderate'),
+        'indicators': ['Redness', 'Inflammation', 'UV Damage']
+    },
+    {
+        # Indicators: Specific color patterns, texture, patches
+        'type': 'Fungal Infection',
+        'terms': (
+            ('avg_hue', 15, 35, 25),  # Yellow-brown range
+            ('avg_saturation', 100, None, 20),
+            ('texture_variance', 700, None, 20),
+            ('edge_density', 0.12, None, 15),
+            ('std_hue', 8, None, 10)
+        ),
+        'min_score': 40, 'score_cap': 85,
+        'confidence_base': 55, 'confidence_divisor': 2, 'confidence_cap': 80,
+        'severity_cutoff': 65, 'severity': ('high', 'moderate'),
+        'indicators': ['Discoloration', 'Texture Changes', 'Patches']
+    },
+    {
+        # Indicators: Dryness, redness, texture irregularity
+        'type': 'Eczema',
+        'terms': (
+            ('redness_index', 10, 25, 25),  # Moderate redness
+            ('texture_variance', 600, None, 25),
+            ('edge_density', 0.10, None, 20),
+            ('std_saturation', 25, None, 15),
+            ('avg_l', None, 140, 10)
+        ),
+        'min_score': 40, 'score_cap': 88,
+        'confidence_base': 58, 'confidence_divisor': 2.5, 'confidence_cap': 85,
+        'severity_cutoff': 70, 'severity': ('high', 'moderate'),
+        'indicators': ['Dryness', 'Redness', 'Texture Irregularity', 'Inflammation']
+    },
+    {
+        # Indicators: Low texture variance, dull appearance, low saturation
+        'type': 'Dryness',
+        'terms': (
+            ('texture_variance', None, 500, 30),
+            ('avg_saturation', None, 60, 25),
+            ('edge_density', None, 0.08, 20),
+            ('brightness', 100, 180, 15),
+            ('std_value', None, 18, 10)
+        ),
+        'min_score': 35, 'score_cap': 85,
+        'confidence_base': 60, 'confidence_divisor': 3, 'confidence_cap': 82,
+        'severity_cutoff': 60, 'severity': ('moderate', 'low'),
+        'indicators': ['Low Moisture', 'Dull Appearance', 'Flaky Texture']
+    }
+)
+
+# Reported when no condition reaches its min_score
+HEALTHY_CONDITION = {
+    'type': 'Healthy',
+    'score': 20,
+    'confidence': 85,
+    'severity': 'low',
+    'indicators': ['Clear Skin', 'Even Tone', 'Good Texture']
+}
+
+def _compile_rules(rules):
+    """Flatten CONDITION_RULES into arrays, one entry per term / per rule"""
+    terms = [(index, term) for index, rule in enumerate(rules) for term in rule['terms']]
+    membership = np.zeros((len(terms), len(rules)))
+    for row, (index, _) in enumerate(terms):
+        membership[row, index] = 1
+    
+    def column(key):
+        return np.array([rule[key] for rule in rules], dtype='float64')
+    
+    return {
+        'columns': np.array([FEATURE_NAMES.index(term[0]) for _, term in terms]),
+        'low': np.array([-np.inf if term[1] is None else term[1] for _, term in terms]),
+        'high': np.array([np.inf if term[2] is None else term[2] for _, term in terms]),
+        # Weights folded into the term -> rule summation matrix
+        'weights': membership * np.array([term[3] for _, term in terms], dtype='float64')[:, None],
+        'min_score': column('min_score'),
+        'score_cap': column('score_cap'),
+        'confidence_base': column('confidence_base'),
+        'confidence_divisor': column('confidence_divisor'),
+        'confidence_cap': column('confidence_cap'),
+        'severity_cutoff': column('severity_cutoff')
+    }
+
+_COMPILED_RULES = _compile_rules(CONDITION_RULES)
+
+def features_matrix(features_list):
+    """Stack feature dicts into an (N x len(FEATURE_NAMES)) float matrix"""
+    return np.array([[features[name] for name in FEATURE_NAMES] for features in features_list],
+                    dtype='float64').reshape(-1, len(FEATURE_NAMES))
+
+def score_feature_matrix(matrix):
+    """
+    Evaluate CONDITION_RULES over an (N x features) matrix
+    Returns (N x rules) arrays: raw totals, detected flags, capped scores,
+    confidences and high-severity flags
+    """
+    rules = _COMPILED_RULES
+    values = np.asarray(matrix, dtype='float64')[:, rules['columns']]
+    hits = (values > rules['low']) & (values < rules['high'])
+    totals = hits @ rules['weights']
+    return {
+        'totals': totals,
+        'detected': totals >= rules['min_score'],
+        'scores': np.minimum(rules['score_cap'], totals),
+        'confidence': np.minimum(rules['confidence_cap'],
+                                 rules['confidence_base'] + totals / rules['confidence_divisor']),
+        'severe': totals > rules['severity_cutoff']
+    }
+
+def detect_conditions_batch(features_list):
+    """Detected conditions for many feature dicts, one sorted list per input"""
+    return detect_conditions_from_matrix(features_matrix(features_list))
+
+def detect_conditions_from_matrix(matrix):
+    """Detected conditions for each row of an (N x features) matrix"""
+    scored = score_feature_matrix(matrix)
+    results = [[] for _ in range(len(scored['detected']))]
+    
+    # Only the detected (row, rule) pairs become dicts
+    rows, rules = np.nonzero(scored['detected'])
+    scores = scored['scores'][rows, rules].astype('int64').tolist()
+    confidence = scored['confidence'][rows, rules].tolist()
+    severe = scored['severe'][rows, rules].tolist()
+    for row, index, score, conf, high in zip(rows.tolist(), rules.tolist(), scores, confidence, severe):
+        rule = CONDITION_RULES[index]
+        results[row].append({
+            'type': rule['type'],
+            'score': score,
+            'confidence': conf,
+            'severity': rule['severity'][0 if high else 1],
+            'indicators': rule['indicators'][:]
+        })
+    
+    for conditions in results:
+        if not conditions:
+            conditions.append(dict(HEALTHY_CONDITION, indicators=HEALTHY_CONDITION['indicators'][:]))
+        # Sort by score
+        conditions.sort(key=lambda x: x['score'], reverse=True)
+    return results
+
+# Rows squared at a time by _stack_moments (bounds its uint16 temporary)
+MOMENT_ROW_BLOCK = 64
+
+def _stack_moments(rows, width):
+    """
+    Per-image, per-channel mean and std of a uint8 stack viewed as
+    (N, H, W * channels) rows, as two (N x channels) arrays
+    Sums run down the rows, so every step adds whole contiguous rows;
+    squares are taken a block of rows at a time, across all images at once.
+    """
+    count, height, row_length = rows.shape
+    channels = row_length // width
+    pixels = height * width
+    
+    sums = rows.sum(axis=1, dtype='uint32')
+    squares = np.zeros((count, row_length), dtype='uint64')
+    for start in range(0, height, MOMENT_ROW_BLOCK):
+        block = np.square(rows[:, start:start + MOMENT_ROW_BLOCK], dtype='uint16')
+        squares += block.sum(axis=1, dtype='uint32')
+    
+    means = sums.reshape(count, width, channels).sum(axis=1, dtype='float64') / pixels
+    mean_squares = squares.reshape(count, width, channels).sum(axis=1, dtype='float64') / pixels
+    return means, np.sqrt(np.maximum(mean_squares - means ** 2, 0.0))
+
+def load_analysis_image(image_file, max_side=None):
+    """
+    Decode an upload to an RGB array at most max_side pixels on its longest side
+    JPEGs are scaled during decoding (DCT scaling via Image.draft), so a
+    12 MP photo is never fully decoded; other formats are box-reduced.
+    """
+    if max_side is None:
+        max_side = ANALYSIS_MAX_SIDE
+    
+    img = Image.open(image_file)
+    original_side = max(img.size)
+    if max_side and original_side > max_side:
+        ratio = max_side / original_side
+        target = (max(1, round(img.width * ratio)), max(1, round(img.height * ratio)))
+        # Picks the smallest 1/2, 1/4 or 1/8 JPEG scale still covering target
+        img.draft('RGB', target)
+        img = img.convert('RGB')
+        if img.size != target:
+            img = img.resize(target, Image.Resampling.BOX, reducing_gap=2.0)
+    else:
+        img = img.convert('RGB')
+    
+    return np.array(img)
+
 class SkinConditionClassifier:
     """
     CNN-based skin condition classifier
@@ -112,8 +369,9 @@ class SkinConditionClassifier:
         Preprocess image for model input
         """
         try:
-            # Read image
+            # Read image, letting JPEGs decode at reduced size
             img = Image.open(image_file)
+            img.draft('RGB', (224, 224))
             img = img.convert('RGB')
             
             # Resize to model input size
@@ -130,23 +388,18 @@ class SkinConditionClassifier:
             print(f"Error preprocessing image: {e}")
             return None
     
-    def analyze_with_traditional_cv(self, image_file):
+    def analyze_with_traditional_cv(self, image_file, max_side=None):
         """
         Advanced computer vision analysis without trained model
-        Uses multiple image processing techniques
+        Uses multiple image processing techniques on the image bounded to
+        max_side (default ANALYSIS_MAX_SIDE)
         """
         try:
-            # Read image
-            img = Image.open(image_file)
-            img = img.convert('RGB')
-            img_array = np.array(img)
-            
-            # Convert to different color spaces for analysis
-            img_hsv = cv2.cvtColor(img_array, cv2.COLOR_RGB2HSV)
-            img_lab = cv2.cvtColor(img_array, cv2.COLOR_RGB2LAB)
+            # Read image, reduced to the analysis resolution while decoding
+            img_array = load_analysis_image(image_file, max_side)
             
             # Extract features
-            features = self._extract_features(img_array, img_hsv, img_lab)
+            features = self.extract_features(img_array)
             
             # Analyze conditions based on features
             conditions = self._detect_conditions_from_features(features)
@@ -157,208 +410,98 @@ class SkinConditionClassifier:
             print(f"Error in traditional CV analysis: {e}")
             return self._fallback_analysis(image_file)
     
+    def extract_features(self, img_rgb):
+        """
+        Features of an RGB array (color space conversions included)
+        """
+        img_hsv = cv2.cvtColor(img_rgb, cv2.COLOR_RGB2HSV)
+        img_lab = cv2.cvtColor(img_rgb, cv2.COLOR_RGB2LAB)
+        return self._extract_features(img_rgb, img_hsv, img_lab)
+    
     def _extract_features(self, img_rgb, img_hsv, img_lab):
         """
         Extract comprehensive features from image
         """
         features = {}
         
-        # RGB features
-        features['avg_red'] = np.mean(img_rgb[:, :, 0])
-        features['avg_green'] = np.mean(img_rgb[:, :, 1])
-        features['avg_blue'] = np.mean(img_rgb[:, :, 2])
-        
-        features['std_red'] = np.std(img_rgb[:, :, 0])
-        features['std_green'] = np.std(img_rgb[:, :, 1])
-        features['std_blue'] = np.std(img_rgb[:, :, 2])
-        
-        # HSV features
-        features['avg_hue'] = np.mean(img_hsv[:, :, 0])
-        features['avg_saturation'] = np.mean(img_hsv[:, :, 1])
-        features['avg_value'] = np.mean(img_hsv[:, :, 2])
-        
-        features['std_hue'] = np.std(img_hsv[:, :, 0])
-        features['std_saturation'] = np.std(img_hsv[:, :, 1])
-        features['std_value'] = np.std(img_hsv[:, :, 2])
-        
-        # LAB features (better for skin analysis)
-        features['avg_l'] = np.mean(img_lab[:, :, 0])  # Lightness
-        features['avg_a'] = np.mean(img_lab[:, :, 1])  # Red-Green
-        features['avg_b'] = np.mean(img_lab[:, :, 2])  # Yellow-Blue
-        
-        features['std_l'] = np.std(img_lab[:, :, 0])  # Lightness std dev
-        features['std_a'] = np.std(img_lab[:, :, 1])  # Red-Green std dev
-        features['std_b'] = np.std(img_lab[:, :, 2])  # Yellow-Blue std dev
+        # Per-channel mean and std of each color space, one pass per array
+        # (cv2.meanStdDev reads the interleaved channels together, no temporaries)
+        channels = (
+            (img_rgb, ('red', 'green', 'blue')),
+            (img_hsv, ('hue', 'saturation', 'value')),
+            (img_lab, ('l', 'a', 'b'))  # LAB: lightness, red-green, yellow-blue
+        )
+        for img, names in channels:
+            means, stds = cv2.meanStdDev(img)
+            for name, mean in zip(names, means[:, 0]):
+                features[f'avg_{name}'] = float(mean)
+            for name, std in zip(names, stds[:, 0]):
+                features[f'std_{name}'] = float(std)
         
         # Calculate redness index
         features['redness_index'] = (features['avg_red'] - (features['avg_green'] + features['avg_blue']) / 2)
         
         # Calculate texture variance
         gray = cv2.cvtColor(img_rgb, cv2.COLOR_RGB2GRAY)
-        features['texture_variance'] = np.var(gray)
+        gray_std = cv2.meanStdDev(gray)[1][0, 0]
+        features['texture_variance'] = float(gray_std) ** 2
         
         # Edge detection for texture analysis
         edges = cv2.Canny(gray, 50, 150)
-        features['edge_density'] = np.sum(edges > 0) / (edges.shape[0] * edges.shape[1])
+        features['edge_density'] = cv2.countNonZero(edges) / (edges.shape[0] * edges.shape[1])
         
         # Brightness
         features['brightness'] = (features['avg_red'] + features['avg_green'] + features['avg_blue']) / 3
         
         return features
     
-    def _detect_conditions_from_features(self, features):
+    def extract_features_batch(self, batch_rgb):
         """
-        Detect skin conditions based on extracted features
-        Uses rule-based thresholds derived from dermatological research
+        Features for a stack of same-sized RGB images, shape (N, H, W, 3)
+        Color and gray conversions run once over the whole stack, and the
+        moments of every channel of every image come from reductions over
+        the stack of each color space (see _stack_moments). Only Canny, a
+        neighbourhood filter that must not see across image borders, runs
+        per image.
         """
-        conditions = []
-        
-        # 1. ACNE DETECTION
-        # Indicators: High redness, texture variance, edge density
-        acne_score = 0
-        if features['redness_index'] > 20:
-            acne_score += 35
-        if features['texture_variance'] > 800:
-            acne_score += 25
-        if features['edge_density'] > 0.15:
-            acne_score += 20
-        if features['std_red'] > 30:
-            acne_score += 15
-        
-        if acne_score >= 40:
-            conditions.append({
-                'type': 'Acne',
-                'score': min(95, acne_score),
-                'confidence': min(92, 65 + acne_score / 3),
-                'severity': 'high' if acne_score > 70 else 'moderate',
-                'indicators': ['Redness', 'Texture Irregularity', 'Inflammation']
-            })
+        count, height, width = batch_rgb.shape[:3]
+        pixels = height * width
         
-        # 2. PIGMENTATION DETECTION
-        # Indicators: Uneven skin tone, high variance in lightness
-        pigmentation_score = 0
-        if features['std_l'] > 15:
-            pigmentation_score += 30
-        if features['avg_l'] < 120:  # Darker overall
-            pigmentation_score += 25
-        if features['std_value'] > 20:
-            pigmentation_score += 20
-        if features['texture_variance'] > 600:
-            pigmentation_score += 15
-        
-        if pigmentation_score >= 35:
-            conditions.append({
-                'type': 'Pigmentation',
-                'score': min(90, pigmentation_score),
-                'confidence': min(88, 60 + pigmentation_score / 2.5),
-                'severity': 'high' if pigmentation_score > 65 else 'moderate',
-                'indicators': ['Uneven Skin Tone', 'Dark Spots', 'Hyperpigmentation']
-            })
-        
-        # 3. SUNBURN DETECTION
-        # Indicators: High redness, high brightness, elevated red values
-        sunburn_score = 0
-        if features['redness_index'] > 25:
-            sunburn_score += 35
-        if features['avg_red'] > 160:
-            sunburn_score += 30
-        if features['avg_a'] > 140:  # LAB a channel (red)
-            sunburn_score += 20
-        if features['brightness'] > 140:
-            sunburn_score += 10
-        
-        if sunburn_score >= 35:
-            conditions.append({
-                'type': 'Sunburn',
-                'score': min(95, sunburn_score),
-                'confidence': min(90, 70 + sunburn_score / 4),
-                'severity': 'high' if sunburn_score > 70 else 'moderate',
-                'indicators': ['Redness', 'Inflammation', 'UV Damage']
-            })
-        
-        # 4. FUNGAL INFECTION DETECTION
-        # Indicators: Specific color patterns, texture, patches
-        fungal_score = 0
-        if 15 < features['avg_hue'] < 35:  # Yellow-brown range
-            fungal_score += 25
-        if features['avg_saturation'] > 100:
-            fungal_score += 20
-        if features['texture_variance'] > 700:
-            fungal_score += 20
-        if features['edge_density'] > 0.12:
-            fungal_score += 15
-        if features['std_hue'] > 8:
-            fungal_score += 10
-        
-        if fungal_score >= 40:
-            conditions.append({
-                'type': 'Fungal Infection',
-                'score': min(85, fungal_score),
-                'confidence': min(80, 55 + fungal_score / 2),
-                'severity': 'high' if fungal_score > 65 else 'moderate',
-                'indicators': ['Discoloration', 'Texture Changes', 'Patches']
-            })
-        
-        # 5. ECZEMA DETECTION
-        # Indicators: Dryness, redness, texture irregularity
-        eczema_score = 0
-        if 10 < features['redness_index'] < 25:  # Moderate redness
-            eczema_score += 25
-        if features['texture_variance'] > 600:
-            eczema_score += 25
-        if features['edge_density'] > 0.10:
-            eczema_score += 20
-        if features['std_saturation'] > 25:
-            eczema_score += 15
-        if features['avg_l'] < 140:
-            eczema_score += 10
-        
-        if eczema_score >= 40:
-            conditions.append({
-                'type': 'Eczema',
-                'score': min(88, eczema_score),
-                'confidence': min(85, 58 + eczema_score / 2.5),
-                'severity': 'high' if eczema_score > 70 else 'moderate',
-                'indicators': ['Dryness', 'Redness', 'Texture Irregularity', 'Inflammation']
-            })
-        
-        # 6. DRYNESS DETECTION
-        # Indicators: Low texture variance, dull appearance, low saturation
-        dryness_score = 0
-        if features['texture_variance'] < 500:
-            dryness_score += 30
-        if features['avg_saturation'] < 60:
-            dryness_score += 25
-        if features['edge_density'] < 0.08:
-            dryness_score += 20
-        if 100 < features['brightness'] < 180:
-            dryness_score += 15
-        if features['std_value'] < 18:
-            dryness_score += 10
-        
-        if dryness_score >= 35:
-            conditions.append({
-                'type': 'Dryness',
-                'score': min(85, dryness_score),
-                'confidence': min(82, 60 + dryness_score / 3),
-                'severity': 'moderate' if dryness_score > 60 else 'low',
-                'indicators': ['Low Moisture', 'Dull Appearance', 'Flaky Texture']
-            })
-        
-        # 7. HEALTHY SKIN (if no significant conditions)
-        if len(conditions) == 0:
-            conditions.append({
-                'type': 'Healthy',
-                'score': 20,
-                'confidence': 85,
-                'severity': 'low',
-                'indicators': ['Clear Skin', 'Even Tone', 'Good Texture']
-            })
+        # Conversions are per pixel, so the stack converts as one tall image
+        tall = batch_rgb.reshape(count * height, width, 3)
+        spaces = (
+            tall,
+            cv2.cvtColor(tall, cv2.COLOR_RGB2HSV),
+            cv2.cvtColor(tall, cv2.COLOR_RGB2LAB),
+            cv2.cvtColor(tall, cv2.COLOR_RGB2GRAY)
+        )
         
-        # Sort by score
-        conditions.sort(key=lambda x: x['score'], reverse=True)
+        moments = [_stack_moments(space.reshape(count, height, -1), width) for space in spaces]
+        means = np.hstack([mean for mean, _ in moments])
+        stds = np.hstack([std for _, std in moments])
+        gray = spaces[3].reshape(count, height, width)
         
-        return conditions
+        names = ('red', 'green', 'blue', 'hue', 'saturation', 'value', 'l', 'a', 'b')
+        results = []
+        for index in range(count):
+            features = {}
+            for channel, name in enumerate(names):
+                features[f'avg_{name}'] = float(means[index, channel])
+                features[f'std_{name}'] = float(stds[index, channel])
+            features['redness_index'] = (features['avg_red'] - (features['avg_green'] + features['avg_blue']) / 2)
+            features['texture_variance'] = float(stds[index, 9]) ** 2
+            edges = cv2.Canny(gray[index], 50, 150)
+            features['edge_density'] = cv2.countNonZero(edges) / pixels
+            features['brightness'] = (features['avg_red'] + features['avg_green'] + features['avg_blue']) / 3
+            results.append(features)
+        return results
+    
+    def _detect_conditions_from_features(self, features):
+        """
+        Detect skin conditions based on extracted features
+        Scores the CONDITION_RULES table (see detect_conditions_batch)
+        """
+        return detect_conditions_batch([features])[0]
     
     def _fallback_analysis(self, image_file):
         """
@@ -417,3 +560,106 @@ def analyze_skin_condition(image_file):
     """
     model = get_model()
     return model.predict(image_file)
+
+def extract_image_features(image_file, max_side=None):
+    """
+    Feature vector (FEATURE_NAMES order) of an uploaded image, computed at
+    the analysis resolution; None if the image cannot be decoded
+    """
+    try:
+        features = get_model().extract_features(load_analysis_image(image_file, max_side))
+    except Exception as e:
+        print(f"Error extracting image features: {e}")
+        return None
+    return features_matrix([features])[0]
+
+def extract_image_features_batch(images, max_side=None):
+    """
+    Feature vectors (FEATURE_NAMES order) of several uploads in one pass
+    Images are decoded to the analysis resolution and stacked with the
+    others of exactly the same size, one stack per size. Nothing is
+    resampled to fit, so an image's features never depend on the rest of
+    its batch. Returns one vector per image, None where it cannot be decoded.
+    """
+    model = get_model()
+    
+    decoded = []
+    for image_file in images:
+        if hasattr(image_file, 'seek'):
+            image_file.seek(0)
+        try:
+            decoded.append(load_analysis_image(image_file, max_side))
+        except Exception as e:
+            print(f"Error decoding image in batch: {e}")
+            decoded.append(None)
+    
+    groups = {}
+    for index, item in enumerate(decoded):
+        if item is not None:
+            groups.setdefault(item.shape, []).append(index)
+    
+    vectors = [None] * len(decoded)
+    for indices in groups.values():
+        batch = np.stack([decoded[index] for index in indices])
+        for index, vector in zip(indices, features_matrix(model.extract_features_batch(batch))):
+            vectors[index] = vector
+    return vectors
+
+def analyze_skin_conditions_batch(images, max_side=None):
+    """
+    Analyze several uploaded images in one pass (see extract_image_features_batch)
+    Returns one condition list per image, in input order.
+    """
+    model = get_model()
+    vectors = extract_image_features_batch(images, max_side)
+    
+    decoded = [vector for vector in vectors if vector is not None]
+    if decoded:
+        detected = iter(detect_conditions_from_matrix(np.vstack(decoded)))
+    
+    results = []
+    for image_file, vector in zip(images, vectors):
+        if vector is None:
+            results.append(model._fallback_analysis(image_file))
+        else:
+            results.append(next(detected))
+    return results
+
+def compare_with_full_resolution(image_file, max_side=None):
+    """
+    Check bounded-resolution features against a full-resolution decode
+    Returns both feature sets, per-feature drift, the features outside
+    tolerance and whether the detected condition types agree
+    """
+    model = get_model()
+    
+    image_file.seek(0)
+    full = model.extract_features(load_analysis_image(image_file, max_side=0))
+    image_file.seek(0)
+    bounded_array = load_analysis_image(image_file, max_side)
+    bounded = model.extract_features(bounded_array)
+    
+    drift = {}
+    out_of_tolerance = []
+    for name, full_value in full.items():
+        delta = abs(float(bounded[name]) - float(full_value))
+        if name in RELATIVE_FEATURE_TOLERANCE:
+            delta = delta / max(abs(float(full_value)), 1e-6)
+            limit = RELATIVE_FEATURE_TOLERANCE[name]
+        else:
+            limit = FEATURE_TOLERANCE_OVERRIDES.get(name, FEATURE_TOLERANCE)
+        drift[name] = round(delta, 4)
+        if delta > limit:
+            out_of_tolerance.append(name)
+    
+    full_types = [c['type'] for c in model._detect_conditions_from_features(full)]
+    bounded_types = [c['type'] for c in model._detect_conditions_from_features(bounded)]
+    
+    return {
+        'analysis_size': [bounded_array.shape[1], bounded_array.shape[0]],
+        'full': {name: float(value) for name, value in full.items()},
+        'bounded': {name: float(value) for name, value in bounded.items()},
+        'drift': drift,
+        'out_of_tolerance': out_of_tolerance,
+        'conditions_match': full_types == bounded_types
+    }
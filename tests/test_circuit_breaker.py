@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+
+import circuit_breaker
+import upstream_client
+import weather_api_async
+from circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, OPEN, HALF_OPEN
+
+
+def half_open_breaker(probes=1):
+    """A breaker tripped by one failure that is half-open straight away"""
+    breaker = CircuitBreaker('test', min_calls=1, open_seconds=0, half_open_probes=probes)
+    breaker.before_call()
+    breaker.record(True, 0.0)
+    assert breaker.state == HALF_OPEN
+    return breaker
+
+
+@pytest.fixture
+def breaker(monkeypatch, clock):
+    monkeypatch.setattr(circuit_breaker, 'time', clock)
+    return CircuitBreaker('test', window=4, min_calls=4, failure_rate_threshold=0.5,
+                          slow_call_seconds=1.0, slow_call_rate_threshold=0.5,
+                          open_seconds=30, half_open_probes=2)
+
+
+def trip(breaker):
+    for _ in range(breaker.min_calls):
+        breaker.before_call()
+        breaker.record(True, 0.0)
+    assert breaker.state == OPEN
+
+
+def test_stays_closed_below_min_calls(breaker):
+    for _ in range(3):
+        breaker.before_call()
+        breaker.record(True, 0.0)
+    assert breaker.state == CLOSED
+
+
+def test_opens_on_failure_rate(breaker):
+    for failed in (False, True, False):
+        breaker.before_call()
+        breaker.record(failed, 0.0)
+    assert breaker.state == CLOSED
+
+    breaker.before_call()
+    breaker.record(True, 0.0)
+    assert breaker.state == OPEN
+    assert breaker.times_opened == 1
+
+
+def test_opens_on_slow_call_rate(breaker):
+    for latency in (0.1, 2.0, 0.1, 2.0):
+        breaker.before_call()
+        breaker.record(False, latency)
+    assert breaker.state == OPEN
+
+
+def test_open_rejects_until_open_seconds_pass(breaker, clock):
+    trip(breaker)
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.rejected == 1
+
+    clock.advance(29)
+    assert breaker.state == OPEN
+    clock.advance(1)
+    assert breaker.state == HALF_OPEN
+
+
+def test_half_open_closes_after_successful_probes(breaker, clock):
+    trip(breaker)
+    clock.advance(30)
+
+    breaker.before_call()
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record(False, 0.1)
+    assert breaker.state == HALF_OPEN
+    breaker.record(False, 0.1)
+    assert breaker.state == CLOSED
+    assert breaker.stats()['window_calls'] == 0
+
+
+@pytest.mark.parametrize('failed, latency', [(True, 0.1), (False, 2.0)])
+def test_half_open_reopens_on_failed_or_slow_probe(breaker, clock, failed, latency):
+    trip(breaker)
+    clock.advance(30)
+
+    breaker.before_call()
+    breaker.record(failed, latency)
+    assert breaker.state == OPEN
+    assert breaker.times_opened == 2
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_release_frees_half_open_probe_slot():
+    breaker = half_open_breaker()
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.release()
+    breaker.before_call()
+
+
+class _HangingResponse:
+    async def __aenter__(self):
+        await asyncio.sleep(10)
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class _HangingSession:
+    def get(self, url, params=None):
+        return _HangingResponse()
+
+
+def test_cancelled_async_probe_releases_its_slot(monkeypatch):
+    breaker = half_open_breaker()
+    monkeypatch.setattr(weather_api_async, 'client_session', _HangingSession)
+    monkeypatch.setattr(upstream_client, 'acquire_budget', lambda wait=None: None)
+    monkeypatch.setattr(upstream_client, 'get_breaker', lambda name: breaker)
+
+    async def probe():
+        call = weather_api_async._get_json('http://owm.test/data/2.5/weather', {})
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(call, timeout=0.01)
+
+    asyncio.run(probe())
+
+    # The cancelled probe gave its slot back, so the breaker can still recover
+    assert breaker.state == HALF_OPEN
+    breaker.before_call()
+    breaker.record(False, 0.0)
+    assert breaker.state == 'closed'
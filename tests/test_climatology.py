@@ -0,0 +1,29 @@
+import climatology
+import weather_api
+
+
+def test_lookup_covers_every_field_and_no_air_quality():
+    estimate = climatology.lookup_estimate(51.5, -0.12, month=7)
+
+    assert set(estimate) == set(climatology.FIELDS)
+    assert -60 < estimate['temperature'] < 60
+    assert 0 <= estimate['humidity'] <= 100
+
+
+def test_cells_wrap_around_the_antimeridian():
+    assert climatology._cell(0, 180) == climatology._cell(0, -180)
+    assert climatology._cell(90, 0)[0] == climatology.NUM_LAT - 1
+
+
+def test_estimated_snapshot_is_labelled_and_has_no_air_quality():
+    snapshot = weather_api.get_estimated_snapshot(48.85, 2.35, 'Paris', 'FR')
+
+    assert snapshot.estimated
+    assert 'not live weather' in snapshot.description
+    assert snapshot.aqi is None and snapshot.pm2_5 is None
+    assert snapshot.to_dict()['estimated'] is True
+
+
+def test_fallback_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(weather_api, 'CLIMATOLOGY_FALLBACK', False)
+    assert weather_api.get_estimated_snapshot(48.85, 2.35) is None
@@ -0,0 +1,73 @@
+import numpy as np
+
+from feature_cache import CONTENT, ENTRY_OVERHEAD, INDEX_OVERHEAD, PERCEPTUAL, FeatureCache, chunk_spans
+
+VECTOR = np.zeros(10)
+ENTRY = VECTOR.nbytes + ENTRY_OVERHEAD
+
+
+def test_evicts_least_recently_used_by_bytes():
+    cache = FeatureCache(max_bytes=3 * ENTRY, mode=CONTENT)
+    for name in 'abc':
+        cache.set(('', name), VECTOR)
+    assert cache.get(('', 'a')) is not None  # 'b' is now least recently used
+
+    cache.set(('', 'd'), VECTOR)
+
+    assert len(cache) == 3
+    assert cache.get(('', 'b')) is None
+    assert cache.stats()['bytes'] == 3 * ENTRY
+    assert cache.evictions == 1
+
+
+def test_replacing_a_key_does_not_double_count():
+    cache = FeatureCache(max_bytes=3 * ENTRY, mode=CONTENT)
+    cache.set(('', 'a'), VECTOR)
+    cache.set(('', 'a'), VECTOR + 1)
+
+    assert cache.stats()['bytes'] == ENTRY
+    assert cache.get(('', 'a'))[0] == 1
+
+
+def test_larger_vectors_take_more_of_the_budget():
+    cache = FeatureCache(max_bytes=3 * ENTRY, mode=CONTENT)
+    cache.set(('', 'small'), VECTOR)
+    cache.set(('', 'large'), np.zeros(60))
+
+    assert len(cache) == 1
+    assert cache.get(('', 'large')) is not None
+
+
+def test_perceptual_lookup_matches_within_distance():
+    cache = FeatureCache(max_bytes=1 << 20, mode=PERCEPTUAL, max_distance=4)
+    digest = 0x0F0F_1234_ABCD_5678
+    cache.set((1024, digest), VECTOR)
+
+    assert cache.get((1024, digest ^ 0b1011)) is not None
+    assert cache.near_hits == 1
+    assert cache.get((1024, digest ^ 0b11111)) is None
+    assert cache.get((512, digest)) is None  # other analysis resolution
+
+
+def test_perceptual_index_follows_evictions():
+    spans = len(chunk_spans(4))
+    entry = ENTRY + spans * INDEX_OVERHEAD
+    cache = FeatureCache(max_bytes=2 * entry, mode=PERCEPTUAL, max_distance=4)
+    first = 0x0123_4567_89AB_CDEF
+    for digest in (first, 0xFEDC_BA98_7654_3210, 0x5555_AAAA_5555_AAAA):
+        cache.set((0, digest), VECTOR)
+
+    assert len(cache) == 2
+    assert cache.stats()['bytes'] == 2 * entry
+    assert sum(len(keys) for keys in cache._index.values()) == 2 * spans
+    assert cache.get((0, first ^ 1)) is None
+
+    cache.clear()
+    assert cache._index == {}
+
+
+def test_chunks_cover_the_hash():
+    for distance in range(8):
+        spans = chunk_spans(distance)
+        assert len(spans) == distance + 1
+        assert sum(width for _, width in spans) == 64
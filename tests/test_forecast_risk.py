@@ -0,0 +1,70 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from forecast_risk import CONCERNS, build_risk_timeline, risk_level, score_concerns, score_reading
+
+# Values on and either side of every threshold in CONCERN_RULES
+TEMPS = (4, 5, 6, 9, 10, 11, 20, 21, 25, 26, 28, 29, 35, 36)
+HUMIDITIES = (29, 30, 31, 60, 61, 65, 66, 70, 71)
+WIND_SPEEDS = (0, 10, 11, 15, 16)
+CONDITIONS = ('clear', 'rain', 'snow', 'clouds')
+UV_INDEXES = (0.0, 3.5, 11.0)
+
+
+def test_vectorized_scores_match_single_readings():
+    grid = list(itertools.product(TEMPS, HUMIDITIES, WIND_SPEEDS, CONDITIONS, UV_INDEXES))
+    columns = [np.array(column) for column in zip(*grid)]
+
+    scores = score_concerns(*columns)
+
+    for i, reading in enumerate(grid):
+        expected = score_reading(*reading)
+        assert {concern: scores[concern][i] for concern in CONCERNS} == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('score, level', [
+    (0, None), (29.9, None), (30, 'low'), (50, 'moderate'), (69, 'moderate'), (70, 'high'), (140, 'high')
+])
+def test_risk_level_thresholds(score, level):
+    assert risk_level(score) == level
+
+
+def step(dt, temp, humidity, main, wind=2, clouds=0):
+    return {
+        'dt': dt,
+        'main': {'temp': temp, 'humidity': humidity},
+        'wind': {'speed': wind},
+        'clouds': {'all': clouds},
+        'weather': [{'main': main}]
+    }
+
+
+def test_timeline_reports_peaks_and_safe_windows():
+    # On the equator at lon 0: night at 00Z and 03Z, the sun overhead at 12Z
+    start = 1710892800  # 2024-03-20T00:00Z
+    forecast = {
+        'city': {'name': 'Null Island', 'country': '', 'coord': {'lat': 0.0, 'lon': 0.0}},
+        'list': [
+            step(start, 15, 50, 'Clouds', clouds=100),
+            step(start + 3 * 3600, 15, 50, 'Clouds', clouds=100),
+            step(start + 12 * 3600, 30, 80, 'Clear'),
+            step(start + 15 * 3600, 15, 50, 'Clouds', clouds=100),
+        ]
+    }
+
+    timeline = build_risk_timeline(forecast)
+
+    assert timeline['step_hours'] == 3
+    assert timeline['uv_index'][0] == 0.0
+    assert timeline['peaks']['sunburn']['time'] == '2024-03-20T12:00Z'
+    assert timeline['peaks']['sunburn']['severity'] == 'high'
+    assert timeline['safe_windows'] == [
+        {'start': '2024-03-20T00:00Z', 'end': '2024-03-20T06:00Z'},
+        {'start': '2024-03-20T15:00Z', 'end': '2024-03-20T18:00Z'}
+    ]
+
+
+def test_empty_forecast_has_no_timeline():
+    assert build_risk_timeline({'list': []}) is None
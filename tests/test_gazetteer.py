@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+import weather_api
+import weather_api_async
+from gazetteer import Gazetteer, haversine_km
+from weather_cache import TTLCache
+
+
+def city(name, country, lat, lon, state=''):
+    return {'name': name, 'state': state, 'country': country, 'lat': lat, 'lon': lon}
+
+
+@pytest.fixture
+def gazetteer():
+    return Gazetteer([
+        city('Portland', 'US', 45.5152, -122.6784, 'Oregon'),
+        city('Portland', 'US', 43.6591, -70.2568, 'Maine'),
+        city('Porto', 'PT', 41.1579, -8.6291),
+        city('São Paulo', 'BR', -23.5505, -46.6333),
+        city('Tromsø', 'NO', 69.6492, 18.9553),
+        city('Suva', 'FJ', -18.1248, 178.4501),
+    ])
+
+
+def test_lookup_accepts_qualifiers_and_accents(gazetteer):
+    assert gazetteer.lookup('portland')['state'] == 'Oregon'
+    assert gazetteer.lookup('Portland, Maine')['lon'] == -70.2568
+    assert gazetteer.lookup('sao  paulo,br')['name'] == 'São Paulo'
+    assert gazetteer.lookup('Portland,PT') is None
+
+
+def test_autocomplete_matches_prefixes(gazetteer):
+    assert [c['name'] for c in gazetteer.autocomplete('Port')] == ['Portland', 'Portland', 'Porto']
+    assert gazetteer.autocomplete('Port', limit=1)[0]['name'] == 'Portland'
+    assert gazetteer.autocomplete(' ') == []
+
+
+def test_nearest_scales_longitude_cells_by_latitude(gazetteer):
+    # At 69.6N one longitude degree is ~39 km, so 120 km east is 3+ cells away
+    lat, lon = 69.6492, 18.9553 - 3.1
+
+    nearby = gazetteer.nearest(lat, lon, max_distance_km=150)
+
+    assert nearby['name'] == 'Tromsø'
+    assert nearby['distance_km'] == pytest.approx(haversine_km(lat, lon, 69.6492, 18.9553), abs=0.01)
+
+
+def test_nearest_wraps_across_the_antimeridian(gazetteer):
+    assert gazetteer.nearest(-18.1, -179.8, max_distance_km=300)['name'] == 'Suva'
+
+
+def test_nearest_returns_none_beyond_the_limit(gazetteer):
+    assert gazetteer.nearest(0.0, -30.0, max_distance_km=75) is None
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Answer reverse geocoding calls with a fixed place, counting calls"""
+    calls = []
+
+    class Response:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return [{'name': 'Lochinver', 'country': 'GB', 'lat': 58.15, 'lon': -5.24}]
+
+    def get(url, params=None, **kwargs):
+        calls.append(url)
+        return Response()
+
+    monkeypatch.setattr(weather_api.upstream_client, 'get', get)
+    monkeypatch.setattr(weather_api, 'geocode_cache', TTLCache(maxsize=8, ttl=60))
+    return calls
+
+
+def test_reverse_geocode_far_from_any_city_asks_upstream_once(upstream):
+    place = weather_api.reverse_geocode(58.15, -5.24)
+
+    assert place == {'name': 'Lochinver', 'state': '', 'country': 'GB'}
+    assert weather_api.reverse_geocode('58.151', '-5.241') == place
+    assert upstream == [weather_api.REVERSE_GEOCODING_URL]
+
+
+def test_reverse_geocode_near_a_bundled_city_stays_offline(upstream):
+    assert weather_api.reverse_geocode(51.51, -0.13)['name'] == 'London'
+    assert upstream == []
+
+
+def test_async_reverse_geocode_shares_the_cache(monkeypatch, upstream):
+    calls = []
+
+    async def get_json(url, params):
+        calls.append(url)
+        return []
+
+    monkeypatch.setattr(weather_api_async, '_get_json', get_json)
+    monkeypatch.setattr(weather_api_async, 'geocode_cache', weather_api.geocode_cache)
+
+    assert asyncio.run(weather_api_async.reverse_geocode_async(0.0, -30.0)) is None
+    # The empty answer is cached, so neither path asks again for that tile
+    assert weather_api.reverse_geocode(0.0, -30.0) is None
+    assert calls == [weather_api.REVERSE_GEOCODING_URL]
+    assert upstream == []
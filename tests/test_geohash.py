@@ -0,0 +1,64 @@
+import pytest
+
+import geohash
+
+
+@pytest.mark.parametrize('lat, lon, precision, expected', [
+    (57.64911, 10.40744, 11, 'u4pruydqqvj'),
+    (42.6, -5.6, 5, 'ezs42'),
+    (-25.382708, -49.265506, 6, '6gkzwg'),
+])
+def test_encode_known_values(lat, lon, precision, expected):
+    assert geohash.encode(lat, lon, precision) == expected
+
+
+def test_center_lies_in_its_tile():
+    tile = geohash.encode(51.5074, -0.1278, 6)
+    lat_min, lat_max, lon_min, lon_max = geohash.bounds(tile)
+    lat, lon = geohash.center(tile)
+
+    assert lat_min < lat < lat_max and lon_min < lon < lon_max
+    assert geohash.encode(lat, lon, 6) == tile
+
+
+@pytest.mark.parametrize('dlat, dlon', [
+    (1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)
+])
+def test_neighbor_shares_an_edge_or_corner(dlat, dlon):
+    tile = geohash.encode(40.7128, -74.0060, 5)
+    lat_min, lat_max, lon_min, lon_max = geohash.bounds(tile)
+    n_lat_min, n_lat_max, n_lon_min, n_lon_max = geohash.bounds(geohash.neighbor(tile, dlat, dlon))
+
+    expected_lat = {1: (lat_max, None), -1: (None, lat_min), 0: (lat_min, lat_max)}[dlat]
+    expected_lon = {1: (lon_max, None), -1: (None, lon_min), 0: (lon_min, lon_max)}[dlon]
+    for expected, actual in zip(expected_lat + expected_lon, (n_lat_min, n_lat_max, n_lon_min, n_lon_max)):
+        if expected is not None:
+            assert actual == pytest.approx(expected)
+
+
+def test_neighbor_wraps_across_the_antimeridian():
+    tile = geohash.encode(10.0, 179.99, 4)
+    east = geohash.neighbor(tile, 0, 1)
+
+    assert geohash.bounds(east)[2] == pytest.approx(-180.0)
+
+
+def test_neighbor_beyond_the_pole_is_none():
+    assert geohash.neighbor(geohash.encode(89.99, 0.0, 3), 1, 0) is None
+
+
+def test_nearby_tiles_near_a_corner():
+    tile = geohash.encode(40.7128, -74.0060, 5)
+    lat_min, lat_max, lon_min, lon_max = geohash.bounds(tile)
+    # Close to the north edge, a little further from the east edge
+    lat = lat_max - 0.05 * (lat_max - lat_min)
+    lon = lon_max - 0.1 * (lon_max - lon_min)
+
+    assert geohash.nearby_tiles(lat, lon, tile, 0.2) == [
+        geohash.neighbor(tile, 1, 0), geohash.neighbor(tile, 0, 1), geohash.neighbor(tile, 1, 1)
+    ]
+
+
+def test_no_nearby_tiles_at_the_center():
+    tile = geohash.encode(40.7128, -74.0060, 5)
+    assert geohash.nearby_tiles(*geohash.center(tile), tile, 0.2) == []
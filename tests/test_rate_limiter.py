@@ -0,0 +1,77 @@
+import pytest
+
+import rate_limiter
+from rate_limiter import (
+    BACKGROUND, INTERACTIVE, SQLiteTokenBucket, TokenBucket, create_rate_limiter
+)
+
+
+@pytest.fixture(autouse=True)
+def fake_time(monkeypatch, clock):
+    monkeypatch.setattr(rate_limiter, 'time', clock)
+
+
+def drain(bucket, priority=INTERACTIVE):
+    granted = 0
+    while bucket.acquire(priority):
+        granted += 1
+    return granted
+
+
+def test_token_bucket_refills_at_rate(clock):
+    bucket = TokenBucket(rate_per_minute=60, burst=3)
+    assert drain(bucket) == 3
+
+    clock.advance(1)
+    assert bucket.acquire()
+    assert not bucket.acquire()
+
+
+def test_token_bucket_refill_is_capped_at_burst(clock):
+    bucket = TokenBucket(rate_per_minute=60, burst=3)
+    drain(bucket)
+
+    clock.advance(3600)
+    assert bucket.remaining() == 3
+    assert drain(bucket) == 3
+
+
+def test_token_bucket_waits_for_a_refill(clock):
+    bucket = TokenBucket(rate_per_minute=60, burst=1)
+    drain(bucket)
+
+    assert not bucket.acquire(wait=0.5)
+    assert bucket.acquire(wait=1.0)
+    assert bucket.denied[INTERACTIVE] == 2
+
+
+def test_lower_priorities_leave_the_reserve(clock):
+    bucket = TokenBucket(rate_per_minute=60, burst=4, reserves={BACKGROUND: 0.5})
+    assert drain(bucket, BACKGROUND) == 2
+    assert bucket.available(BACKGROUND) == 0
+    assert drain(bucket, INTERACTIVE) == 2
+
+
+def test_sqlite_bucket_is_shared_and_refills(tmp_path, clock):
+    path = str(tmp_path / 'rate_limit.sqlite3')
+    worker_a = SQLiteTokenBucket(path, rate_per_minute=60, burst=2)
+    worker_b = SQLiteTokenBucket(path, rate_per_minute=60, burst=2)
+
+    assert drain(worker_a) == 2
+    assert not worker_b.acquire()
+
+    clock.advance(1)
+    assert worker_b.acquire()
+    assert not worker_a.acquire()
+
+    clock.advance(3600)
+    assert worker_a.remaining() == 2
+
+
+def test_sqlite_backend_falls_back_to_memory(tmp_path):
+    blocker = tmp_path / 'not_a_directory'
+    blocker.write_text('')
+
+    limiter = create_rate_limiter('sqlite', 60, 2, path=str(blocker / 'rate_limit.sqlite3'))
+    assert type(limiter) is TokenBucket
+    assert limiter.stats()['backend'] == 'memory'
@@ -0,0 +1,168 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, 'timed out waiting'
+        time.sleep(0.001)
+
+
+def run_coalesced(flight, fn, waiters=3):
+    """Run fn once as leader with `waiters` callers joining it; returns each caller's outcome"""
+    release = threading.Event()
+    outcomes = []
+
+    def leader_fn():
+        release.wait(5)
+        return fn()
+
+    def caller(target):
+        try:
+            outcomes.append(('result', flight.do('key', target)))
+        except Exception as e:
+            outcomes.append(('error', e))
+
+    threads = [threading.Thread(target=caller, args=(leader_fn,))]
+    threads[0].start()
+    wait_until(lambda: flight.stats()['in_flight'] == 1)
+    for _ in range(waiters):
+        thread = threading.Thread(target=caller, args=(leader_fn,))
+        thread.start()
+        threads.append(thread)
+    wait_until(lambda: flight.coalesced == waiters)
+
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    return outcomes
+
+
+def test_waiters_share_the_leaders_result():
+    flight = SingleFlight()
+    outcomes = run_coalesced(flight, lambda: 42)
+
+    assert outcomes == [('result', 42)] * 4
+    assert flight.executions == 1
+    assert flight.stats()['in_flight'] == 0
+
+
+def test_waiters_get_the_leaders_exception():
+    flight = SingleFlight()
+    error = ValueError('upstream down')
+
+    def fail():
+        raise error
+
+    outcomes = run_coalesced(flight, fail)
+
+    assert outcomes == [('error', error)] * 4
+    assert flight.executions == 1
+
+
+def test_key_is_released_after_an_error():
+    flight = SingleFlight()
+    with pytest.raises(ValueError):
+        flight.do('key', lambda: (_ for _ in ()).throw(ValueError()))
+
+    assert flight.do('key', lambda: 'fresh') == 'fresh'
+    assert flight.executions == 2
+
+
+def test_async_waiters_get_the_leaders_exception():
+    flight = SingleFlight()
+    error = ValueError('upstream down')
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise error
+
+    async def main():
+        return await asyncio.gather(
+            *(flight.do_async('key', fail) for _ in range(4)), return_exceptions=True
+        )
+
+    assert asyncio.run(main()) == [error] * 4
+    assert flight.executions == 1
+    assert flight.coalesced == 3
+
+
+def test_sync_waiter_joins_an_async_leader():
+    flight = SingleFlight()
+    started = threading.Event()
+    outcome = []
+
+    async def fetch():
+        started.set()
+        await asyncio.sleep(0.05)
+        raise ValueError('upstream down')
+
+    def sync_waiter():
+        started.wait(5)
+        try:
+            flight.do('key', lambda: 'not called')
+        except ValueError as e:
+            outcome.append(e)
+
+    thread = threading.Thread(target=sync_waiter)
+    thread.start()
+    with pytest.raises(ValueError):
+        asyncio.run(flight.do_async('key', fetch))
+    thread.join(5)
+
+    assert len(outcome) == 1
+    assert flight.executions == 1
+
+
+def test_cancelled_waiter_does_not_cancel_the_leader():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return 'weather'
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do_async('key', fetch))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flight.do_async('key', fetch))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        return await leader, await asyncio.gather(waiter, return_exceptions=True)
+
+    result, (waiter_outcome,) = asyncio.run(main())
+    assert result == 'weather'
+    assert isinstance(waiter_outcome, asyncio.CancelledError)
+
+
+def test_leader_deadline_does_not_cancel_other_callers():
+    flight = SingleFlight()
+    sync_outcome = []
+
+    async def fetch():
+        await asyncio.sleep(0.2)
+        return 'uv'
+
+    def sync_waiter():
+        wait_until(lambda: flight.stats()['in_flight'] == 1)
+        sync_outcome.append(flight.do('key', lambda: 'not called'))
+
+    async def main():
+        thread = threading.Thread(target=sync_waiter)
+        thread.start()
+        leader = asyncio.wait_for(flight.do_async('key', fetch), timeout=0.05)
+        waiter = asyncio.wait_for(flight.do_async('key', fetch), timeout=5)
+        outcomes = await asyncio.gather(leader, waiter, return_exceptions=True)
+        await asyncio.get_running_loop().run_in_executor(None, thread.join, 5)
+        return outcomes
+
+    leader_outcome, waiter_outcome = asyncio.run(main())
+    assert isinstance(leader_outcome, asyncio.TimeoutError)
+    assert waiter_outcome == 'uv'
+    assert sync_outcome == ['uv']
+    assert flight.executions == 1
@@ -0,0 +1,57 @@
+import io
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+from benchmark_features import synthetic_photo
+from skin_model import (
+    ANALYSIS_MAX_SIDE, FEATURE_NAMES, compare_with_full_resolution, extract_image_features,
+    extract_image_features_batch, get_model, load_analysis_image
+)
+
+
+def upload(width, height, seed, fmt='PNG'):
+    stream = io.BytesIO()
+    Image.fromarray(synthetic_photo(width, height, seed)).save(stream, format=fmt)
+    stream.seek(0)
+    return stream
+
+
+@pytest.mark.parametrize('width, height', [(4000, 3000), (2304, 1728), (1152, 864)])
+def test_default_resolution_stays_within_tolerance(width, height):
+    report = compare_with_full_resolution(upload(width, height, 0, 'JPEG'))
+
+    assert report['out_of_tolerance'] == []
+    assert report['conditions_match']
+
+
+def test_larger_uploads_are_bounded():
+    image = load_analysis_image(upload(ANALYSIS_MAX_SIDE + 400, 300, 0))
+    assert max(image.shape[:2]) == ANALYSIS_MAX_SIDE
+
+
+def test_batch_features_do_not_depend_on_the_rest_of_the_batch():
+    landscapes = [upload(480, 360, seed) for seed in range(3)]
+    portrait = upload(360, 480, 7)
+    images = landscapes + [portrait, io.BytesIO(b'not an image')]
+
+    batch = extract_image_features_batch(images)
+
+    assert batch[-1] is None
+    for image, vector in zip(images[:-1], batch[:-1]):
+        np.testing.assert_allclose(vector, extract_image_features(image), rtol=0, atol=1e-9)
+
+
+def test_stacked_moments_match_per_image_moments():
+    stack = np.stack([synthetic_photo(320, 240, seed) for seed in range(4)])
+    batch = get_model().extract_features_batch(stack)
+
+    for image, features in zip(stack, batch):
+        means, stds = cv2.meanStdDev(image)
+        np.testing.assert_allclose([features[f'avg_{name}'] for name in ('red', 'green', 'blue')],
+                                   means[:, 0], atol=1e-9)
+        np.testing.assert_allclose([features[f'std_{name}'] for name in ('red', 'green', 'blue')],
+                                   stds[:, 0], atol=1e-9)
+        assert set(features) == set(FEATURE_NAMES)
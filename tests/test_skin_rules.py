@@ -0,0 +1,179 @@
+import numpy as np
+import pytest
+
+from skin_model import CONDITION_RULES, FEATURE_NAMES, detect_conditions_batch, score_feature_matrix
+
+
+def legacy_conditions(features):
+    """The hand-written if-chains CONDITION_RULES replaced, kept as the reference"""
+    conditions = []
+
+    acne_score = 0
+    if features['redness_index'] > 20:
+        acne_score += 35
+    if features['texture_variance'] > 800:
+        acne_score += 25
+    if features['edge_density'] > 0.15:
+        acne_score += 20
+    if features['std_red'] > 30:
+        acne_score += 15
+    if acne_score >= 40:
+        conditions.append({
+            'type': 'Acne',
+            'score': min(95, acne_score),
+            'confidence': min(92, 65 + acne_score / 3),
+            'severity': 'high' if acne_score > 70 else 'moderate',
+            'indicators': ['Redness', 'Texture Irregularity', 'Inflammation']
+        })
+
+    pigmentation_score = 0
+    if features['std_l'] > 15:
+        pigmentation_score += 30
+    if features['avg_l'] < 120:
+        pigmentation_score += 25
+    if features['std_value'] > 20:
+        pigmentation_score += 20
+    if features['texture_variance'] > 600:
+        pigmentation_score += 15
+    if pigmentation_score >= 35:
+        conditions.append({
+            'type': 'Pigmentation',
+            'score': min(90, pigmentation_score),
+            'confidence': min(88, 60 + pigmentation_score / 2.5),
+            'severity': 'high' if pigmentation_score > 65 else 'moderate',
+            'indicators': ['Uneven Skin Tone', 'Dark Spots', 'Hyperpigmentation']
+        })
+
+    sunburn_score = 0
+    if features['redness_index'] > 25:
+        sunburn_score += 35
+    if features['avg_red'] > 160:
+        sunburn_score += 30
+    if features['avg_a'] > 140:
+        sunburn_score += 20
+    if features['brightness'] > 140:
+        sunburn_score += 10
+    if sunburn_score >= 35:
+        conditions.append({
+            'type': 'Sunburn',
+            'score': min(95, sunburn_score),
+            'confidence': min(90, 70 + sunburn_score / 4),
+            'severity': 'high' if sunburn_score > 70 else 'moderate',
+            'indicators': ['Redness', 'Inflammation', 'UV Damage']
+        })
+
+    fungal_score = 0
+    if 15 < features['avg_hue'] < 35:
+        fungal_score += 25
+    if features['avg_saturation'] > 100:
+        fungal_score += 20
+    if features['texture_variance'] > 700:
+        fungal_score += 20
+    if features['edge_density'] > 0.12:
+        fungal_score += 15
+    if features['std_hue'] > 8:
+        fungal_score += 10
+    if fungal_score >= 40:
+        conditions.append({
+            'type': 'Fungal Infection',
+            'score': min(85, fungal_score),
+            'confidence': min(80, 55 + fungal_score / 2),
+            'severity': 'high' if fungal_score > 65 else 'moderate',
+            'indicators': ['Discoloration', 'Texture Changes', 'Patches']
+        })
+
+    eczema_score = 0
+    if 10 < features['redness_index'] < 25:
+        eczema_score += 25
+    if features['texture_variance'] > 600:
+        eczema_score += 25
+    if features['edge_density'] > 0.10:
+        eczema_score += 20
+    if features['std_saturation'] > 25:
+        eczema_score += 15
+    if features['avg_l'] < 140:
+        eczema_score += 10
+    if eczema_score >= 40:
+        conditions.append({
+            'type': 'Eczema',
+            'score': min(88, eczema_score),
+            'confidence': min(85, 58 + eczema_score / 2.5),
+            'severity': 'high' if eczema_score > 70 else 'moderate',
+            'indicators': ['Dryness', 'Redness', 'Texture Irregularity', 'Inflammation']
+        })
+
+    dryness_score = 0
+    if features['texture_variance'] < 500:
+        dryness_score += 30
+    if features['avg_saturation'] < 60:
+        dryness_score += 25
+    if features['edge_density'] < 0.08:
+        dryness_score += 20
+    if 100 < features['brightness'] < 180:
+        dryness_score += 15
+    if features['std_value'] < 18:
+        dryness_score += 10
+    if dryness_score >= 35:
+        conditions.append({
+            'type': 'Dryness',
+            'score': min(85, dryness_score),
+            'confidence': min(82, 60 + dryness_score / 3),
+            'severity': 'moderate' if dryness_score > 60 else 'low',
+            'indicators': ['Low Moisture', 'Dull Appearance', 'Flaky Texture']
+        })
+
+    if len(conditions) == 0:
+        conditions.append({
+            'type': 'Healthy',
+            'score': 20,
+            'confidence': 85,
+            'severity': 'low',
+            'indicators': ['Clear Skin', 'Even Tone', 'Good Texture']
+        })
+
+    conditions.sort(key=lambda x: x['score'], reverse=True)
+    return conditions
+
+
+def boundary_values():
+    """Per feature: every rule threshold, just either side of it, and a far value"""
+    values = {name: {0.0, 1e4} for name in FEATURE_NAMES}
+    for rule in CONDITION_RULES:
+        for name, low, high, _ in rule['terms']:
+            for bound in (low, high):
+                if bound is not None:
+                    values[name].update((bound - 0.001, bound, bound + 0.001))
+    return {name: sorted(candidates) for name, candidates in values.items()}
+
+
+def random_features(count, seed=0):
+    rng = np.random.default_rng(seed)
+    candidates = boundary_values()
+    return [
+        {name: float(rng.choice(candidates[name])) for name in FEATURE_NAMES}
+        for _ in range(count)
+    ]
+
+
+def test_rule_table_matches_legacy_if_chains():
+    features_list = random_features(5000)
+    detected = detect_conditions_batch(features_list)
+
+    for features, conditions in zip(features_list, detected):
+        assert conditions == legacy_conditions(features)
+
+
+def test_every_condition_is_reachable_in_the_sample():
+    seen = {condition['type'] for conditions in detect_conditions_batch(random_features(5000))
+            for condition in conditions}
+    assert seen == {rule['type'] for rule in CONDITION_RULES} | {'Healthy'}
+
+
+@pytest.mark.parametrize('value, expected', [(20, 0), (20.001, 35)])
+def test_thresholds_are_strict(value, expected):
+    row = np.zeros((1, len(FEATURE_NAMES)))
+    row[0, FEATURE_NAMES.index('redness_index')] = value
+    row[0, FEATURE_NAMES.index('texture_variance')] = 600  # keeps dryness out
+    acne = [rule['type'] for rule in CONDITION_RULES].index('Acne')
+
+    assert score_feature_matrix(row)['totals'][0, acne] == expected
@@ -0,0 +1,105 @@
+import pytest
+import requests
+
+import circuit_breaker
+import rate_limiter
+import upstream_client
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from rate_limiter import RateLimitedError, TokenBucket
+
+URL = 'http://owm.test/data/2.5/weather'
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeSession:
+    """Replays one outcome (status code or exception) per GET"""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+
+@pytest.fixture
+def upstream(monkeypatch, clock):
+    """Point upstream_client at a fake session, a 3-token budget and a fresh breaker"""
+    for module in (upstream_client, rate_limiter, circuit_breaker):
+        monkeypatch.setattr(module, 'time', clock)
+    monkeypatch.setattr(upstream_client, 'UPSTREAM_HEDGING', False)
+    monkeypatch.setattr(upstream_client, 'UPSTREAM_RETRIES', 2)
+    monkeypatch.setattr(upstream_client, 'rate_limiter', TokenBucket(rate_per_minute=1, burst=3))
+    breaker = CircuitBreaker('weather', window=10, min_calls=10)
+    monkeypatch.setattr(upstream_client, 'get_breaker', lambda name: breaker)
+
+    def serve(*outcomes):
+        session = FakeSession(outcomes)
+        monkeypatch.setattr(upstream_client, 'get_session', lambda: session)
+        return session
+    return serve
+
+
+def test_each_retry_spends_a_token(upstream):
+    session = upstream(503, requests.exceptions.ConnectionError(), 200)
+
+    assert upstream_client.get(URL).status_code == 200
+    assert session.calls == 3
+    assert upstream_client.rate_limiter.granted['interactive'] == 3
+
+
+def test_retries_stop_when_the_budget_runs_out(upstream):
+    upstream_client.rate_limiter.acquire()
+    upstream_client.rate_limiter.acquire()
+    session = upstream(503, 200)
+
+    # The first attempt takes the last token, so its 503 is returned as is
+    assert upstream_client.get(URL).status_code == 503
+    assert session.calls == 1
+    with pytest.raises(RateLimitedError):
+        upstream_client.get(URL)
+
+
+def test_last_error_is_raised_after_the_retries(upstream):
+    session = upstream(*[requests.exceptions.ReadTimeout()] * 3)
+
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        upstream_client.get(URL)
+    assert session.calls == 3
+
+
+def test_client_errors_are_not_retried(upstream):
+    session = upstream(404)
+
+    assert upstream_client.get(URL).status_code == 404
+    assert session.calls == 1
+
+
+def test_open_circuit_stops_retries(upstream, monkeypatch):
+    breaker = upstream_client.get_breaker('weather')
+    session = upstream(503, 503)
+    calls = []
+
+    def before_call():
+        calls.append(1)
+        if len(calls) > 1:
+            raise CircuitOpenError('weather')
+
+    monkeypatch.setattr(breaker, 'before_call', before_call)
+
+    assert upstream_client.get(URL).status_code == 503
+    assert session.calls == 1
+    assert upstream_client.rate_limiter.granted['interactive'] == 1
+
+
+def test_adapter_does_not_retry_by_itself():
+    adapter = upstream_client._build_session().get_adapter(URL)
+    assert adapter.max_retries.total == 0
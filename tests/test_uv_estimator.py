@@ -0,0 +1,47 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from uv_estimator import UVI_MAX, cloud_modification_factor, estimate_uv_index
+
+EQUINOX_NOON = datetime(2024, 3, 20, 12, tzinfo=timezone.utc).timestamp()
+JUNE_SOLSTICE_NOON = datetime(2024, 6, 20, 12, tzinfo=timezone.utc).timestamp()
+
+
+def test_sun_overhead_gives_the_clear_sky_maximum():
+    assert estimate_uv_index(0.0, 0.0, EQUINOX_NOON) == pytest.approx(UVI_MAX, abs=0.3)
+
+
+def test_no_uv_at_night():
+    assert estimate_uv_index(0.0, 180.0, EQUINOX_NOON) == 0.0
+
+
+def test_summer_hemisphere_gets_more_uv():
+    north = estimate_uv_index(45.0, 0.0, JUNE_SOLSTICE_NOON)
+    south = estimate_uv_index(-45.0, 0.0, JUNE_SOLSTICE_NOON)
+
+    assert north > 2 * south > 0
+
+
+def test_cloud_cover_attenuates():
+    clear = estimate_uv_index(0.0, 0.0, EQUINOX_NOON)
+
+    assert cloud_modification_factor(0) == 1.0
+    assert cloud_modification_factor(100) == pytest.approx(0.25)
+    assert estimate_uv_index(0.0, 0.0, EQUINOX_NOON, cloud_cover=100) == pytest.approx(clear * 0.25, abs=0.1)
+    # Unknown cover counts as clear sky
+    assert estimate_uv_index(0.0, 0.0, EQUINOX_NOON, cloud_cover=float('nan')) == clear
+
+
+def test_arrays_match_scalar_calls():
+    lats = np.array([0.0, 45.0, -45.0, 60.0])
+    lons = np.array([0.0, 10.0, -70.0, 180.0])
+    covers = np.array([0.0, 50.0, np.nan, 90.0])
+
+    batch = estimate_uv_index(lats, lons, JUNE_SOLSTICE_NOON, covers)
+
+    assert batch.shape == (4,)
+    assert batch.tolist() == [
+        estimate_uv_index(lat, lon, JUNE_SOLSTICE_NOON, cover) for lat, lon, cover in zip(lats, lons, covers)
+    ]
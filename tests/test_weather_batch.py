@@ -0,0 +1,50 @@
+import threading
+
+import pytest
+
+import weather_api
+from rate_limiter import BATCH, INTERACTIVE, run_with_priority
+
+
+@pytest.fixture
+def leg_threads(monkeypatch):
+    """Record the thread each UV / AQI leg runs on"""
+    threads = []
+
+    def leg(*args):
+        threads.append(threading.current_thread().name)
+        return 1
+
+    monkeypatch.setattr(weather_api, 'get_uv_index', leg)
+    monkeypatch.setattr(weather_api, 'get_air_quality', leg)
+    return threads
+
+
+def test_batch_legs_stay_off_the_interactive_pool(leg_threads):
+    run_with_priority(BATCH, weather_api.fetch_uv_and_air_quality, 51.5, -0.1)
+
+    assert len(leg_threads) == 2
+    assert all(name.startswith('weather-batch-leg') for name in leg_threads)
+
+
+def test_interactive_legs_use_the_shared_pool(leg_threads):
+    run_with_priority(INTERACTIVE, weather_api.fetch_uv_and_air_quality, 51.5, -0.1)
+
+    assert len(leg_threads) == 2
+    assert all(name.startswith('weather-upstream') for name in leg_threads)
+
+
+def test_batch_lookups_are_deduplicated_and_ordered(monkeypatch):
+    looked_up = []
+
+    def lookup(key):
+        looked_up.append(key)
+        return {'city': key[1]}
+
+    monkeypatch.setattr(weather_api, '_lookup_batch_key', lookup)
+    results = list(weather_api.iter_comprehensive_weather_batch(['London', ' london', {'lat': 'x'}, 'Paris']))
+
+    assert [result['index'] for result in results] == [0, 1, 2, 3]
+    assert results[1]['data'] == {'city': 'london'}
+    assert 'error' in results[2]
+    assert sorted(looked_up) == [('city', 'london'), ('city', 'paris')]
@@ -0,0 +1,182 @@
+import pytest
+
+import weather_api
+import weather_cache
+from weather_cache import NegativeCache, SQLiteCache, TTLCache, normalize_city
+
+
+@pytest.fixture(autouse=True)
+def fake_time(monkeypatch, clock):
+    monkeypatch.setattr(weather_cache, 'time', clock)
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = TTLCache(maxsize=4, ttl=10)
+    cache.set('london', 'sunny')
+
+    clock.advance(9)
+    assert cache.get('london') == 'sunny'
+    clock.advance(1)
+    assert cache.get('london') is None
+    assert len(cache) == 0
+
+
+def test_per_entry_ttl_overrides_the_default(clock):
+    cache = TTLCache(maxsize=4, ttl=10)
+    cache.set('london', 'sunny', ttl=60)
+
+    clock.advance(30)
+    assert cache.get('london') == 'sunny'
+    assert cache.expires_in('london') == 30
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set('london', 1)
+    cache.set('paris', 2)
+    cache.get('london')
+
+    cache.set('tokyo', 3)
+
+    assert cache.get('paris') is None
+    assert cache.get('london') == 1 and cache.get('tokyo') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_hit_rate_counts_hits_and_misses():
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set('london', 1)
+    cache.get('london')
+    cache.get('paris')
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_rate']) == (1, 1, 0.5)
+
+
+def test_expired_entry_is_served_stale_within_the_window(clock):
+    cache = TTLCache(maxsize=4, ttl=10, stale_ttl=30)
+    cache.set('london', 'sunny')
+
+    assert cache.get_stale('london') == ('sunny', False)
+    clock.advance(15)
+    assert cache.get('london') is None
+    assert cache.get_stale('london') == ('sunny', True)
+    assert cache.stats()['stale_hits'] == 1
+
+    clock.advance(25)
+    assert cache.get_stale('london') == (None, False)
+    assert len(cache) == 0
+
+
+def test_sqlite_cache_is_shared_and_serves_stale(tmp_path, clock):
+    path = str(tmp_path / 'cache.sqlite3')
+    worker_a = SQLiteCache(path, ttl=10, stale_ttl=30, name='weather')
+    worker_b = SQLiteCache(path, ttl=10, stale_ttl=30, name='weather')
+    other = SQLiteCache(path, ttl=10, name='uv')
+    worker_a.set('london', {'temp': 12})
+
+    assert worker_b.get('london') == {'temp': 12}
+    assert other.get('london') is None
+    clock.advance(15)
+    assert worker_b.get('london') is None
+    assert worker_b.get_stale('london') == ({'temp': 12}, True)
+    clock.advance(25)
+    assert worker_b.get_stale('london') == (None, False)
+
+
+def test_sqlite_housekeeping_evicts_the_oldest_writes(tmp_path, clock):
+    cache = SQLiteCache(str(tmp_path / 'cache.sqlite3'), maxsize=10, ttl=600)
+    for i in range(64):
+        clock.advance(1)
+        cache.set(f'city-{i}', i)
+
+    assert len(cache) == 10
+    assert cache.evictions == 54
+    assert cache.get('city-53') is None
+    assert cache.get('city-54') == 54
+
+
+def test_sqlite_errors_do_not_escape(tmp_path):
+    cache = SQLiteCache(str(tmp_path / 'cache.sqlite3'))
+    cache.set('london', 'sunny')
+    cache._connect().execute('DROP TABLE cache')
+
+    assert cache.get('london') is None
+    cache.set('london', 'sunny')
+    cache.delete('london')
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.stats()['size'] == 0
+
+
+def test_negative_cache_forgets_keys_after_ttl(clock):
+    unknown = NegativeCache(maxsize=8, ttl=60)
+    unknown.add('atlantis')
+
+    assert 'atlantis' in unknown
+    assert 'london' not in unknown
+    clock.advance(60)
+    assert 'atlantis' not in unknown
+    assert len(unknown) == 0
+    assert not any(unknown._counters)
+    assert unknown.stats()['rejections'] == 1
+
+
+def test_negative_cache_evicts_least_recently_seen():
+    unknown = NegativeCache(maxsize=2, ttl=60)
+    unknown.add('atlantis')
+    unknown.add('el dorado')
+    assert 'atlantis' in unknown  # 'el dorado' is now least recently seen
+
+    unknown.add('shangri-la')
+
+    assert 'el dorado' not in unknown
+    assert 'atlantis' in unknown and 'shangri-la' in unknown
+    assert unknown.evictions == 1
+    assert sum(unknown._counters) == 2 * unknown.num_hashes
+
+
+def test_negative_cache_readding_does_not_double_count():
+    unknown = NegativeCache(maxsize=8, ttl=60)
+    unknown.add('atlantis')
+    unknown.add('atlantis', ttl=600)
+
+    assert len(unknown) == 1
+    assert sum(unknown._counters) == unknown.num_hashes
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('london', 'london'),
+    ('London ', 'london'),
+    ('  LONDON,   gb', 'london,gb'),
+    ('New   York, US', 'new york,us'),
+    ('london,', 'london'),
+])
+def test_normalize_city(query, expected):
+    assert normalize_city(query) == expected
+
+
+LONDON_GB = {'name': 'London', 'sys': {'country': 'GB'}, 'main': {'temp': 12}}
+LONDON_CA = {'name': 'London', 'sys': {'country': 'CA'}, 'main': {'temp': 3}}
+
+
+@pytest.fixture
+def city_cache(monkeypatch):
+    cache = TTLCache(maxsize=16, ttl=600)
+    monkeypatch.setattr(weather_api, 'weather_cache', cache)
+    return cache
+
+
+@pytest.mark.parametrize('first_query', ['london', 'London ', 'LONDON,GB', 'london, gb'])
+def test_all_spellings_share_one_entry(city_cache, first_query):
+    weather_api.cache_weather_data(normalize_city(first_query), LONDON_GB)
+
+    for query in ('london', 'London ', 'LONDON, gb'):
+        assert city_cache.get(normalize_city(query)) is LONDON_GB
+
+
+def test_other_country_never_answers_for_the_bare_name(city_cache):
+    weather_api.cache_weather_data('london,ca', LONDON_CA)
+
+    assert city_cache.get('london,ca') is LONDON_CA
+    assert city_cache.get('london') is None
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+import weather_api_async
+import weather_refresher
+from weather_cache import TTLCache
+from weather_refresher import BackgroundRefresher, HotLocationTracker
+
+
+@pytest.fixture
+def tracker(monkeypatch, clock):
+    monkeypatch.setattr(weather_refresher, 'time', clock)
+    return HotLocationTracker(half_life=600)
+
+
+def test_scores_decay_by_half_life(tracker, clock):
+    tracker.record('london', 'London')
+    tracker.record('london', 'London')
+    tracker.record('paris', 'Paris')
+
+    clock.advance(600)
+    (key, label, score), (_, _, paris_score) = tracker.hottest(2)
+    assert (key, label) == ('london', 'London')
+    assert score == pytest.approx(1.0)
+    assert paris_score == pytest.approx(0.5)
+
+
+def test_refreshes_only_entries_expiring_soon_within_budget(tracker):
+    expires_in = {'london': 30, 'paris': 500, 'tokyo': None, 'rome': 10}
+    refreshed = []
+
+    def refresh(label):
+        refreshed.append(label)
+        return 1
+
+    refresher = BackgroundRefresher(refresh, expires_in.get, tracker, call_budget=2, refresh_ahead=60)
+    for key in expires_in:
+        refresher.record(key, key.title())
+
+    refresher.run_once()
+
+    # Equal scores keep request order, so rome is the one left over budget
+    assert refreshed == ['London', 'Tokyo']
+    assert refresher.upstream_calls == 2
+    assert refresher.skipped_over_budget == 1
+
+
+def test_async_city_lookups_enter_the_hot_set(monkeypatch, tracker):
+    cache = TTLCache(maxsize=4, ttl=600)
+    cache.set('london', {'name': 'London'})
+    monkeypatch.setattr(weather_api_async, 'weather_cache', cache)
+    monkeypatch.setattr(weather_api_async, 'get_cached_snapshot', lambda key, data: 'snapshot')
+    refresher = BackgroundRefresher(lambda label: 0, lambda key: None, tracker)
+    monkeypatch.setattr(weather_api_async, 'refresher', refresher)
+
+    assert asyncio.run(weather_api_async.get_weather_snapshot_async('London ')) == 'snapshot'
+    assert tracker.hottest(1)[0][:2] == ('london', 'London ')
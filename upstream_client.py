@@ -0,0 +1,305 @@
+"""
+Shared Upstream HTTP Client
+Pooled keep-alive requests.Session used for every OpenWeatherMap call
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from hedging import HedgePolicy
+from rate_limiter import (
+    INTERACTIVE, BATCH, BACKGROUND, RateLimitedError, create_rate_limiter, current_priority
+)
+
+# Connection pool size per gunicorn worker (one pool per upstream host)
+UPSTREAM_POOL_SIZE = int(os.environ.get('UPSTREAM_POOL_SIZE', 20))
+
+# Uniform (connect, read) timeouts in seconds
+UPSTREAM_CONNECT_TIMEOUT = float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT', 3.05))
+UPSTREAM_READ_TIMEOUT = float(os.environ.get('UPSTREAM_READ_TIMEOUT', 10))
+
+# GETs are retried on connection errors, timeouts and 502/503/504. Each
+# retry is a new call: it passes the breaker and spends a budget token
+UPSTREAM_RETRIES = int(os.environ.get('UPSTREAM_RETRIES', 2))
+UPSTREAM_BACKOFF = float(os.environ.get('UPSTREAM_BACKOFF', 0.3))
+RETRY_STATUS_CODES = (502, 503, 504)
+RETRY_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+DEFAULT_TIMEOUT = (UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_READ_TIMEOUT)
+
+# Circuit breaker thresholds (shared by every upstream endpoint)
+BREAKER_WINDOW = int(os.environ.get('BREAKER_WINDOW', 20))
+BREAKER_MIN_CALLS = int(os.environ.get('BREAKER_MIN_CALLS', 5))
+BREAKER_FAILURE_RATE = float(os.environ.get('BREAKER_FAILURE_RATE', 0.5))
+BREAKER_SLOW_CALL_SECONDS = float(os.environ.get('BREAKER_SLOW_CALL_SECONDS', 3.0))
+BREAKER_SLOW_CALL_RATE = float(os.environ.get('BREAKER_SLOW_CALL_RATE', 0.5))
+BREAKER_OPEN_SECONDS = float(os.environ.get('BREAKER_OPEN_SECONDS', 30))
+BREAKER_HALF_OPEN_PROBES = int(os.environ.get('BREAKER_HALF_OPEN_PROBES', 2))
+
+# Upstream status codes that count against the breaker (404 for an
+# unknown city is a valid answer, not an outage)
+BREAKER_FAILURE_STATUS = 429
+
+# Shared API key budget (OpenWeatherMap free tier: 60 calls/minute; 0 disables)
+UPSTREAM_RATE_PER_MINUTE = float(os.environ.get('UPSTREAM_RATE_PER_MINUTE', 60))
+UPSTREAM_RATE_BURST = int(os.environ.get('UPSTREAM_RATE_BURST', 15))
+# Interactive calls may wait this long for a token; batch/background never wait
+UPSTREAM_RATE_MAX_WAIT = float(os.environ.get('UPSTREAM_RATE_MAX_WAIT', 1.0))
+# Share of the burst that batch / background calls must leave for interactive ones
+RATE_LIMIT_RESERVES = {
+    INTERACTIVE: 0.0,
+    BATCH: float(os.environ.get('RATE_LIMIT_BATCH_RESERVE', 0.25)),
+    BACKGROUND: float(os.environ.get('RATE_LIMIT_BACKGROUND_RESERVE', 0.5))
+}
+# 'sqlite' shares the budget between all workers on the host ('memory' is
+# used instead when the database cannot be created)
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'sqlite').lower()
+RATE_LIMIT_PATH = os.environ.get(
+    'RATE_LIMIT_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'rate_limit.sqlite3')
+)
+
+rate_limiter = create_rate_limiter(
+    RATE_LIMIT_BACKEND, UPSTREAM_RATE_PER_MINUTE, UPSTREAM_RATE_BURST, RATE_LIMIT_RESERVES, RATE_LIMIT_PATH
+)
+
+# Opt-in hedging: a call still running after its endpoint's recent p95
+# latency gets a duplicate request and the first answer wins. Hedges are
+# capped at HEDGE_BUDGET of primary calls and also spend rate-limit tokens
+UPSTREAM_HEDGING = os.environ.get('UPSTREAM_HEDGING', 'false').lower() == 'true'
+HEDGE_PERCENTILE = float(os.environ.get('HEDGE_PERCENTILE', 95))
+HEDGE_BUDGET = float(os.environ.get('HEDGE_BUDGET', 0.05))
+HEDGE_MIN_DELAY = float(os.environ.get('HEDGE_MIN_DELAY', 0.05))
+HEDGE_WORKERS = int(os.environ.get('HEDGE_WORKERS', 16))
+
+hedge_policy = HedgePolicy(percentile=HEDGE_PERCENTILE, budget=HEDGE_BUDGET, min_delay=HEDGE_MIN_DELAY)
+_hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix='upstream-hedge')
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def _build_session():
+    """
+    Create a session with a pooled adapter
+    The adapter never retries by itself: get() retries so that every
+    attempt is charged to the breaker and the call budget
+    """
+    adapter = HTTPAdapter(
+        pool_connections=UPSTREAM_POOL_SIZE,
+        pool_maxsize=UPSTREAM_POOL_SIZE,
+        max_retries=0
+    )
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    """
+    Get the process-wide session
+    Rebuilt after fork so gunicorn workers never share sockets
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = _build_session()
+                _session_pid = pid
+    return _session
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def endpoint_name(url):
+    """Map an OpenWeatherMap URL to its breaker name"""
+    path = urlparse(url).path
+    if path.startswith('/geo/'):
+        return 'geocoding'
+    return path.rstrip('/').rsplit('/', 1)[-1] or 'default'
+
+
+def get_breaker(name):
+    """Get or create the circuit breaker for an upstream endpoint"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    name,
+                    window=BREAKER_WINDOW,
+                    min_calls=BREAKER_MIN_CALLS,
+                    failure_rate_threshold=BREAKER_FAILURE_RATE,
+                    slow_call_seconds=BREAKER_SLOW_CALL_SECONDS,
+                    slow_call_rate_threshold=BREAKER_SLOW_CALL_RATE,
+                    open_seconds=BREAKER_OPEN_SECONDS,
+                    half_open_probes=BREAKER_HALF_OPEN_PROBES
+                )
+                _breakers[name] = breaker
+    return breaker
+
+
+def is_failure_status(status_code):
+    """Whether an upstream HTTP status should count against the breaker"""
+    return status_code >= 500 or status_code == BREAKER_FAILURE_STATUS
+
+
+def get_breaker_states():
+    """Breaker state per upstream endpoint for monitoring"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
+
+
+def get_rate_limit_stats():
+    """Remaining API key budget for monitoring"""
+    return rate_limiter.stats()
+
+
+def budget_exhausted(priority=INTERACTIVE):
+    """Whether calls at this priority are currently being refused"""
+    return rate_limiter.available(priority) < 1
+
+
+def acquire_budget(wait=None):
+    """
+    Spend one API call from the shared budget at the current priority
+    Raises RateLimitedError (a RequestException) when none is left
+    """
+    priority = current_priority()
+    if wait is None:
+        wait = UPSTREAM_RATE_MAX_WAIT if priority == INTERACTIVE else 0.0
+    if not rate_limiter.acquire(priority, wait=wait):
+        raise RateLimitedError(f"Upstream call budget exhausted for {priority} requests")
+
+
+def get_hedging_stats():
+    """Hedge counts and win rate for monitoring"""
+    stats = hedge_policy.stats()
+    stats['enabled'] = UPSTREAM_HEDGING
+    return stats
+
+
+def get(url, params=None, timeout=None):
+    """
+    GET an upstream URL through the pooled session and its circuit breaker
+    Raises requests exceptions exactly like requests.get; an open circuit
+    raises CircuitOpenError and an exhausted call budget RateLimitedError
+    (both RequestExceptions) without touching the network
+    
+    The breaker is checked first, so calls to an open circuit never spend
+    the budget that healthy endpoints need. Connection errors, timeouts and
+    RETRY_STATUS_CODES are retried up to UPSTREAM_RETRIES times while the
+    breaker and budget allow; otherwise the last error or response is returned
+    """
+    breaker = get_breaker(endpoint_name(url))
+    breaker.before_call()
+    try:
+        acquire_budget()
+    except RateLimitedError:
+        breaker.release()
+        raise
+    
+    send = _hedged_send if UPSTREAM_HEDGING else _send
+    attempt = 0
+    while True:
+        try:
+            response = send(breaker, url, params, timeout)
+        except RETRY_ERRORS:
+            if not _admit_retry(breaker, attempt):
+                raise
+        else:
+            if response.status_code not in RETRY_STATUS_CODES or not _admit_retry(breaker, attempt):
+                return response
+        attempt += 1
+
+
+def _admit_retry(breaker, attempt):
+    """Back off, then admit retry number attempt + 1 like a new call; False if none is allowed"""
+    if attempt >= UPSTREAM_RETRIES:
+        return False
+    time.sleep(UPSTREAM_BACKOFF * 2 ** attempt)
+    try:
+        breaker.before_call()
+    except CircuitOpenError:
+        return False
+    try:
+        # A retry never waits for a token: the caller already waited once
+        acquire_budget(wait=0.0)
+    except RateLimitedError:
+        breaker.release()
+        return False
+    return True
+
+
+def _send(breaker, url, params, timeout):
+    """One upstream GET, recorded on the breaker and the hedge latency tracker"""
+    started = time.monotonic()
+    try:
+        response = get_session().get(url, params=params, timeout=timeout or DEFAULT_TIMEOUT)
+    except requests.exceptions.RequestException:
+        breaker.record(True, time.monotonic() - started)
+        raise
+    except BaseException:
+        breaker.release()
+        raise
+    
+    latency = time.monotonic() - started
+    failed = is_failure_status(response.status_code)
+    breaker.record(failed, latency)
+    if not failed:
+        hedge_policy.observe(breaker.name, latency)
+    return response
+
+
+def _hedged_send(breaker, url, params, timeout):
+    """
+    Send the call and, if it outlives the endpoint's hedge delay, a duplicate
+    The first successful response wins; the loser finishes in the background
+    """
+    primary = _hedge_executor.submit(_send, breaker, url, params, timeout)
+    delay = hedge_policy.delay(breaker.name)
+    if delay is None:
+        return primary.result()
+    
+    try:
+        return primary.result(timeout=delay)
+    except FutureTimeoutError:
+        pass
+    
+    if not hedge_policy.try_hedge():
+        return primary.result()
+    try:
+        breaker.before_call()
+    except CircuitOpenError:
+        hedge_policy.refund()
+        return primary.result()
+    try:
+        acquire_budget(wait=0.0)
+    except RateLimitedError:
+        breaker.release()
+        hedge_policy.refund()
+        return primary.result()
+    
+    hedge = _hedge_executor.submit(_send, breaker, url, params, timeout)
+    done, _ = wait([primary, hedge], return_when=FIRST_COMPLETED)
+    first = primary if primary in done else hedge
+    if first.exception() is not None:
+        # First answer was an error - fall back to the other request
+        first = hedge if first is primary else primary
+    
+    hedge_policy.record_winner(first is hedge)
+    return first.result()
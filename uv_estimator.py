@@ -0,0 +1,85 @@
+"""
+Clear-Sky UV Estimator
+Offline UV index from solar geometry, used when the UV API is unavailable
+or skipped to save quota/latency
+
+Every function accepts scalars or NumPy arrays (broadcast together), so a
+whole batch of locations and times is scored in one call.
+"""
+
+import time
+
+import numpy as np
+
+# Clear-sky UV index at the sun's zenith for a typical ozone column
+# (UVI ~= UVI_MAX * cos(zenith) ** UV_ZENITH_EXPONENT)
+UVI_MAX = 12.5
+UV_ZENITH_EXPONENT = 2.42
+
+# Cloud modification factor: 1 - CLOUD_ATTENUATION * cover ** CLOUD_EXPONENT
+# (overcast skies still let roughly a quarter of UV through)
+CLOUD_ATTENUATION = 0.75
+CLOUD_EXPONENT = 3.4
+
+
+def _day_and_hour(timestamps):
+    """Day of year (1-366) and fractional UTC hour for POSIX timestamps"""
+    seconds = np.asarray(timestamps, dtype='float64')
+    instants = seconds.astype('datetime64[s]')
+    day_of_year = (instants - instants.astype('datetime64[Y]')).astype('timedelta64[D]').astype('float64') + 1
+    hour = np.mod(seconds, 86400) / 3600
+    return day_of_year, hour
+
+
+def solar_zenith_cosine(lat, lon, timestamps):
+    """
+    Cosine of the solar zenith angle (NOAA low-precision solar position)
+    Negative values mean the sun is below the horizon
+    """
+    day_of_year, hour = _day_and_hour(timestamps)
+    lat_rad = np.radians(np.asarray(lat, dtype='float64'))
+    lon = np.asarray(lon, dtype='float64')
+
+    # Fractional year in radians
+    gamma = 2 * np.pi / 365 * (day_of_year - 1 + (hour - 12) / 24)
+
+    # Equation of time (minutes) and solar declination (radians)
+    eqtime = 229.18 * (0.000075 + 0.001868 * np.cos(gamma) - 0.032077 * np.sin(gamma)
+                       - 0.014615 * np.cos(2 * gamma) - 0.040849 * np.sin(2 * gamma))
+    decl = (0.006918 - 0.399912 * np.cos(gamma) + 0.070257 * np.sin(gamma)
+            - 0.006758 * np.cos(2 * gamma) + 0.000907 * np.sin(2 * gamma)
+            - 0.002697 * np.cos(3 * gamma) + 0.00148 * np.sin(3 * gamma))
+
+    # True solar time (minutes) -> hour angle
+    solar_minutes = hour * 60 + eqtime + 4 * lon
+    hour_angle = np.radians(solar_minutes / 4 - 180)
+
+    return np.sin(lat_rad) * np.sin(decl) + np.cos(lat_rad) * np.cos(decl) * np.cos(hour_angle)
+
+
+def cloud_modification_factor(cloud_cover):
+    """UV transmission for cloud cover given in percent (0-100)"""
+    cover = np.clip(np.asarray(cloud_cover, dtype='float64') / 100, 0, 1)
+    return 1 - CLOUD_ATTENUATION * cover ** CLOUD_EXPONENT
+
+
+def estimate_uv_index(lat, lon, timestamps=None, cloud_cover=None):
+    """
+    Estimate the UV index for coordinates at the given POSIX time(s)
+
+    Returns a float for scalar inputs, otherwise an array with the
+    broadcast shape of the inputs. Missing cloud cover (None or NaN)
+    is treated as clear sky.
+    """
+    if timestamps is None:
+        timestamps = time.time()
+
+    mu = np.clip(solar_zenith_cosine(lat, lon, timestamps), 0, 1)
+    uv = UVI_MAX * mu ** UV_ZENITH_EXPONENT
+
+    if cloud_cover is not None:
+        cover = np.asarray(cloud_cover, dtype='float64')
+        uv = uv * np.where(np.isnan(cover), 1.0, cloud_modification_factor(np.nan_to_num(cover)))
+
+    uv = np.round(uv, 1)
+    return float(uv) if uv.ndim == 0 else uv
@@ -5,15 +5,136 @@ Integrates OpenWeatherMap Weather + UV Index + Air Quality (AQI)
 
 import requests
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from dotenv import load_dotenv
 
+import geohash
+import upstream_client
+from rate_limiter import BATCH, BACKGROUND, current_priority, run_with_priority, upstream_priority
+from gazetteer import lookup_city, nearest_city
+from singleflight import SingleFlight
+from weather_refresher import BackgroundRefresher, HotLocationTracker
+from forecast_risk import build_risk_timeline
+from weather_snapshot import (
+    WeatherSnapshot, get_aqi_category, get_aqi_skin_impact, calculate_uv_risk
+)
+from weather_cache import NegativeCache, TTLCache, create_cache, normalize_city
+from uv_estimator import estimate_uv_index
+from climatology import lookup_estimate
+
 load_dotenv()
 
 WEATHER_API_KEY = os.environ.get('WEATHER_API_KEY', 'your_api_key_here')
-WEATHER_API_URL = 'https://api.openweathermap.org/data/2.5/weather'
-UV_INDEX_URL = 'https://api.openweathermap.org/data/2.5/uvi'
-AIR_POLLUTION_URL = 'https://api.openweathermap.org/data/2.5/air_pollution'
-GEOCODING_URL = 'https://api.openweathermap.org/geo/1.0/direct'
+# Base URL is overridable so the app can run against fake_owm_server.py
+OWM_BASE_URL = os.environ.get('OWM_BASE_URL', 'https://api.openweathermap.org').rstrip('/')
+WEATHER_API_URL = os.environ.get('WEATHER_API_URL', f'{OWM_BASE_URL}/data/2.5/weather')
+UV_INDEX_URL = os.environ.get('UV_INDEX_URL', f'{OWM_BASE_URL}/data/2.5/uvi')
+AIR_POLLUTION_URL = os.environ.get('AIR_POLLUTION_URL', f'{OWM_BASE_URL}/data/2.5/air_pollution')
+GEOCODING_URL = os.environ.get('GEOCODING_URL', f'{OWM_BASE_URL}/geo/1.0/direct')
+REVERSE_GEOCODING_URL = os.environ.get('REVERSE_GEOCODING_URL', f'{OWM_BASE_URL}/geo/1.0/reverse')
+FORECAST_URL = os.environ.get('FORECAST_URL', f'{OWM_BASE_URL}/data/2.5/forecast')
+
+# 'api' calls the UV endpoint (estimating only on failure); 'estimate'
+# always uses the offline solar-geometry estimate to save quota and latency
+UV_SOURCE = os.environ.get('UV_SOURCE', 'api').lower()
+
+# Serve the bundled latitude-band seasonal model (flagged "estimated", see
+# climatology.py) when live weather is unavailable or the API key budget is spent
+CLIMATOLOGY_FALLBACK = os.environ.get('CLIMATOLOGY_FALLBACK', 'true').lower() == 'true'
+
+# Cache configuration - weather changes faster than UV/AQI readings
+CACHE_MAX_ENTRIES = int(os.environ.get('WEATHER_CACHE_MAX_ENTRIES', 512))
+WEATHER_CACHE_TTL = int(os.environ.get('WEATHER_CACHE_TTL', 600))
+UV_CACHE_TTL = int(os.environ.get('UV_CACHE_TTL', 1800))
+AQI_CACHE_TTL = int(os.environ.get('AQI_CACHE_TTL', 1800))
+FORECAST_CACHE_TTL = int(os.environ.get('FORECAST_CACHE_TTL', 1800))
+# Place names do not change, so upstream reverse geocoding answers are kept a day
+GEOCODE_CACHE_TTL = int(os.environ.get('GEOCODE_CACHE_TTL', 86400))
+# Expired entries are still served for this long while a refresh runs
+CACHE_STALE_TTL = int(os.environ.get('CACHE_STALE_TTL', 300))
+
+# Coordinate lookups are quantized to geohash tiles and fetched for the tile
+# centre, so nearby users share one cache entry (precision 5 ~ 4.9 x 4.9 km).
+# With neighbour reuse, a point near a tile edge may be served from a fresh
+# entry of the adjacent tile instead of calling upstream for its own
+GEOHASH_PRECISION = int(os.environ.get('GEOHASH_PRECISION', 5))
+GEOHASH_NEIGHBOR_REUSE = os.environ.get('GEOHASH_NEIGHBOR_REUSE', 'false').lower() == 'true'
+GEOHASH_NEIGHBOR_MARGIN = float(os.environ.get('GEOHASH_NEIGHBOR_MARGIN', 0.15))
+
+# UV and AQI lookups only need lat/lon, so they are fanned out concurrently
+# on a shared executor and must finish within UPSTREAM_DEADLINE seconds
+UPSTREAM_DEADLINE = float(os.environ.get('UPSTREAM_DEADLINE', 3.0))
+UPSTREAM_WORKERS = int(os.environ.get('UPSTREAM_WORKERS', 8))
+_executor = ThreadPoolExecutor(max_workers=UPSTREAM_WORKERS, thread_name_prefix='weather-upstream')
+
+# Batch lookups run on their own pool, and their UV/AQI legs on another
+# (two per batch thread), so a large batch never queues behind or delays
+# the legs of interactive requests on _executor
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', 8))
+BATCH_MAX_LOCATIONS = int(os.environ.get('BATCH_MAX_LOCATIONS', 500))
+_batch_executor = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix='weather-batch')
+_batch_leg_executor = ThreadPoolExecutor(max_workers=2 * BATCH_CONCURRENCY, thread_name_prefix='weather-batch-leg')
+
+# 'memory' keeps a cache per worker; 'sqlite' shares one on-disk cache
+# between all gunicorn workers on the host and survives restarts
+CACHE_BACKEND = os.environ.get('WEATHER_CACHE_BACKEND', 'memory').lower()
+CACHE_PATH = os.environ.get('WEATHER_CACHE_PATH', os.path.join('cache', 'weather_cache.sqlite3'))
+
+weather_cache = create_cache(CACHE_BACKEND, CACHE_MAX_ENTRIES, WEATHER_CACHE_TTL, 'weather', CACHE_STALE_TTL, CACHE_PATH)
+tile_weather_cache = create_cache(CACHE_BACKEND, CACHE_MAX_ENTRIES, WEATHER_CACHE_TTL, 'weather_tiles', CACHE_STALE_TTL, CACHE_PATH)
+uv_cache = create_cache(CACHE_BACKEND, CACHE_MAX_ENTRIES, UV_CACHE_TTL, 'uv', CACHE_STALE_TTL, CACHE_PATH)
+aqi_cache = create_cache(CACHE_BACKEND, CACHE_MAX_ENTRIES, AQI_CACHE_TTL, 'air_quality', CACHE_STALE_TTL, CACHE_PATH)
+forecast_cache = create_cache(CACHE_BACKEND, CACHE_MAX_ENTRIES, FORECAST_CACHE_TTL, 'forecast', CACHE_STALE_TTL, CACHE_PATH)
+geocode_cache = create_cache(CACHE_BACKEND, CACHE_MAX_ENTRIES, GEOCODE_CACHE_TTL, 'reverse_geocode', 0, CACHE_PATH)
+
+# Snapshots are built once per upstream weather response (identified by its
+# observation time) and reused until that response is replaced. Always
+# in-process: they are derived from the shared caches above
+snapshot_cache = TTLCache(CACHE_MAX_ENTRIES, WEATHER_CACHE_TTL + CACHE_STALE_TTL, name='snapshots')
+
+# City names upstream answered 404 for are rejected locally for a while
+NEGATIVE_CACHE_TTL = int(os.environ.get('NEGATIVE_CACHE_TTL', 3600))
+NEGATIVE_CACHE_MAX_ENTRIES = int(os.environ.get('NEGATIVE_CACHE_MAX_ENTRIES', 4096))
+unknown_cities = NegativeCache(NEGATIVE_CACHE_MAX_ENTRIES, NEGATIVE_CACHE_TTL, name='unknown_cities')
+
+# Concurrent cache misses for the same key share one upstream request
+weather_flight = SingleFlight(name='weather')
+uv_flight = SingleFlight(name='uv')
+aqi_flight = SingleFlight(name='air_quality')
+forecast_flight = SingleFlight(name='forecast')
+geocode_flight = SingleFlight(name='reverse_geocode')
+
+# Background refresh of hot cities ahead of expiry
+REFRESH_ENABLED = os.environ.get('WEATHER_REFRESH_ENABLED', 'true').lower() == 'true'
+REFRESH_TOP_K = int(os.environ.get('WEATHER_REFRESH_TOP_K', 20))
+REFRESH_INTERVAL = int(os.environ.get('WEATHER_REFRESH_INTERVAL', 30))
+REFRESH_CALL_BUDGET = int(os.environ.get('WEATHER_REFRESH_CALL_BUDGET', 30))
+REFRESH_AHEAD = int(os.environ.get('WEATHER_REFRESH_AHEAD', 60))
+REFRESH_HALF_LIFE = int(os.environ.get('WEATHER_REFRESH_HALF_LIFE', 600))
+WARM_CITIES = [city.strip() for city in os.environ.get('WARM_CITIES', '').split(';') if city.strip()]
+
+def get_cache_stats():
+    """Hit/miss counters for all weather caches"""
+    return {
+        'weather': weather_cache.stats(),
+        'weather_tiles': tile_weather_cache.stats(),
+        'uv': uv_cache.stats(),
+        'air_quality': aqi_cache.stats(),
+        'forecast': forecast_cache.stats(),
+        'reverse_geocode': geocode_cache.stats(),
+        'snapshots': snapshot_cache.stats(),
+        'unknown_cities': unknown_cities.stats()
+    }
+
+def get_coalescing_stats():
+    """How many upstream calls were shared between concurrent callers"""
+    return {
+        'weather': weather_flight.stats(),
+        'uv': uv_flight.stats(),
+        'air_quality': aqi_flight.stats(),
+        'forecast': forecast_flight.stats()
+    }
 
 def get_weather_data(city):
     """
@@ -22,45 +143,179 @@ def get_weather_data(city):
     - Wind speed and direction
     - Weather conditions
     - Coordinates for additional API calls
+    
+    Results are cached by normalized city name ('London ' == 'london');
+    names upstream did not recognize return None without an upstream call
     """
+    cache_key = normalize_city(city)
+    if cache_key in unknown_cities:
+        return None
+    
+    cached, is_stale = weather_cache.get_stale(cache_key)
+    if cached is not None:
+        if is_stale:
+            _revalidate(weather_flight, cache_key, _fetch_weather_data, city, cache_key)
+        return cached
+    
+    return weather_flight.do(cache_key, _fetch_weather_data, city, cache_key)
+
+def _revalidate(flight, cache_key, fetch_fn, *args):
+    """Refresh a stale cache entry in the background (coalesced per key)"""
+    _executor.submit(run_with_priority, BACKGROUND, flight.do, cache_key, fetch_fn, *args)
+
+def _fetch_weather_data(city, cache_key):
+    """Upstream weather call for a city, storing the result in the cache"""
     try:
         params = {
             'q': city,
             'appid': WEATHER_API_KEY,
             'units': 'metric'
         }
-        response = requests.get(WEATHER_API_URL, params=params, timeout=10)
+        response = upstream_client.get(WEATHER_API_URL, params=params)
         response.raise_for_status()
-        return response.json()
+        data = response.json()
     except requests.exceptions.RequestException as e:
         print(f"Error fetching weather data: {e}")
+        remember_if_unknown(cache_key, e)
+        return None
+    
+    cache_weather_data(cache_key, data)
+    return data
+
+def remember_if_unknown(cache_key, error):
+    """Negative-cache a city name that upstream answered 404 for"""
+    response = getattr(error, 'response', None)
+    if response is not None and response.status_code == 404:
+        unknown_cities.add(cache_key)
+
+def cache_weather_data(cache_key, data):
+    """Store a weather payload under the query key and the keys that mean the same city"""
+    name = data.get('name', '')
+    country = data.get('sys', {}).get('country', '')
+    keys = {cache_key}
+    
+    # The canonical "name,country" key, so 'london' followed by 'LONDON,GB' hits
+    keys.add(normalize_city(f"{name},{country}"))
+    
+    # The bare name, so 'LONDON,GB' followed by 'london' hits too - but only
+    # when the name alone resolves to this city, so 'London,CA' never
+    # answers for 'london'
+    name_key = normalize_city(name)
+    known_city = lookup_city(name_key) if name_key else None
+    if known_city and known_city['country'].upper() == country.upper():
+        keys.add(name_key)
+    
+    for key in keys - {''}:
+        weather_cache.set(key, data)
+
+def coordinate_tile(lat, lon):
+    """Geohash tile that coordinate lookups are cached and fetched under"""
+    return geohash.encode(lat, lon, GEOHASH_PRECISION)
+
+def tile_center(tile):
+    """Coordinates sent upstream for a tile"""
+    lat, lon = geohash.center(tile)
+    return round(lat, 4), round(lon, 4)
+
+def get_tile_cached(cache, tile, lat, lon):
+    """
+    Look up a tile, then (if enabled) fresh entries of the adjacent tiles
+    the point is close to. Returns (value, is_stale); only the point's own
+    tile is ever reported stale (and so revalidated)
+    """
+    cached, is_stale = cache.get_stale(tile)
+    if cached is not None or not GEOHASH_NEIGHBOR_REUSE:
+        return cached, is_stale
+    
+    for neighbor_tile in geohash.nearby_tiles(lat, lon, tile, GEOHASH_NEIGHBOR_MARGIN):
+        cached = cache.get(neighbor_tile)
+        if cached is not None:
+            return cached, False
+    return None, False
+
+def get_weather_by_coords(lat, lon):
+    """
+    Fetch current weather for coordinates (cached per geohash tile)
+    Returns the raw OpenWeatherMap payload for the tile centre or None
+    """
+    tile = coordinate_tile(lat, lon)
+    flight_key = f"tile:{tile}"
+    cached, is_stale = get_tile_cached(tile_weather_cache, tile, lat, lon)
+    if cached is not None:
+        if is_stale:
+            _revalidate(weather_flight, flight_key, _fetch_weather_by_tile, tile)
+        return cached
+    
+    return weather_flight.do(flight_key, _fetch_weather_by_tile, tile)
+
+def _fetch_weather_by_tile(tile):
+    """Upstream weather call for a tile centre, storing the result in the cache"""
+    lat, lon = tile_center(tile)
+    try:
+        params = {
+            'lat': lat,
+            'lon': lon,
+            'appid': WEATHER_API_KEY,
+            'units': 'metric'
+        }
+        response = upstream_client.get(WEATHER_API_URL, params=params)
+        response.raise_for_status()
+        data = response.json()
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching weather data by coordinates: {e}")
         return None
+    
+    tile_weather_cache.set(tile, data)
+    return data
 
-def get_uv_index(lat, lon):
+def get_uv_index(lat, lon, cloud_cover=None):
     """
     Fetch UV index data for given coordinates
     Returns float value (0-11+)
+    
+    cloud_cover (percent, from the weather payload) only refines the
+    offline estimate used when the API is skipped or unavailable
     """
+    if UV_SOURCE == 'estimate':
+        return estimate_uv(lat, lon, cloud_cover)
+    
+    tile = coordinate_tile(lat, lon)
+    cached, is_stale = get_tile_cached(uv_cache, tile, lat, lon)
+    if cached is not None:
+        if is_stale:
+            _revalidate(uv_flight, tile, _fetch_uv_index, tile)
+        return cached
+    
+    uv_index = uv_flight.do(tile, _fetch_uv_index, tile)
+    if uv_index is None:
+        return estimate_uv(lat, lon, cloud_cover)
+    return uv_index
+
+def _fetch_uv_index(tile):
+    """Upstream UV call for a tile centre, returns None on failure so callers can fall back"""
+    lat, lon = tile_center(tile)
     try:
         params = {
             'lat': lat,
             'lon': lon,
             'appid': WEATHER_API_KEY
         }
-        response = requests.get(UV_INDEX_URL, params=params, timeout=10)
+        response = upstream_client.get(UV_INDEX_URL, params=params)
         response.raise_for_status()
         data = response.json()
-        return data.get('value', 5)  # Default to moderate if unavailable
+        uv_index = data.get('value', 5)  # Default to moderate if unavailable
+        uv_cache.set(tile, uv_index)
+        return uv_index
     except:
-        # Fallback UV estimation based on time of day
-        from datetime import datetime
-        hour = datetime.now().hour
-        if 10 <= hour <= 16:  # Peak hours
-            return 7
-        elif 8 <= hour <= 18:  # Moderate hours
-            return 4
-        else:  # Early morning/evening/night
-            return 1
+        return None
+
+def estimate_uv(lat, lon, cloud_cover=None):
+    """Offline UV estimate for the current time from solar position and cloud cover"""
+    return estimate_uv_index(lat, lon, cloud_cover=cloud_cover)
+
+def get_cloud_cover(weather_data):
+    """Cloud cover percentage from a weather payload, or None"""
+    return weather_data.get('clouds', {}).get('all')
 
 def get_air_quality(lat, lon):
     """
@@ -83,54 +338,50 @@ def get_air_quality(lat, lon):
         'co': float      # Carbon monoxide
     }
     """
+    tile = coordinate_tile(lat, lon)
+    cached, is_stale = get_tile_cached(aqi_cache, tile, lat, lon)
+    if cached is not None:
+        if is_stale:
+            _revalidate(aqi_flight, tile, _fetch_air_quality, tile)
+        return cached
+    
+    return aqi_flight.do(tile, _fetch_air_quality, tile)
+
+def _fetch_air_quality(tile):
+    """Upstream air pollution call for a tile centre, storing the result in the cache"""
+    lat, lon = tile_center(tile)
     try:
         params = {
             'lat': lat,
             'lon': lon,
             'appid': WEATHER_API_KEY
         }
-        response = requests.get(AIR_POLLUTION_URL, params=params, timeout=10)
+        response = upstream_client.get(AIR_POLLUTION_URL, params=params)
         response.raise_for_status()
         data = response.json()
         
-        if data and 'list' in data and len(data['list']) > 0:
-            pollution_data = data['list'][0]
-            
-            return {
-                'aqi': pollution_data['main']['aqi'],
-                'pm2_5': pollution_data['components'].get('pm2_5', 0),
-                'pm10': pollution_data['components'].get('pm10', 0),
-                'no2': pollution_data['components'].get('no2', 0),
-                'o3': pollution_data['components'].get('o3', 0),
-                'co': pollution_data['components'].get('co', 0)
-            }
-        else:
-            return None
+        air_quality = parse_air_quality(data)
+        if air_quality:
+            aqi_cache.set(tile, air_quality)
+        return air_quality
     except requests.exceptions.RequestException as e:
         print(f"Error fetching air quality data: {e}")
         return None
 
-def get_aqi_category(aqi):
-    """Convert AQI number to category name"""
-    categories = {
-        1: 'Good',
-        2: 'Fair',
-        3: 'Moderate',
-        4: 'Poor',
-        5: 'Very Poor'
-    }
-    return categories.get(aqi, 'Unknown')
-
-def get_aqi_skin_impact(aqi):
-    """Get skin impact description for AQI level"""
-    impacts = {
-        1: 'Minimal impact on skin. Normal skincare routine is sufficient.',
-        2: 'Low impact. Basic cleansing recommended after outdoor activities.',
-        3: 'Moderate impact. Antioxidant skincare recommended. Cleanse thoroughly.',
-        4: 'Poor air quality can accelerate aging. Use protective barrier creams and antioxidants.',
-        5: 'Very poor air quality. Minimize outdoor exposure. Use strong antioxidants and barrier repair products.'
-    }
-    return impacts.get(aqi, 'Unknown impact')
+def parse_air_quality(data):
+    """Extract AQI and pollutant readings from an air pollution payload"""
+    if data and 'list' in data and len(data['list']) > 0:
+        pollution_data = data['list'][0]
+        
+        return {
+            'aqi': pollution_data['main']['aqi'],
+            'pm2_5': pollution_data['components'].get('pm2_5', 0),
+            'pm10': pollution_data['components'].get('pm10', 0),
+            'no2': pollution_data['components'].get('no2', 0),
+            'o3': pollution_data['components'].get('o3', 0),
+            'co': pollution_data['components'].get('co', 0)
+        }
+    return None
 
 def get_comprehensive_weather(city):
     """
@@ -139,90 +390,347 @@ def get_comprehensive_weather(city):
     - UV index
     - Air quality/pollution
     """
+    snapshot = get_weather_snapshot(city)
+    return snapshot.to_dict() if snapshot else None
+
+def get_weather_snapshot(city):
+    """
+    WeatherSnapshot (weather + UV + AQI) for a city, or None
+    Falls back to the seasonal estimate for gazetteer cities when upstream fails
+    """
     weather_data = get_weather_data(city)
     
     if not weather_data:
-        return None
+        return estimate_snapshot_for_city(city)
+    
+    # Only names that resolved count towards the hot set
+    cache_key = normalize_city(city)
+    refresher.record(cache_key, city)
+    
+    snapshot = get_cached_snapshot(cache_key, weather_data)
+    if snapshot is not None:
+        return snapshot
     
     lat = weather_data['coord']['lat']
     lon = weather_data['coord']['lon']
     
-    uv_index = get_uv_index(lat, lon)
-    air_quality = get_air_quality(lat, lon)
+    uv_index, air_quality = fetch_uv_and_air_quality(lat, lon, cloud_cover=get_cloud_cover(weather_data))
     
-    comprehensive_data = {
-        'city': weather_data['name'],
-        'country': weather_data['sys']['country'],
-        'coordinates': {
-            'lat': lat,
-            'lon': lon
-        },
-        'weather': {
-            'temperature': weather_data['main']['temp'],
-            'feels_like': weather_data['main']['feels_like'],
-            'temp_min': weather_data['main']['temp_min'],
-            'temp_max': weather_data['main']['temp_max'],
-            'humidity': weather_data['main']['humidity'],
-            'pressure': weather_data['main']['pressure'],
-            'description': weather_data['weather'][0]['description'],
-            'main': weather_data['weather'][0]['main'],
-            'icon': weather_data['weather'][0]['icon']
-        },
-        'wind': {
-            'speed': weather_data['wind']['speed'],
-            'deg': weather_data['wind'].get('deg', 0)
-        },
-        'uv': {
-            'index': round(uv_index, 1),
-            'risk': calculate_uv_risk(uv_index)
-        }
-    }
+    snapshot = WeatherSnapshot.from_owm(weather_data, uv_index, air_quality)
+    cache_snapshot(cache_key, weather_data, snapshot)
+    return snapshot
+
+def _snapshot_version(weather_data):
+    """Identifies one upstream weather response, None if it cannot be told apart"""
+    return weather_data.get('dt')
+
+def get_cached_snapshot(key, weather_data):
+    """Snapshot already built from this weather response, or None"""
+    version = _snapshot_version(weather_data)
+    entry = snapshot_cache.get(key) if version is not None else None
+    if entry is None or entry[0] != version:
+        return None
+    return entry[1]
+
+def cache_snapshot(key, weather_data, snapshot):
+    """
+    Keep a snapshot until its weather response is replaced
+    Snapshots missing air quality (e.g. the AQI leg missed its deadline)
+    are not kept, so the next request tries again
+    """
+    version = _snapshot_version(weather_data)
+    if version is not None and snapshot.aqi is not None:
+        snapshot_cache.set(key, (version, snapshot))
+
+def refresh_comprehensive_weather(city):
+    """
+    Re-fetch weather, UV and AQI for a city regardless of cache state
+    Returns the number of upstream calls made (for the refresh budget)
+    Runs at background priority, so it backs off when the API key budget is low
+    """
+    with upstream_priority(BACKGROUND):
+        cache_key = normalize_city(city)
+        weather_data = weather_flight.do(cache_key, _fetch_weather_data, city, cache_key)
+        if not weather_data:
+            return 1
+        
+        tile = coordinate_tile(weather_data['coord']['lat'], weather_data['coord']['lon'])
+        aqi_flight.do(tile, _fetch_air_quality, tile)
+        if UV_SOURCE == 'estimate':
+            return 2
+        uv_flight.do(tile, _fetch_uv_index, tile)
+        return 3
+
+refresher = BackgroundRefresher(
+    refresh_comprehensive_weather,
+    weather_cache.expires_in,
+    tracker=HotLocationTracker(half_life=REFRESH_HALF_LIFE),
+    top_k=REFRESH_TOP_K,
+    interval=REFRESH_INTERVAL,
+    call_budget=REFRESH_CALL_BUDGET,
+    refresh_ahead=REFRESH_AHEAD
+)
+
+def warm_cache(cities):
+    """Pre-fetch a list of cities (e.g. at startup), marking them as hot"""
+    warmed = 0
+    for result in iter_comprehensive_weather_batch(cities):
+        if 'data' in result:
+            warmed += 1
+    print(f"Weather cache warmed with {warmed}/{len(cities)} cities")
+    return warmed
+
+def start_background_refresh():
+    """Warm WARM_CITIES in the background and start the hot-city refresher"""
+    if not REFRESH_ENABLED:
+        return
+    if WARM_CITIES:
+        _executor.submit(run_with_priority, BACKGROUND, warm_cache, WARM_CITIES)
+    refresher.start()
+
+def get_comprehensive_weather_by_coords(lat, lon):
+    """Coordinate version of get_comprehensive_weather"""
+    snapshot = get_weather_snapshot_by_coords(lat, lon)
+    return snapshot.to_dict() if snapshot else None
+
+def get_weather_snapshot_by_coords(lat, lon):
+    """
+    WeatherSnapshot (weather + UV + AQI) for exact coordinates, or None
+    Built once per geohash tile response and shared by nearby callers
+    """
+    weather_data = get_weather_by_coords(lat, lon)
     
-    # Add air quality if available
-    if air_quality:
-        comprehensive_data['air_quality'] = {
-            'aqi': air_quality['aqi'],
-            'category': get_aqi_category(air_quality['aqi']),
-            'pm2_5': round(air_quality['pm2_5'], 2),
-            'pm10': round(air_quality['pm10'], 2),
-            'skin_impact': get_aqi_skin_impact(air_quality['aqi'])
-        }
-    else:
-        comprehensive_data['air_quality'] = {
-            'aqi': 2,  # Default to Fair
-            'category': 'Fair',
-            'pm2_5': 0,
-            'pm10': 0,
-            'skin_impact': 'Air quality data unavailable. Proceed with normal skincare.'
-        }
+    if not weather_data:
+        return estimate_snapshot_for_coords(lat, lon)
+    
+    snapshot_key = f"tile:{coordinate_tile(lat, lon)}"
+    snapshot = get_cached_snapshot(snapshot_key, weather_data)
+    if snapshot is None:
+        uv_index, air_quality = fetch_uv_and_air_quality(lat, lon, cloud_cover=get_cloud_cover(weather_data))
+        snapshot = WeatherSnapshot.from_owm(weather_data, uv_index, air_quality)
+        cache_snapshot(snapshot_key, weather_data, snapshot)
+    
+    # Report the caller's coordinates, not the tile centre the data is for
+    return snapshot.at(lat, lon)
+
+def get_estimated_snapshot(lat, lon, city=None, country=''):
+    """
+    WeatherSnapshot from the bundled seasonal model, flagged as estimated
+    The model only varies with latitude and month (UV with the sun's
+    position), so the description says so and air quality is left unknown.
+    Returns None when the fallback is disabled or the grid is missing
+    """
+    if not CLIMATOLOGY_FALLBACK:
+        return None
+    
+    estimate = lookup_estimate(lat, lon)
+    if estimate is None:
+        return None
+    
+    temperature = estimate['temperature']
+    return WeatherSnapshot(
+        city=city or 'Your Location',
+        country=country,
+        lat=lat,
+        lon=lon,
+        temperature=temperature,
+        feels_like=temperature,
+        temp_min=temperature,
+        temp_max=temperature,
+        humidity=estimate['humidity'],
+        pressure=1013,
+        description='seasonal estimate for this latitude, not live weather',
+        main='',
+        icon='',
+        wind_speed=estimate['wind_speed'],
+        # The grid holds the typical daily maximum; the sun's position caps it
+        uv_index=min(estimate['uv_index'], estimate_uv(lat, lon)),
+        estimated=True
+    )
+
+def estimate_snapshot_for_city(city):
+    """Estimated snapshot for a city the gazetteer knows (never for names upstream rejected)"""
+    if normalize_city(city) in unknown_cities:
+        return None
+    known_city = lookup_city(city)
+    if not known_city:
+        return None
+    return get_estimated_snapshot(known_city['lat'], known_city['lon'], known_city['name'], known_city['country'])
+
+def estimate_snapshot_for_coords(lat, lon):
+    """Estimated snapshot for coordinates, named after the nearest known city"""
+    nearby = nearest_city(lat, lon)
+    if nearby:
+        return get_estimated_snapshot(lat, lon, nearby['name'], nearby['country'])
+    return get_estimated_snapshot(lat, lon)
+
+def get_forecast(city):
+    """
+    5-day / 3-hour forecast for a city (one upstream call, 40 steps)
+    Returns the raw OpenWeatherMap payload or None
+    """
+    cache_key = normalize_city(city)
+    if cache_key in unknown_cities:
+        return None
+    return _get_forecast(cache_key, {'q': city})
+
+def get_forecast_by_coords(lat, lon):
+    """Coordinate version of get_forecast"""
+    tile = coordinate_tile(lat, lon)
+    center_lat, center_lon = tile_center(tile)
+    return _get_forecast(f"tile:{tile}", {'lat': center_lat, 'lon': center_lon})
+
+def _get_forecast(cache_key, query):
+    """Cached, coalesced forecast lookup shared by the city and coordinate variants"""
+    cached, is_stale = forecast_cache.get_stale(cache_key)
+    if cached is not None:
+        if is_stale:
+            _revalidate(forecast_flight, cache_key, _fetch_forecast, query, cache_key)
+        return cached
+    
+    return forecast_flight.do(cache_key, _fetch_forecast, query, cache_key)
+
+def _fetch_forecast(query, cache_key):
+    """Upstream forecast call, storing the result in the cache"""
+    try:
+        params = dict(query, appid=WEATHER_API_KEY, units='metric')
+        response = upstream_client.get(FORECAST_URL, params=params)
+        response.raise_for_status()
+        data = response.json()
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching forecast data: {e}")
+        if 'q' in query:
+            remember_if_unknown(cache_key, e)
+        return None
     
-    return comprehensive_data
-
-def calculate_uv_risk(uv_index):
-    """Categorize UV index risk level"""
-    if uv_index < 3:
-        return 'Low'
-    elif uv_index < 6:
-        return 'Moderate'
-    elif uv_index < 8:
-        return 'High'
-    elif uv_index < 11:
-        return 'Very High'
-    else:
-        return 'Extreme'
+    forecast_cache.set(cache_key, data)
+    return data
+
+def get_forecast_timeline(city):
+    """Skin-concern risk timeline over the forecast for a city, or None"""
+    forecast_data = get_forecast(city)
+    return build_risk_timeline(forecast_data) if forecast_data else None
+
+def get_forecast_timeline_by_coords(lat, lon):
+    """Coordinate version of get_forecast_timeline"""
+    forecast_data = get_forecast_by_coords(lat, lon)
+    return build_risk_timeline(forecast_data) if forecast_data else None
+
+def parse_batch_location(location):
+    """
+    Turn one batch item into a hashable lookup key
+    Accepts "City", {"city": "City"} or {"lat": .., "lon": ..}
+    Returns ('city', normalized) / ('coords', (lat, lon)) or None if invalid
+    """
+    if isinstance(location, str):
+        city = location.strip()
+        return ('city', normalize_city(city)) if city else None
+    
+    if isinstance(location, dict):
+        if location.get('lat') is not None and location.get('lon') is not None:
+            try:
+                lat = float(location['lat'])
+                lon = float(location['lon'])
+            except (TypeError, ValueError):
+                return None
+            if -90 <= lat <= 90 and -180 <= lon <= 180:
+                return ('coords', (round(lat, 4), round(lon, 4)))
+            return None
+        
+        city = str(location.get('city') or '').strip()
+        return ('city', normalize_city(city)) if city else None
+    
+    return None
+
+def _lookup_batch_key(key):
+    """Resolve one deduplicated batch key through the cached lookups"""
+    kind, value = key
+    if kind == 'coords':
+        return get_comprehensive_weather_by_coords(*value)
+    return get_comprehensive_weather(value)
+
+def iter_comprehensive_weather_batch(locations):
+    """
+    Fetch weather for many locations with bounded concurrency
+    Duplicates are fetched once; yields one result per input, in input order:
+    {'index': i, 'data': {...}} or {'index': i, 'error': '...'}
+    """
+    keys = [parse_batch_location(location) for location in locations]
+    
+    futures = {}
+    for key in keys:
+        if key is not None and key not in futures:
+            futures[key] = _batch_executor.submit(run_with_priority, BATCH, _lookup_batch_key, key)
+    
+    for index, key in enumerate(keys):
+        if key is None:
+            yield {'index': index, 'error': 'Invalid location. Use a city name or lat/lon pair.'}
+            continue
+        
+        try:
+            data = futures[key].result()
+        except Exception as e:
+            print(f"Error in batch weather lookup for {key}: {e}")
+            data = None
+        
+        if data:
+            yield {'index': index, 'data': data}
+        else:
+            yield {'index': index, 'error': 'Unable to fetch weather data for this location.'}
+
+def fetch_uv_and_air_quality(lat, lon, deadline=None, cloud_cover=None):
+    """
+    Fetch UV index and air quality concurrently
+    Legs that miss the deadline degrade to the solar-geometry UV estimate
+    and None air quality (callers substitute the default AQI)
+    """
+    deadline = UPSTREAM_DEADLINE if deadline is None else deadline
+    started = time.monotonic()
+    
+    # Fan-out legs inherit the caller's upstream priority (and batch legs
+    # stay off the interactive pool)
+    priority = current_priority()
+    executor = _batch_leg_executor if priority == BATCH else _executor
+    uv_future = executor.submit(run_with_priority, priority, get_uv_index, lat, lon, cloud_cover)
+    aqi_future = executor.submit(run_with_priority, priority, get_air_quality, lat, lon)
+    
+    try:
+        uv_index = uv_future.result(timeout=deadline)
+    except FutureTimeoutError:
+        print(f"UV index lookup exceeded {deadline}s deadline, using estimate")
+        uv_index = estimate_uv(lat, lon, cloud_cover)
+    
+    try:
+        remaining = max(0, deadline - (time.monotonic() - started))
+        air_quality = aqi_future.result(timeout=remaining)
+    except FutureTimeoutError:
+        print(f"Air quality lookup exceeded {deadline}s deadline, using default")
+        air_quality = None
+    
+    return uv_index, air_quality
 
 def get_coordinates_from_city(city):
     """
     Get lat/lon coordinates from city name
     Useful for direct coordinate-based queries
+    Resolved from the offline gazetteer first, geocoding API otherwise
     """
+    known_city = lookup_city(city)
+    if known_city:
+        return {
+            'lat': known_city['lat'],
+            'lon': known_city['lon'],
+            'name': known_city['name'],
+            'country': known_city['country']
+        }
+    
     try:
         params = {
             'q': city,
             'limit': 1,
             'appid': WEATHER_API_KEY
         }
-        response = requests.get(GEOCODING_URL, params=params, timeout=10)
+        response = upstream_client.get(GEOCODING_URL, params=params)
         response.raise_for_status()
         data = response.json()
         
@@ -236,3 +744,55 @@ def get_coordinates_from_city(city):
         return None
     except:
         return None
+
+def reverse_geocode(lat, lon):
+    """
+    Get the nearest named place for coordinates
+    Returns {'name', 'state', 'country'} or None. Served from the offline
+    gazetteer when a bundled city is close enough; otherwise from the
+    upstream reverse geocoding API, cached per geohash tile
+    """
+    lat, lon = float(lat), float(lon)
+    known_city = nearest_city(lat, lon)
+    if known_city:
+        return {
+            'name': known_city['name'],
+            'state': known_city['state'],
+            'country': known_city['country']
+        }
+    
+    tile = coordinate_tile(lat, lon)
+    cached = geocode_cache.get(tile)
+    if cached is not None:
+        return cached or None
+    return geocode_flight.do(tile, _fetch_reverse_geocode, tile)
+
+def parse_reverse_geocode(data):
+    """Place dict from a reverse geocoding payload, {} when it names no place"""
+    if not data:
+        return {}
+    return {
+        'name': data[0].get('name', ''),
+        'state': data[0].get('state', ''),
+        'country': data[0].get('country', '')
+    }
+
+def _fetch_reverse_geocode(tile):
+    """Upstream reverse geocoding call for a tile centre, caching places and misses alike"""
+    lat, lon = tile_center(tile)
+    try:
+        params = {
+            'lat': lat,
+            'lon': lon,
+            'limit': 1,
+            'appid': WEATHER_API_KEY
+        }
+        response = upstream_client.get(REVERSE_GEOCODING_URL, params=params)
+        response.raise_for_status()
+        place = parse_reverse_geocode(response.json())
+    except requests.exceptions.RequestException as e:
+        print(f"Error reverse geocoding coordinates: {e}")
+        return None
+    
+    geocode_cache.set(tile, place)
+    return place or None
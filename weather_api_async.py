@@ -0,0 +1,387 @@
+"""
+Async Weather API
+asyncio-native versions of the weather_api lookups built on aiohttp
+Shares caches, single-flight coalescing, fallbacks and payload builders
+with weather_api
+
+Every lookup runs on one process-wide event loop thread that owns a single
+aiohttp session, so keep-alive connections survive between requests even
+though Flask gives each async view its own short-lived loop. Views simply
+await the public coroutines below; they hop onto the upstream loop.
+"""
+
+import asyncio
+import functools
+import os
+import threading
+import time
+
+import aiohttp
+
+import upstream_client
+from circuit_breaker import CircuitOpenError
+from gazetteer import nearest_city
+from rate_limiter import BACKGROUND, RateLimitedError, current_priority, run_with_priority, upstream_priority
+from weather_api import (
+    WEATHER_API_KEY, WEATHER_API_URL, UV_INDEX_URL, AIR_POLLUTION_URL, REVERSE_GEOCODING_URL,
+    UPSTREAM_DEADLINE, UV_SOURCE,
+    weather_cache, tile_weather_cache, uv_cache, aqi_cache, unknown_cities,
+    weather_flight, uv_flight, aqi_flight,
+    coordinate_tile, tile_center, get_tile_cached,
+    cache_weather_data, parse_air_quality, estimate_uv, get_cloud_cover,
+    get_cached_snapshot, cache_snapshot, refresher,
+    geocode_cache, geocode_flight, parse_reverse_geocode,
+    estimate_snapshot_for_city, estimate_snapshot_for_coords
+)
+from weather_cache import normalize_city
+from weather_snapshot import WeatherSnapshot
+
+# Errors that mean "upstream unavailable" - callers fall back on these
+UPSTREAM_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError, RateLimitedError)
+
+_TIMEOUT = aiohttp.ClientTimeout(
+    sock_connect=upstream_client.UPSTREAM_CONNECT_TIMEOUT,
+    sock_read=upstream_client.UPSTREAM_READ_TIMEOUT
+)
+
+
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+_session = None
+
+# Strong references to background revalidations (the loop only keeps weak ones)
+_background_tasks = set()
+
+
+def get_upstream_loop():
+    """
+    Get the process-wide upstream event loop, started on a daemon thread
+    Rebuilt after fork so gunicorn workers never share sockets
+    """
+    global _loop, _loop_pid, _session
+    pid = os.getpid()
+    if _loop is None or _loop_pid != pid:
+        with _loop_lock:
+            if _loop is None or _loop_pid != pid:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='upstream-loop', daemon=True).start()
+                _loop, _loop_pid, _session = loop, pid, None
+    return _loop
+
+
+def client_session():
+    """
+    The upstream loop's shared aiohttp session (created on first use)
+    Only called from coroutines running on the upstream loop
+    """
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=upstream_client.UPSTREAM_POOL_SIZE)
+        _session = aiohttp.ClientSession(connector=connector, timeout=_TIMEOUT)
+    return _session
+
+
+def on_upstream_loop(fn):
+    """Run a coroutine function on the upstream loop, whichever loop awaits it"""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        loop = get_upstream_loop()
+        if asyncio.get_running_loop() is loop:
+            return await fn(*args, **kwargs)
+        # Cancelling the caller cancels the task on the upstream loop too
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(fn(*args, **kwargs), loop))
+    return wrapper
+
+
+def _revalidate(flight, cache_key, fetch_fn, *args):
+    """Refresh a stale cache entry in the background (coalesced per key)"""
+    async def refresh():
+        with upstream_priority(BACKGROUND):
+            await flight.do_async(cache_key, fetch_fn, *args)
+
+    task = asyncio.get_running_loop().create_task(refresh())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def _get_json(url, params):
+    """
+    GET an upstream URL, raise on HTTP errors and decode the JSON body
+    Shares the call budget and per-endpoint circuit breakers with the
+    sync client (breaker first, so an open circuit spends no tokens).
+    The limiter may hold a SQLite transaction, so it runs on the loop's
+    executor; it never waits for a token
+    """
+    breaker = upstream_client.get_breaker(upstream_client.endpoint_name(url))
+    breaker.before_call()
+    
+    started = time.monotonic()
+    recorded = False
+    try:
+        # A refused token ends the call unrecorded, releasing the breaker slot
+        await asyncio.get_running_loop().run_in_executor(
+            None, run_with_priority, current_priority(), upstream_client.acquire_budget, 0.0
+        )
+        async with client_session().get(url, params=params) as response:
+            breaker.record(upstream_client.is_failure_status(response.status), time.monotonic() - started)
+            recorded = True
+            response.raise_for_status()
+            return await response.json()
+    except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+        breaker.record(True, time.monotonic() - started)
+        recorded = True
+        raise
+    finally:
+        # Cancelled by a deadline (CancelledError) or any other unrecorded exit
+        if not recorded:
+            breaker.release()
+
+
+@on_upstream_loop
+async def get_weather_data_async(city):
+    """Async version of weather_api.get_weather_data"""
+    cache_key = normalize_city(city)
+    if cache_key in unknown_cities:
+        return None
+
+    cached, is_stale = weather_cache.get_stale(cache_key)
+    if cached is not None:
+        if is_stale:
+            _revalidate(weather_flight, cache_key, _fetch_weather_data, city, cache_key)
+        return cached
+
+    return await weather_flight.do_async(cache_key, _fetch_weather_data, city, cache_key)
+
+
+async def _fetch_weather_data(city, cache_key):
+    """Upstream weather call for a city, storing the result in the cache"""
+    try:
+        params = {
+            'q': city,
+            'appid': WEATHER_API_KEY,
+            'units': 'metric'
+        }
+        data = await _get_json(WEATHER_API_URL, params)
+    except UPSTREAM_ERRORS as e:
+        print(f"Error fetching weather data: {e}")
+        if isinstance(e, aiohttp.ClientResponseError) and e.status == 404:
+            unknown_cities.add(cache_key)
+        return None
+
+    cache_weather_data(cache_key, data)
+    return data
+
+
+@on_upstream_loop
+async def get_weather_by_coords_async(lat, lon):
+    """Async version of weather_api.get_weather_by_coords"""
+    tile = coordinate_tile(lat, lon)
+    flight_key = f"tile:{tile}"
+    cached, is_stale = get_tile_cached(tile_weather_cache, tile, lat, lon)
+    if cached is not None:
+        if is_stale:
+            _revalidate(weather_flight, flight_key, _fetch_weather_by_tile, tile)
+        return cached
+
+    return await weather_flight.do_async(flight_key, _fetch_weather_by_tile, tile)
+
+
+async def _fetch_weather_by_tile(tile):
+    """Upstream weather call for a tile centre, storing the result in the cache"""
+    center_lat, center_lon = tile_center(tile)
+    try:
+        params = {
+            'lat': center_lat,
+            'lon': center_lon,
+            'appid': WEATHER_API_KEY,
+            'units': 'metric'
+        }
+        data = await _get_json(WEATHER_API_URL, params)
+    except UPSTREAM_ERRORS as e:
+        print(f"Error fetching weather data by coordinates: {e}")
+        return None
+
+    tile_weather_cache.set(tile, data)
+    return data
+
+
+@on_upstream_loop
+async def get_uv_index_async(lat, lon, cloud_cover=None):
+    """Async version of weather_api.get_uv_index"""
+    if UV_SOURCE == 'estimate':
+        return estimate_uv(lat, lon, cloud_cover)
+
+    tile = coordinate_tile(lat, lon)
+    cached, is_stale = get_tile_cached(uv_cache, tile, lat, lon)
+    if cached is not None:
+        if is_stale:
+            _revalidate(uv_flight, tile, _fetch_uv_index, tile)
+        return cached
+
+    uv_index = await uv_flight.do_async(tile, _fetch_uv_index, tile)
+    if uv_index is None:
+        return estimate_uv(lat, lon, cloud_cover)
+    return uv_index
+
+
+async def _fetch_uv_index(tile):
+    """Upstream UV call for a tile centre, returns None on failure so callers can fall back"""
+    center_lat, center_lon = tile_center(tile)
+    try:
+        params = {
+            'lat': center_lat,
+            'lon': center_lon,
+            'appid': WEATHER_API_KEY
+        }
+        data = await _get_json(UV_INDEX_URL, params)
+        uv_index = data.get('value', 5)  # Default to moderate if unavailable
+        uv_cache.set(tile, uv_index)
+        return uv_index
+    except Exception:
+        return None
+
+
+@on_upstream_loop
+async def get_air_quality_async(lat, lon):
+    """Async version of weather_api.get_air_quality"""
+    tile = coordinate_tile(lat, lon)
+    cached, is_stale = get_tile_cached(aqi_cache, tile, lat, lon)
+    if cached is not None:
+        if is_stale:
+            _revalidate(aqi_flight, tile, _fetch_air_quality, tile)
+        return cached
+
+    return await aqi_flight.do_async(tile, _fetch_air_quality, tile)
+
+
+async def _fetch_air_quality(tile):
+    """Upstream air pollution call for a tile centre, storing the result in the cache"""
+    center_lat, center_lon = tile_center(tile)
+    try:
+        params = {
+            'lat': center_lat,
+            'lon': center_lon,
+            'appid': WEATHER_API_KEY
+        }
+        data = await _get_json(AIR_POLLUTION_URL, params)
+        air_quality = parse_air_quality(data)
+        if air_quality:
+            aqi_cache.set(tile, air_quality)
+        return air_quality
+    except UPSTREAM_ERRORS as e:
+        print(f"Error fetching air quality data: {e}")
+        return None
+
+
+@on_upstream_loop
+async def reverse_geocode_async(lat, lon):
+    """Async version of weather_api.reverse_geocode"""
+    lat, lon = float(lat), float(lon)
+    known_city = nearest_city(lat, lon)
+    if known_city:
+        return {
+            'name': known_city['name'],
+            'state': known_city['state'],
+            'country': known_city['country']
+        }
+
+    tile = coordinate_tile(lat, lon)
+    cached = geocode_cache.get(tile)
+    if cached is not None:
+        return cached or None
+    return await geocode_flight.do_async(tile, _fetch_reverse_geocode, tile)
+
+
+async def _fetch_reverse_geocode(tile):
+    """Upstream reverse geocoding call for a tile centre, caching places and misses alike"""
+    center_lat, center_lon = tile_center(tile)
+    try:
+        params = {
+            'lat': center_lat,
+            'lon': center_lon,
+            'limit': 1,
+            'appid': WEATHER_API_KEY
+        }
+        data = await _get_json(REVERSE_GEOCODING_URL, params)
+    except UPSTREAM_ERRORS as e:
+        print(f"Error reverse geocoding coordinates: {e}")
+        return None
+
+    place = parse_reverse_geocode(data)
+    geocode_cache.set(tile, place)
+    return place or None
+
+
+async def _within_deadline(coro, fallback, label, deadline):
+    """Await coro, returning fallback() if it misses the deadline"""
+    try:
+        return await asyncio.wait_for(coro, timeout=deadline)
+    except asyncio.TimeoutError:
+        print(f"{label} lookup exceeded {deadline}s deadline, using fallback")
+        return fallback()
+
+
+@on_upstream_loop
+async def fetch_uv_and_air_quality_async(lat, lon, deadline=None, cloud_cover=None):
+    """Async version of weather_api.fetch_uv_and_air_quality"""
+    deadline = UPSTREAM_DEADLINE if deadline is None else deadline
+    return await asyncio.gather(
+        _within_deadline(get_uv_index_async(lat, lon, cloud_cover),
+                         lambda: estimate_uv(lat, lon, cloud_cover), 'UV index', deadline),
+        _within_deadline(get_air_quality_async(lat, lon), lambda: None, 'Air quality', deadline)
+    )
+
+
+@on_upstream_loop
+async def get_weather_snapshot_async(city):
+    """Async version of weather_api.get_weather_snapshot"""
+    weather_data = await get_weather_data_async(city)
+
+    if not weather_data:
+        return estimate_snapshot_for_city(city)
+
+    # Only names that resolved count towards the hot set
+    cache_key = normalize_city(city)
+    refresher.record(cache_key, city)
+
+    snapshot = get_cached_snapshot(cache_key, weather_data)
+    if snapshot is not None:
+        return snapshot
+
+    lat = weather_data['coord']['lat']
+    lon = weather_data['coord']['lon']
+
+    uv_index, air_quality = await fetch_uv_and_air_quality_async(
+        lat, lon, cloud_cover=get_cloud_cover(weather_data)
+    )
+
+    snapshot = WeatherSnapshot.from_owm(weather_data, uv_index, air_quality)
+    cache_snapshot(cache_key, weather_data, snapshot)
+    return snapshot
+
+
+@on_upstream_loop
+async def get_weather_snapshot_by_coords_async(lat, lon):
+    """Async version of weather_api.get_weather_snapshot_by_coords"""
+    weather_data = await get_weather_by_coords_async(lat, lon)
+
+    if not weather_data:
+        return estimate_snapshot_for_coords(lat, lon)
+
+    snapshot_key = f"tile:{coordinate_tile(lat, lon)}"
+    snapshot = get_cached_snapshot(snapshot_key, weather_data)
+    if snapshot is None:
+        uv_index, air_quality = await fetch_uv_and_air_quality_async(
+            lat, lon, cloud_cover=get_cloud_cover(weather_data)
+        )
+        snapshot = WeatherSnapshot.from_owm(weather_data, uv_index, air_quality)
+        cache_snapshot(snapshot_key, weather_data, snapshot)
+
+    return snapshot.at(lat, lon)
+
+
+async def get_comprehensive_weather_async(city):
+    """Async version of weather_api.get_comprehensive_weather"""
+    snapshot = await get_weather_snapshot_async(city)
+    return snapshot.to_dict() if snapshot else None
@@ -0,0 +1,414 @@
+"""
+Weather Cache
+Bounded TTL caches used by weather_api to avoid repeated upstream calls:
+- TTLCache: in-process LRU (per worker)
+- SQLiteCache: on-disk WAL-mode cache shared by all gunicorn workers
+  on the host and kept across restarts
+- NegativeCache: remembers queries upstream answered "not found"
+"""
+
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with a per-cache time-to-live
+    Expired entries are kept for stale_ttl more seconds so callers can
+    serve them while a refresh runs (stale-while-revalidate)
+    Keeps hit/miss/eviction counters for monitoring
+    """
+
+    def __init__(self, maxsize=512, ttl=600, name='cache', stale_ttl=0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.name = name
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return cached value or None if missing/expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at <= now:
+                if expires_at + self.stale_ttl <= now:
+                    del self._data[key]
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def get_stale(self, key):
+        """
+        Return (value, is_stale) allowing entries inside the stale window
+        Returns (None, False) when missing or too old to serve
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, False
+
+            expires_at, value = entry
+            if expires_at + self.stale_ttl <= now:
+                del self._data[key]
+                self.misses += 1
+                return None, False
+
+            self._data.move_to_end(key)
+            if expires_at <= now:
+                self.stale_hits += 1
+                return value, True
+
+            self.hits += 1
+            return value, False
+
+    def expires_in(self, key):
+        """Seconds until key expires (negative once stale), None if missing"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            return entry[0] - time.monotonic()
+
+    def set(self, key, value, ttl=None):
+        """Store value, evicting least recently used entries when full"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        """Remove a single entry if present"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Drop all entries and reset counters"""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.stale_hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Return counters for monitoring"""
+        with self._lock:
+            total = self.hits + self.stale_hits + self.misses
+            return {
+                'name': self.name,
+                'backend': 'memory',
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'stale_ttl': self.stale_ttl,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round((self.hits + self.stale_hits) / total, 3) if total else 0.0
+            }
+
+
+class SQLiteCache:
+    """
+    TTL cache stored in a local SQLite database in WAL mode
+    Readable and writable by every worker process without a network
+    service; survives restarts. Same interface as TTLCache.
+
+    Entries past expiry + stale_ttl are purged on write; when the
+    namespace holds more than maxsize rows the entries closest to
+    expiry (i.e. the oldest writes) are evicted first.
+    """
+
+    def __init__(self, path, maxsize=5000, ttl=600, name='cache', stale_ttl=0):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.name = name
+        self._local = threading.local()
+        self._writes = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                ' namespace TEXT NOT NULL,'
+                ' key TEXT NOT NULL,'
+                ' value TEXT NOT NULL,'
+                ' expires_at REAL NOT NULL,'
+                ' PRIMARY KEY (namespace, key))'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS cache_expiry ON cache (namespace, expires_at)')
+
+    def _connect(self):
+        """One connection per thread per process (connections never cross fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _read(self, key):
+        try:
+            row = self._connect().execute(
+                'SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?',
+                (self.name, key)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Shared cache read failed: {e}")
+            return None
+        return row
+
+    def get(self, key):
+        """Return cached value or None if missing/expired"""
+        row = self._read(key)
+        if row is None or row[1] <= time.time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def get_stale(self, key):
+        """Return (value, is_stale) allowing entries inside the stale window"""
+        row = self._read(key)
+        now = time.time()
+        if row is None or row[1] + self.stale_ttl <= now:
+            self.misses += 1
+            return None, False
+        if row[1] <= now:
+            self.stale_hits += 1
+            return json.loads(row[0]), True
+        self.hits += 1
+        return json.loads(row[0]), False
+
+    def expires_in(self, key):
+        """Seconds until key expires (negative once stale), None if missing"""
+        row = self._read(key)
+        return None if row is None else row[1] - time.time()
+
+    def set(self, key, value, ttl=None):
+        """Store value, purging dead rows and evicting beyond maxsize"""
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        try:
+            conn = self._connect()
+            conn.execute(
+                'INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)',
+                (self.name, key, json.dumps(value), expires_at)
+            )
+            self._writes += 1
+            # Housekeeping every 64 writes keeps the hot path to one INSERT
+            if self._writes % 64 == 0:
+                self._housekeep(conn, now)
+        except sqlite3.Error as e:
+            print(f"Shared cache write failed: {e}")
+
+    def _housekeep(self, conn, now):
+        conn.execute(
+            'DELETE FROM cache WHERE namespace = ? AND expires_at <= ?',
+            (self.name, now - self.stale_ttl)
+        )
+        count = conn.execute('SELECT COUNT(*) FROM cache WHERE namespace = ?', (self.name,)).fetchone()[0]
+        if count > self.maxsize:
+            excess = count - self.maxsize
+            conn.execute(
+                'DELETE FROM cache WHERE rowid IN ('
+                ' SELECT rowid FROM cache WHERE namespace = ? ORDER BY expires_at LIMIT ?)',
+                (self.name, excess)
+            )
+            self.evictions += excess
+
+    def delete(self, key):
+        """Remove a single entry if present"""
+        try:
+            self._connect().execute('DELETE FROM cache WHERE namespace = ? AND key = ?', (self.name, key))
+        except sqlite3.Error as e:
+            print(f"Shared cache delete failed: {e}")
+
+    def clear(self):
+        """Drop all entries in this namespace and reset counters"""
+        try:
+            self._connect().execute('DELETE FROM cache WHERE namespace = ?', (self.name,))
+        except sqlite3.Error as e:
+            print(f"Shared cache clear failed: {e}")
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        try:
+            return self._connect().execute(
+                'SELECT COUNT(*) FROM cache WHERE namespace = ?', (self.name,)
+            ).fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Shared cache count failed: {e}")
+            return 0
+
+    def stats(self):
+        """Return counters for monitoring (hit/miss counts are per worker)"""
+        total = self.hits + self.stale_hits + self.misses
+        return {
+            'name': self.name,
+            'backend': 'sqlite',
+            'size': len(self),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'stale_ttl': self.stale_ttl,
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round((self.hits + self.stale_hits) / total, 3) if total else 0.0
+        }
+
+
+class NegativeCache:
+    """
+    Memory-bounded set of known-bad keys (e.g. city names that 404) with a TTL
+
+    A counting Bloom filter answers "definitely not bad" for the common case
+    without touching the LRU; keys that pass it are confirmed against a small
+    LRU of exact keys and expiry times. Counters are decremented when a key
+    expires or is evicted, so the filter never fills up with dead keys.
+    """
+
+    def __init__(self, maxsize=4096, ttl=3600, name='negative', false_positive_rate=0.01):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        # Standard Bloom sizing for maxsize keys at the target false positive rate
+        self.num_counters = max(64, int(-maxsize * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_counters / maxsize * math.log(2)))
+        self._counters = bytearray(self.num_counters)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.rejections = 0
+        self.filter_passes = 0
+        self.evictions = 0
+
+    def _positions(self, key):
+        """Counter indices for a key (double hashing over one digest)"""
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_counters for i in range(self.num_hashes)]
+
+    def _increment(self, key):
+        for position in self._positions(key):
+            if self._counters[position] < 255:
+                self._counters[position] += 1
+
+    def _decrement(self, key):
+        for position in self._positions(key):
+            # Saturated counters stay put (they can no longer be tracked exactly)
+            if 0 < self._counters[position] < 255:
+                self._counters[position] -= 1
+
+    def __contains__(self, key):
+        """Whether key is a known-bad key that has not expired"""
+        # The filter is read without the lock on purpose: counters are single
+        # bytes, and add() increments them before the key is stored, so a racing
+        # read can at worst miss a key being added (one extra upstream call).
+        # A stale "maybe" is always confirmed against _data under the lock
+        if not all(self._counters[position] for position in self._positions(key)):
+            return False
+
+        now = time.monotonic()
+        with self._lock:
+            expires_at = self._data.get(key)
+            if expires_at is None:
+                self.filter_passes += 1
+                return False
+            if expires_at <= now:
+                del self._data[key]
+                self._decrement(key)
+                return False
+            self._data.move_to_end(key)
+            self.rejections += 1
+            return True
+
+    def add(self, key, ttl=None):
+        """Remember key as bad, evicting the least recently seen when full"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key not in self._data:
+                self._increment(key)
+            self._data[key] = expires_at
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                evicted, _ = self._data.popitem(last=False)
+                self._decrement(evicted)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Return counters for monitoring"""
+        with self._lock:
+            return {
+                'name': self.name,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'filter_counters': self.num_counters,
+                'filter_hashes': self.num_hashes,
+                'rejections': self.rejections,
+                'filter_false_positives': self.filter_passes,
+                'evictions': self.evictions
+            }
+
+
+def create_cache(backend, maxsize, ttl, name, stale_ttl=0, path=None):
+    """Build the configured cache backend ('memory' or 'sqlite')"""
+    if backend == 'sqlite':
+        return SQLiteCache(path, maxsize=maxsize, ttl=ttl, name=name, stale_ttl=stale_ttl)
+    return TTLCache(maxsize, ttl, name=name, stale_ttl=stale_ttl)
+
+
+def normalize_city(city):
+    """
+    Normalize a city query so equivalent spellings share a cache key
+    'london', 'London ', 'LONDON, gb' -> 'london' / 'london,gb'
+    """
+    parts = [part.strip() for part in city.lower().split(',')]
+    parts = [' '.join(part.split()) for part in parts if part]
+    return ','.join(parts)
@@ -0,0 +1,145 @@
+"""
+Background Weather Refresher
+Tracks how often each location is requested and refreshes the hottest
+ones before their cache entries expire, within an upstream call budget
+"""
+
+import threading
+import time
+
+
+class HotLocationTracker:
+    """
+    Exponentially decaying request counter per location
+    A location requested once has score 1.0, halving every half_life seconds
+    """
+
+    def __init__(self, half_life=600, max_tracked=1000):
+        self.half_life = half_life
+        self.max_tracked = max_tracked
+        self._scores = {}  # key -> [score, last_update, label]
+        self._lock = threading.Lock()
+
+    def _decayed(self, score, last_update, now):
+        return score * 0.5 ** ((now - last_update) / self.half_life)
+
+    def record(self, key, label=None):
+        """Count one request for key; label is the query used to refresh it"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._scores.get(key)
+            if entry is None:
+                self._scores[key] = [1.0, now, label or key]
+                if len(self._scores) > self.max_tracked:
+                    self._prune(now)
+            else:
+                entry[0] = self._decayed(entry[0], entry[1], now) + 1.0
+                entry[1] = now
+
+    def _prune(self, now):
+        """Drop the coldest half of tracked locations"""
+        ranked = sorted(
+            self._scores.items(),
+            key=lambda item: self._decayed(item[1][0], item[1][1], now)
+        )
+        for key, _ in ranked[:len(ranked) // 2]:
+            del self._scores[key]
+
+    def hottest(self, k):
+        """Return [(key, label, score)] for the top-k locations right now"""
+        now = time.monotonic()
+        with self._lock:
+            ranked = [
+                (key, label, self._decayed(score, last_update, now))
+                for key, (score, last_update, label) in self._scores.items()
+            ]
+        ranked.sort(key=lambda item: item[2], reverse=True)
+        return ranked[:k]
+
+    def __len__(self):
+        return len(self._scores)
+
+
+class BackgroundRefresher:
+    """
+    Periodically refresh the top-K hot locations ahead of expiry
+
+    refresh_fn(label) re-fetches one location and returns the number of
+    upstream calls it made; expires_in_fn(key) returns seconds until the
+    cached entry expires (None if not cached)
+    """
+
+    def __init__(self, refresh_fn, expires_in_fn, tracker=None, top_k=20,
+                 interval=30, call_budget=30, refresh_ahead=60):
+        self.refresh_fn = refresh_fn
+        self.expires_in_fn = expires_in_fn
+        self.tracker = tracker if tracker is not None else HotLocationTracker()
+        self.top_k = top_k
+        self.interval = interval
+        self.call_budget = call_budget
+        self.refresh_ahead = refresh_ahead
+        self._stop = threading.Event()
+        self._thread = None
+        self.cycles = 0
+        self.refreshed = 0
+        self.upstream_calls = 0
+        self.skipped_over_budget = 0
+
+    def record(self, key, label=None):
+        """Forward a request to the popularity tracker"""
+        self.tracker.record(key, label)
+
+    def run_once(self):
+        """Refresh hot locations that expire within refresh_ahead seconds"""
+        budget = self.call_budget
+        for key, label, _score in self.tracker.hottest(self.top_k):
+            remaining = self.expires_in_fn(key)
+            if remaining is not None and remaining > self.refresh_ahead:
+                continue
+
+            if budget <= 0:
+                self.skipped_over_budget += 1
+                continue
+
+            try:
+                calls = self.refresh_fn(label)
+            except Exception as e:
+                print(f"Background refresh failed for {label}: {e}")
+                calls = 1
+
+            budget -= calls
+            self.upstream_calls += calls
+            self.refreshed += 1
+
+        self.cycles += 1
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def start(self):
+        """Start the daemon refresh thread (idempotent)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='weather-refresher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the refresh thread"""
+        self._stop.set()
+
+    def stats(self):
+        """Return refresher counters for monitoring"""
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'tracked_locations': len(self.tracker),
+            'cycles': self.cycles,
+            'refreshed': self.refreshed,
+            'upstream_calls': self.upstream_calls,
+            'skipped_over_budget': self.skipped_over_budget,
+            'hottest': [
+                {'location': label, 'score': round(score, 2)}
+                for _key, label, score in self.tracker.hottest(5)
+            ]
+        }
@@ -0,0 +1,219 @@
+"""
+Weather Snapshot Model
+One compact, typed record per upstream response (weather + UV + AQI),
+serialized directly to the JSON shapes the frontends expect
+"""
+
+import copy
+
+# Used when air quality is unavailable
+DEFAULT_AQI = 2  # Fair
+AQI_UNAVAILABLE_IMPACT = 'Air quality data unavailable. Proceed with normal skincare.'
+
+
+def get_aqi_category(aqi):
+    """Convert AQI number to category name"""
+    categories = {
+        1: 'Good',
+        2: 'Fair',
+        3: 'Moderate',
+        4: 'Poor',
+        5: 'Very Poor'
+    }
+    return categories.get(aqi, 'Unknown')
+
+
+def get_aqi_skin_impact(aqi):
+    """Get skin impact description for AQI level"""
+    impacts = {
+        1: 'Minimal impact on skin. Normal skincare routine is sufficient.',
+        2: 'Low impact. Basic cleansing recommended after outdoor activities.',
+        3: 'Moderate impact. Antioxidant skincare recommended. Cleanse thoroughly.',
+        4: 'Poor air quality can accelerate aging. Use protective barrier creams and antioxidants.',
+        5: 'Very poor air quality. Minimize outdoor exposure. Use strong antioxidants and barrier repair products.'
+    }
+    return impacts.get(aqi, 'Unknown impact')
+
+
+def calculate_uv_risk(uv_index):
+    """Categorize UV index risk level"""
+    if uv_index < 3:
+        return 'Low'
+    elif uv_index < 6:
+        return 'Moderate'
+    elif uv_index < 8:
+        return 'High'
+    elif uv_index < 11:
+        return 'Very High'
+    else:
+        return 'Extreme'
+
+
+class WeatherSnapshot:
+    """
+    Flat, slotted weather record
+    aqi/pm2_5/pm10 are None when air quality data was unavailable;
+    estimated is True for climatology fallbacks rather than live readings
+    """
+
+    __slots__ = (
+        'city', 'country', 'lat', 'lon',
+        'temperature', 'feels_like', 'temp_min', 'temp_max',
+        'humidity', 'pressure', 'description', 'main', 'icon',
+        'wind_speed', 'wind_deg', 'clouds',
+        'uv_index', 'aqi', 'pm2_5', 'pm10', 'estimated'
+    )
+
+    def __init__(self, city, country, lat, lon, temperature, feels_like, temp_min, temp_max,
+                 humidity, pressure, description, main, icon, wind_speed, wind_deg=0, clouds=None,
+                 uv_index=0, aqi=None, pm2_5=None, pm10=None, estimated=False):
+        self.city = city
+        self.country = country
+        self.lat = lat
+        self.lon = lon
+        self.temperature = temperature
+        self.feels_like = feels_like
+        self.temp_min = temp_min
+        self.temp_max = temp_max
+        self.humidity = humidity
+        self.pressure = pressure
+        self.description = description
+        self.main = main
+        self.icon = icon
+        self.wind_speed = wind_speed
+        self.wind_deg = wind_deg
+        self.clouds = clouds
+        self.uv_index = uv_index
+        self.aqi = aqi
+        self.pm2_5 = pm2_5
+        self.pm10 = pm10
+        self.estimated = estimated
+
+    @classmethod
+    def from_owm(cls, weather_data, uv_index, air_quality=None):
+        """
+        Build from a raw OpenWeatherMap weather payload plus UV/AQI readings
+        Use at() to report it at other coordinates (e.g. inside a geohash tile)
+        """
+        main = weather_data['main']
+        condition = weather_data['weather'][0]
+        wind = weather_data.get('wind', {})
+        return cls(
+            city=weather_data.get('name') or 'Your Location',
+            country=weather_data.get('sys', {}).get('country', ''),
+            lat=weather_data['coord']['lat'],
+            lon=weather_data['coord']['lon'],
+            temperature=main['temp'],
+            feels_like=main.get('feels_like', main['temp']),
+            temp_min=main.get('temp_min', main['temp']),
+            temp_max=main.get('temp_max', main['temp']),
+            humidity=main['humidity'],
+            pressure=main.get('pressure', 0),
+            description=condition.get('description', ''),
+            main=condition.get('main', ''),
+            icon=condition.get('icon', ''),
+            wind_speed=wind.get('speed', 0),
+            wind_deg=wind.get('deg', 0),
+            clouds=weather_data.get('clouds', {}).get('all'),
+            uv_index=uv_index,
+            aqi=air_quality['aqi'] if air_quality else None,
+            pm2_5=air_quality['pm2_5'] if air_quality else None,
+            pm10=air_quality['pm10'] if air_quality else None
+        )
+
+    def at(self, lat, lon):
+        """
+        This snapshot reported at other coordinates (e.g. a caller's position
+        inside the geohash tile it was built for). Cached snapshots are shared
+        between requests, so they are copied rather than changed
+        """
+        if (lat, lon) == (self.lat, self.lon):
+            return self
+        snapshot = copy.copy(self)
+        snapshot.lat = lat
+        snapshot.lon = lon
+        return snapshot
+
+    def _values(self):
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __eq__(self, other):
+        if not isinstance(other, WeatherSnapshot):
+            return NotImplemented
+        return self._values() == other._values()
+
+    def __hash__(self):
+        return hash(self._values())
+
+    def __repr__(self):
+        return f"WeatherSnapshot({self.city!r}, {self.temperature}°C, uv={self.uv_index}, aqi={self.aqi})"
+
+    def air_quality_dict(self):
+        """AQI block, falling back to 'Fair' when data was unavailable"""
+        if self.aqi is None:
+            return {
+                'aqi': DEFAULT_AQI,
+                'category': get_aqi_category(DEFAULT_AQI),
+                'pm2_5': 0,
+                'pm10': 0,
+                'skin_impact': AQI_UNAVAILABLE_IMPACT
+            }
+        return {
+            'aqi': self.aqi,
+            'category': get_aqi_category(self.aqi),
+            'pm2_5': round(self.pm2_5, 2),
+            'pm10': round(self.pm10, 2),
+            'skin_impact': get_aqi_skin_impact(self.aqi)
+        }
+
+    def to_dict(self, city_label=None, coord_precision=None):
+        """
+        Comprehensive payload used by /api/weather, /api/geolocation,
+        /api/analyze-complete and generate_comprehensive_recommendations
+        """
+        lat, lon = self.lat, self.lon
+        if coord_precision is not None:
+            lat, lon = round(lat, coord_precision), round(lon, coord_precision)
+
+        return {
+            'city': city_label or self.city,
+            'country': self.country,
+            'coordinates': {
+                'lat': lat,
+                'lon': lon
+            },
+            'weather': {
+                'temperature': self.temperature,
+                'feels_like': self.feels_like,
+                'temp_min': self.temp_min,
+                'temp_max': self.temp_max,
+                'humidity': self.humidity,
+                'pressure': self.pressure,
+                'description': self.description,
+                'main': self.main,
+                'icon': self.icon
+            },
+            'wind': {
+                'speed': self.wind_speed,
+                'deg': self.wind_deg
+            },
+            'uv': {
+                'index': round(self.uv_index, 1),
+                'risk': calculate_uv_risk(self.uv_index)
+            },
+            'air_quality': self.air_quality_dict(),
+            'estimated': self.estimated
+        }
+
+    def to_analysis_weather(self):
+        """Flat weather block used by app.py's /api/analyze responses"""
+        return {
+            'temperature': self.temperature,
+            'feels_like': self.feels_like,
+            'humidity': self.humidity,
+            'pressure': self.pressure,
+            'description': self.description,
+            'wind_speed': self.wind_speed,
+            'uv_index': round(self.uv_index, 1),
+            'estimated': self.estimated
+        }